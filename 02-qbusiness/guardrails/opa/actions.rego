@@ -24,7 +24,9 @@ green_actions := {
   "draft-change-note": {"groups": {"VaultMesh-Engineering", "VaultMesh-Delivery", "VaultMesh-Management"}},
   "validate-schema": {"groups": {"VaultMesh-Engineering"}},
   "create-jira-draft": {"groups": {"VaultMesh-Delivery", "VaultMesh-Engineering"}},
-  "compliance-pack": {"groups": {"VaultMesh-Compliance", "VaultMesh-Management"}}
+  "compliance-pack": {"groups": {"VaultMesh-Compliance", "VaultMesh-Management"}},
+  # Reads back background jobs; the handler only shows a job to the user who started it.
+  "get-job-status": {"groups": {"VaultMesh-Engineering", "VaultMesh-Delivery", "VaultMesh-Compliance", "VaultMesh-Management"}}
 }
 
 # Yellow-tier actions (not yet enabled) may set this set to true.
@@ -48,3 +50,10 @@ deny_reason := sprintf("action %s is not enabled for group %s", [input.action, i
   not allow
   not approval_required
 }
+
+# Combined decision document so clients can fetch all three results in one query.
+decision := {
+  "allow": allow,
+  "approval_required": approval_required,
+  "deny_reason": deny_reason
+}
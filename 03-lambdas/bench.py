@@ -0,0 +1,2217 @@
+#!/usr/bin/env python3
+"""
+VaultMesh Q Business - Action Lambda Benchmarks
+Runs the shared action code against local stand-ins (no AWS or OPA needed).
+
+Usage:
+  python bench.py opa [--iterations N] [--delay-ms D]   - combined decision vs per-rule OPA queries
+  python bench.py pool [--iterations N] [--delay-ms D]  - keep-alive pool vs connection per request
+  python bench.py parity [--opa-url URL]                - embedded evaluator vs OPA, every action x group
+  python bench.py breaker [--iterations N]              - hung OPA with and without the circuit breaker
+  python bench.py emf [--iterations N]                  - validate EMF output and count outbound calls
+  python bench.py metrics [--iterations N]              - aggregated put_metric_data batches vs per request
+  python bench.py coldstart [--runs N] [--max-ms MS]    - import+init time per handler in a fresh interpreter
+  python bench.py phases [--iterations N]               - phase timings sum to the total; on/off overhead
+  python bench.py router [--requests N] [--gap-ms G]    - six functions vs one router: cold starts and p99
+  python bench.py batch [--items N] [--delay-ms D]      - one batch envelope vs N single invocations
+  python bench.py summarize [--docs 1,4,16] [--size-kb 64,512] - summarize-docs throughput vs document count and size
+  python bench.py faq [--docs N] [--changed-pct P]      - generate-faq cold, warm and incremental over a prefix
+  python bench.py changenote [--size-mb 1,4] [--changes 1,10,100] - section-aware diff vs whole-document diffs
+  python bench.py validate [--interfaces 10,200] [--records N] - cold vs warm compiled validators, instance throughput
+  python bench.py pack [--size-mb N] [--files N]        - streaming compliance pack larger than function memory, peak RSS
+  python bench.py jira [--items N] [--dup-pct P]        - bulk create-jira-draft vs N single invocations
+  python bench.py jobs [--jobs N] [--latency-ms L]      - async job submit latency vs synchronous runs, SQS worker path
+  python bench.py idempotency [--requests N]            - retried/repeated requests replayed vs recomputed, per store
+  python bench.py personas [--sessions N] [--latency-ms L] - persona/catalog cache hit path and S3 GETs under init storms
+  python bench.py catalog [--iterations N]              - compiled catalog index vs per-call scans; policy parity
+  python bench.py fanout [--items N] [--latency-ms L]   - concurrent/asyncio multi-action fan-out vs sequential invokes
+  python bench.py dispatch [--items N] [--latency-ms L] - fire-and-forget Event invokes collected from the result sink
+  python bench.py session [--latency-ms L]              - session init: persona and catalog prefetched together, warm-ups
+"""
+import argparse
+import atexit
+import contextlib
+import difflib
+import gc
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+from common import (catalog, faq, idempotency, jirabulk, jobs, mddiff, objcache, pack, registry,  # noqa: E402
+                    results, s3io, schemaval, summarize, vmq_common)
+import compile_policy  # noqa: E402
+import persona_helper  # noqa: E402
+
+# Measure the OPA path itself unless a benchmark opts into the decision cache,
+# and the actions themselves unless it opts into replaying saved responses.
+vmq_common._AUTHZ_CACHE = vmq_common._DecisionCache(size=0)
+idempotency.reset("off")
+
+with open(os.path.join(HERE, "test-events.json"), encoding="utf-8") as _f:
+    TEST_EVENTS = list(json.load(_f).values())
+
+SAMPLE_EVENT = {
+    "action": "summarize-docs",
+    "user": {"id": "alice@vaultmesh.io", "group": "VaultMesh-Engineering"},
+    "context": {"request_id": "bench", "persona": "engineer"},
+    "params": {"documentUris": ["s3://vaultmesh-knowledge-base/polis-overview.md"]},
+}
+
+# ---------------------------------------------------------------------------
+# Local OPA stand-in
+# ---------------------------------------------------------------------------
+
+with open(compile_policy.REGO_PATH, encoding="utf-8") as _f:
+    REGO_TABLES = compile_policy.parse_tables(_f.read())
+
+def _policy(inp: dict) -> dict:
+    """Evaluate vaultmesh.actions rule by rule, reading the tables straight from actions.rego."""
+    action = inp.get("action")
+    group = (inp.get("user") or {}).get("group")
+    allow = group in (REGO_TABLES["green_actions"].get(action) or {}).get("groups", ())
+    approval = bool(REGO_TABLES["yellow_actions"].get(action))
+    # sprintf over an undefined input.user.group leaves deny_reason at its default.
+    deny = "" if allow or approval or group is None else f"action {action} is not enabled for group {group}"
+    return {"allow": allow, "approval_required": approval, "deny_reason": deny}
+
+class OpaStub:
+    """Minimal OPA data API on 127.0.0.1 with an injectable per-request delay."""
+
+    def __init__(self, delay_ms: float = 0.0, legacy: bool = False, revision: str = "r1"):
+        self.delay = delay_ms / 1000.0
+        self.legacy = legacy
+        self.revision = revision
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                stub.requests += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                path, _, query = self.path.partition("?")
+                rule = path.rstrip("/").rsplit("/", 1)[-1]
+                doc = _policy(json.loads(body or b"{}").get("input") or {})
+                if rule == "decision" and not stub.legacy:
+                    out = {"result": doc}
+                elif rule in doc:
+                    out = {"result": doc[rule]}
+                else:
+                    out = {}
+                if "provenance" in query:
+                    out["provenance"] = {"bundles": {"vaultmesh": {"revision": stub.revision}}}
+                data = json.dumps(out).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *_):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.handle_error = lambda *_: None  # clients hanging up on timeout is expected
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/data/vaultmesh/actions"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *_):
+        self.server.shutdown()
+        self.server.server_close()
+
+# ---------------------------------------------------------------------------
+# Local S3 stand-in
+# ---------------------------------------------------------------------------
+
+class _S3Error(Exception):
+    """Shaped like botocore's ClientError so s3io reads the error code."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+class _LocalBody:
+    def __init__(self, path, latency):
+        self._f, self._latency = open(path, "rb"), latency
+
+    def read(self, n=-1):
+        if self._latency:  # time to first byte
+            time.sleep(self._latency)
+            self._latency = 0
+        return self._f.read(n)
+
+    def close(self):
+        self._f.close()
+
+class LocalS3:
+    """Filesystem-backed S3 client stand-in: s3://bucket/key is <root>/bucket/key."""
+
+    def __init__(self, root: str, latency_ms: float = 0.0, page_size: int = 1000):
+        self.root, self.latency, self.page_size = root, latency_ms / 1000.0, page_size
+        self.calls = Counter()
+        self._etags, self._uploads, self._upload_seq = {}, {}, 0
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def put(self, bucket: str, key: str, data: bytes):
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        self._etags[(bucket, key)] = hashlib.md5(data).hexdigest()
+
+    def _etag(self, bucket, key):
+        etag = self._etags.get((bucket, key))
+        if etag is None:
+            digest = hashlib.md5()
+            with open(self._path(bucket, key), "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            etag = self._etags[(bucket, key)] = digest.hexdigest()
+        return f'"{etag}"'
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **_):
+        self.calls["get_object"] += 1
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise _S3Error("NoSuchKey", Key)
+        etag = self._etag(Bucket, Key)
+        if IfNoneMatch == etag:
+            raise _S3Error("304", "Not Modified")
+        size = os.path.getsize(path)
+        self.calls[f"bytes_out:{Bucket}"] += size
+        return {"Body": _LocalBody(path, self.latency), "ContentLength": size, "ETag": etag}
+
+    def head_object(self, Bucket, Key, **_):
+        self.calls["head_object"] += 1
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise _S3Error("404", Key)
+        return {"ContentLength": os.path.getsize(path), "ETag": self._etag(Bucket, Key)}
+
+    def copy_object(self, Bucket, Key, CopySource, **_):
+        self.calls["copy_object"] += 1
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(self._path(CopySource["Bucket"], CopySource["Key"]), path)
+        self._etags.pop((Bucket, Key), None)
+        return {"CopyObjectResult": {"ETag": self._etag(Bucket, Key)}}
+
+    def delete_object(self, Bucket, Key, **_):
+        self.calls["delete_object"] += 1
+        try:
+            os.remove(self._path(Bucket, Key))
+        except FileNotFoundError:
+            pass
+        self._etags.pop((Bucket, Key), None)
+        return {}
+
+    def put_object(self, Bucket, Key, Body, **_):
+        self.calls["put_object"] += 1
+        self.put(Bucket, Key, Body if isinstance(Body, bytes) else Body.read())
+        return {"ETag": self._etag(Bucket, Key)}
+
+    def create_multipart_upload(self, Bucket, Key, **_):
+        self.calls["create_multipart_upload"] += 1
+        self._upload_seq += 1
+        upload_id = f"{self._upload_seq}-{os.getpid()}"
+        self._uploads[upload_id] = os.path.join(self.root, ".uploads", upload_id)
+        os.makedirs(self._uploads[upload_id])
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **_):
+        self.calls["upload_part"] += 1
+        with open(os.path.join(self._uploads[UploadId], f"{PartNumber:05d}"), "wb") as f:
+            f.write(Body)
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **_):
+        self.calls["complete_multipart_upload"] += 1
+        parts, digests = self._uploads.pop(UploadId), []
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as out:
+            for part in MultipartUpload["Parts"]:
+                with open(os.path.join(parts, f"{part['PartNumber']:05d}"), "rb") as f:
+                    shutil.copyfileobj(f, out)
+                digests.append(bytes.fromhex(part["ETag"].strip('"')))
+        shutil.rmtree(parts)
+        self._etags[(Bucket, Key)] = f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+        return {"ETag": self._etag(Bucket, Key)}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **_):
+        self.calls["abort_multipart_upload"] += 1
+        shutil.rmtree(self._uploads.pop(UploadId, ""), ignore_errors=True)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, MaxKeys=None, **_):
+        self.calls["list_objects_v2"] += 1
+        base = os.path.join(self.root, Bucket)
+        keys = sorted(os.path.relpath(os.path.join(d, f), base).replace(os.sep, "/")
+                      for d, _, files in os.walk(base) for f in files)
+        keys = [k for k in keys if k.startswith(Prefix) and (not ContinuationToken or k > ContinuationToken)]
+        page = keys[:MaxKeys or self.page_size]
+        out = {"Contents": [{"Key": k, "ETag": self._etag(Bucket, k), "Size": os.path.getsize(self._path(Bucket, k))}
+                            for k in page],
+               "IsTruncated": len(keys) > len(page)}
+        if out["IsTruncated"]:
+            out["NextContinuationToken"] = page[-1]
+        return out
+
+KB_BUCKET = "vaultmesh-knowledge-base"
+FIXTURE_DIR = tempfile.mkdtemp(prefix="vmq-bench-s3-")
+atexit.register(shutil.rmtree, FIXTURE_DIR, True)
+FIXTURE_S3 = LocalS3(FIXTURE_DIR)
+
+def _seed_fixtures():
+    """Serve the repo's docs/ as the knowledge-base bucket for every benchmark."""
+    docs = os.path.join(HERE, "..", "docs")
+    for name in sorted(os.listdir(docs)):
+        with open(os.path.join(docs, name), "rb") as f:
+            FIXTURE_S3.put(KB_BUCKET, f"docs/{name}", f.read())
+    with open(os.path.join(docs, "faq-vaultmesh-polis.md"), "rb") as f:
+        FIXTURE_S3.put(KB_BUCKET, "polis-overview.md", f.read())
+    with open(os.path.join(docs, "fintech-production-hardening.md"), encoding="utf-8") as f:
+        v1 = f.read()
+    FIXTURE_S3.put(KB_BUCKET, "changes/doc-v1.md", v1.encode("utf-8"))
+    FIXTURE_S3.put(KB_BUCKET, "changes/doc-v2.md", _revise(v1, random.Random(1), 1, 1, 1, 1).encode("utf-8"))
+    model = _synthetic_model(random.Random(1), 4)
+    FIXTURE_S3.put(KB_BUCKET, "schemas/vaultmesh.dtdl.json", json.dumps(model, indent=2).encode("utf-8"))
+    FIXTURE_S3.put(KB_BUCKET, "schemas/vaultmesh-twins.ndjson", _synthetic_instances(random.Random(1), model, 50))
+
+
+_WORDS = ("ledger consortium policy possession custody audit trail tenant connector index retrieval persona "
+          "guardrail schema telemetry twin registry latency throughput settlement workflow approval region "
+          "encryption rotation backup replica quorum validator catalog notebook pipeline").split()
+
+def _synthetic_markdown(rng: random.Random, size: int) -> bytes:
+    """Markdown with overview, body, risk and next-step sections, about `size` bytes."""
+    def sentence(lead=""):
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 18))]
+        return (lead + " ".join(words)).capitalize() + "."
+
+    out, n = [f"# {sentence().rstrip('.')}", "", "## Overview"], 0
+    while sum(len(line) + 1 for line in out) < size:
+        n += 1
+        kind = n % 7
+        if kind == 5:
+            out += ["", f"## Risks {n}"] + [f"- {sentence('risk of ')}" for _ in range(3)]
+        elif kind == 6:
+            out += ["", f"## Next Steps {n}"] + [f"- {sentence('we should ')}" for _ in range(3)]
+        else:
+            out += ["", " ".join(sentence() for _ in range(5))]
+    return "\n".join(out).encode("utf-8")
+
+def _blocks(text: str) -> list:
+    """Split Markdown into [heading line + body] blocks (the preamble is block 0)."""
+    blocks, fence = [[]], False
+    for line in text.split("\n"):
+        if line.lstrip().startswith(("```", "~~~")):
+            fence = not fence
+        if not fence and line.startswith("#"):
+            blocks.append([])
+        blocks[-1].append(line)
+    return blocks
+
+def _revise(text: str, rng: random.Random, modify: int, add: int, remove: int, move: int) -> str:
+    """A new revision of `text`: edit, add, remove and move whole sections (never the title)."""
+    blocks = _blocks(text)
+    body = list(range(2, len(blocks)))
+    for i in rng.sample(body, min(modify, len(body))):
+        lines = blocks[i]
+        lines.insert(rng.randint(1, len(lines)), f"Revised: the service MUST record change {rng.randint(1, 10 ** 6)}.")
+        prose = [j for j, line in enumerate(lines) if j and line.startswith("The ")]
+        if prose:
+            del lines[rng.choice(prose)]  # never a fence line: that would turn the rest into code
+    for i in sorted(rng.sample(body, min(remove, len(body))), reverse=True):
+        del blocks[i]
+    for _ in range(move):
+        i = rng.randrange(2, len(blocks))
+        block = blocks.pop(i)
+        blocks.insert(rng.randrange(2, len(blocks) + 1), block)
+    for n in range(add):
+        blocks.insert(rng.randrange(2, len(blocks) + 1),
+                      [f"## Added section {n} {rng.randint(1, 10 ** 6)}", "", "New rollback plan text.", ""])
+    return "\n".join(line for block in blocks for line in block)
+
+def _synthetic_spec(rng: random.Random, size: int) -> str:
+    """A numbered multi-level spec of about `size` bytes (chapters, clauses, code samples)."""
+    out, chapter = ["# Synthetic Platform Specification", ""], 0
+    total = 0
+    while total < size:
+        chapter += 1
+        out += [f"## {chapter}. {' '.join(rng.choice(_WORDS) for _ in range(3)).title()}", ""]
+        for clause in range(1, rng.randint(4, 9)):
+            lines = [f"### {chapter}.{clause} {' '.join(rng.choice(_WORDS) for _ in range(4)).title()}", ""]
+            for _ in range(rng.randint(3, 10)):
+                words = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(10, 25)))
+                lines.append(f"The {words} {rng.choice(('MUST', 'SHOULD', 'MAY'))} be {rng.choice(_WORDS)}.")
+            if rng.random() < 0.2:
+                lines += ["```json", '{"field": "value", "id": %d}' % rng.randint(1, 10 ** 6), "```"]
+            lines.append("")
+            out += lines
+            total += sum(len(line) + 1 for line in lines)
+    return "\n".join(out)
+
+_PRIMITIVE_SAMPLES = {"boolean": True, "double": 21.5, "integer": 7, "long": 2 ** 40, "string": "ok",
+                      "dateTime": "2025-10-01T12:00:00Z", "date": "2025-10-01", "duration": "PT15M"}
+
+def _synthetic_model(rng: random.Random, interfaces: int) -> list:
+    """A DTDL v2 model: a shared base and sensor plus `interfaces` Interfaces using every content kind."""
+    ns = "dtmi:com:vaultmesh:bench"
+    limits = {"@id": f"{ns}:Limits;1", "@type": "Object",
+              "fields": [{"name": "min", "schema": "double"}, {"name": "max", "schema": "double"}]}
+    model = [
+        {"@context": "dtmi:dtdl:context;2", "@id": f"{ns}:Base;1", "@type": "Interface",
+         "contents": [{"@type": "Property", "name": "serial", "schema": "string"}]},
+        {"@context": "dtmi:dtdl:context;2", "@id": f"{ns}:Sensor;1", "@type": "Interface",
+         "contents": [{"@type": "Property", "name": "rate", "schema": "integer", "writable": True}]},
+    ]
+    for n in range(interfaces):
+        contents = [{"@type": "Property", "name": f"p{i}_{kind}", "schema": kind}
+                    for i, kind in enumerate(rng.sample(sorted(_PRIMITIVE_SAMPLES), 6))]
+        contents += [
+            {"@type": ["Telemetry", "Temperature"], "name": "temperature", "schema": "double", "unit": "degreeCelsius"},
+            {"@type": "Property", "name": "mode", "writable": True,
+             "schema": {"@type": "Enum", "valueSchema": "string",
+                        "enumValues": [{"name": m, "enumValue": m} for m in ("auto", "manual", "off")]}},
+            {"@type": "Property", "name": "limits", "schema": f"{ns}:Limits;1"},
+            {"@type": "Property", "name": "tags", "schema": {"@type": "Array", "elementSchema": "string"}},
+            {"@type": "Property", "name": "counters", "schema": {
+                "@type": "Map", "mapKey": {"name": "key", "schema": "string"},
+                "mapValue": {"name": "count", "schema": "long"}}},
+            {"@type": "Relationship", "name": "feeds", "target": f"{ns}:Device{(n + 1) % interfaces};1"},
+            {"@type": "Component", "name": "sensor", "schema": f"{ns}:Sensor;1"},
+        ]
+        model.append({"@context": "dtmi:dtdl:context;2", "@id": f"{ns}:Device{n};1", "@type": "Interface",
+                      "extends": f"{ns}:Base;1", "contents": contents, "schemas": [limits] if n == 0 else []})
+    return model
+
+def _synthetic_instances(rng: random.Random, model: list, records: int, bad_pct: float = 0,
+                         array: bool = False) -> bytes:
+    """Twins, relationships and NGSI-LD entities for `model`; `bad_pct` of them carry a wrong type."""
+    devices = [i for i in model if ":Device" in i["@id"]]
+    out, twins = [], {}  # device index -> twin ids, for relationships
+    for n in range(records):
+        iface = devices[n % len(devices)]
+        values = {c["name"]: _PRIMITIVE_SAMPLES[c["schema"]] for c in iface["contents"]
+                  if c["@type"] == "Property" and isinstance(c["schema"], str) and c["schema"] in _PRIMITIVE_SAMPLES}
+        values.update(serial=f"SN-{n}", mode=rng.choice(("auto", "manual")), limits={"min": 5, "max": 30.5},
+                      tags=["bench", "synthetic"], counters={"restarts": rng.randint(0, 9)})
+        if rng.random() * 100 < bad_pct:
+            values["limits"] = {"min": 5, "max": "thirty"}
+        short = iface["@id"].split(";")[0].rsplit(":", 1)[-1]
+        if n % 3 == 2:
+            entity = {"id": f"urn:ngsi-ld:{short}:{n}", "type": short,
+                      "temperature": {"type": "Property", "value": 20.5, "observedAt": "2025-10-01T12:00:00Z"},
+                      "feeds": {"type": "Relationship", "object": f"urn:ngsi-ld:Device:{n + 1}"}}
+            entity.update({k: {"type": "Property", "value": v} for k, v in values.items()})
+            out.append(entity)
+        else:
+            out.append({"$dtId": f"twin-{n}", "$metadata": {"$model": iface["@id"]},
+                        "sensor": {"$metadata": {}, "rate": 5}, **values})
+            twins.setdefault(n % len(devices), []).append(f"twin-{n}")
+    for index, ids in twins.items():  # "feeds" targets the next device Interface
+        targets = twins.get((index + 1) % len(devices))
+        out += [{"$relationshipId": f"rel-{dt_id}", "$sourceId": dt_id, "$relationshipName": "feeds",
+                 "$targetId": rng.choice(targets)} for dt_id in ids if targets]
+    if array:
+        return ("[\n" + ",\n".join(json.dumps(r, indent=1) for r in out) + "\n]\n").encode("utf-8")
+    return "".join(json.dumps(r) + "\n" for r in out).encode("utf-8")
+
+_seed_fixtures()
+s3io.S3 = FIXTURE_S3
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+class RecordingClient:
+    """boto3 client stand-in that records every API call instead of sending it."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda **kwargs: self.calls.append((name, kwargs)) or {}
+
+class LocalDynamo:
+    """In-memory DynamoDB stand-in for get_item/put_item (no condition expressions)."""
+
+    def __init__(self):
+        self.items, self.calls = {}, Counter()
+
+    def get_item(self, TableName, Key, **_):
+        self.calls["get_item"] += 1
+        item = self.items.get((TableName, json.dumps(Key, sort_keys=True)))
+        return {"Item": json.loads(item)} if item else {}
+
+    def put_item(self, TableName, Item, **_):
+        self.calls["put_item"] += 1
+        key = {"key": Item["key"]}
+        self.items[(TableName, json.dumps(key, sort_keys=True))] = json.dumps(Item)
+        return {}
+
+def _timed(fn, iterations: int) -> list:
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+def _report(label: str, samples: list, extra: str = ""):
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    print(f"{label:<28} n={len(samples):<6} p50={p(0.50):8.3f}ms  p99={p(0.99):8.3f}ms  "
+          f"mean={statistics.fmean(samples):8.3f}ms {extra}")
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+def bench_opa(args):
+    denied = dict(SAMPLE_EVENT, user={"id": "bob@vaultmesh.io", "group": "VaultMesh-Sales"})
+    for label, legacy in (("per-rule queries", True), ("combined decision", False)):
+        with OpaStub(args.delay_ms, legacy=legacy) as opa:
+            vmq_common.OPA_URL = opa.url
+            vmq_common._DECISION_DOC = None
+            for name, evt in (("allow", SAMPLE_EVENT), ("deny", denied)):
+                start = opa.requests
+                samples = _timed(lambda: vmq_common.authorize_action(dict(evt)), args.iterations)
+                rt = (opa.requests - start) / args.iterations
+                _report(f"{label} [{name}]", samples, f"round_trips={rt:.2f}")
+
+    # An upgraded bundle is probed for the decision rule again: on a new revision, or once the wait runs out.
+    problems, reprobe = [], vmq_common.DECISION_REPROBE_SECONDS
+    with OpaStub(legacy=True) as opa:
+        vmq_common.OPA_URL = opa.url
+        try:
+            for how in ("new revision", "reprobe wait"):
+                opa.legacy, vmq_common._DECISION_DOC = True, None
+                vmq_common._opa_decision(dict(SAMPLE_EVENT))
+                opa.legacy = False
+                if how == "new revision":
+                    opa.revision += "+decision"
+                else:
+                    vmq_common.DECISION_REPROBE_SECONDS = 0
+                vmq_common._opa_decision(dict(SAMPLE_EVENT))
+                start = opa.requests
+                vmq_common._opa_decision(dict(SAMPLE_EVENT))
+                if vmq_common._DECISION_DOC is not True or opa.requests - start != 1:
+                    problems.append(f"{how}: still {opa.requests - start} round trips after the upgrade")
+        finally:
+            vmq_common.DECISION_REPROBE_SECONDS = reprobe
+    for p in problems:
+        print(f"✗ {p}")
+    print("✓ upgraded bundles switch to the combined decision" if not problems else "✗ decision probe check failed")
+    if problems:
+        sys.exit(1)
+
+def bench_pool(args):
+    with OpaStub(args.delay_ms) as opa:
+        vmq_common.OPA_URL = opa.url
+        for label, size in (("connection per request", 0), ("keep-alive pool", vmq_common.OPA_POOL_SIZE)):
+            vmq_common._OPA_POOL = vmq_common._HttpPool(opa.url, size=size)
+            vmq_common._DECISION_DOC = None
+            samples = _timed(lambda: vmq_common.authorize_action(dict(SAMPLE_EVENT)), args.iterations)
+            _report(label, samples, json.dumps(vmq_common._OPA_POOL.stats()))
+
+def bench_parity(args):
+    actions = sorted(set().union(*(REGO_TABLES[t] for t in compile_policy.TABLES)) | {"unknown-action"})
+    groups = sorted(vmq_common._POLICY["groups"]) + ["VaultMesh-Sales"]
+    stub = None if args.opa_url else OpaStub().__enter__()
+    vmq_common.OPA_URL = args.opa_url or stub.url
+    vmq_common._DECISION_DOC = None
+    mismatches = 0
+    try:
+        # The policy reads user.group only: a groups array alone, or next to group, must not change the answer.
+        users = [{"group": g} for g in groups]
+        users += [{"groups": [g]} for g in groups]
+        users += [{"group": g, "groups": [o for o in groups if o != g]} for g in groups]
+        for action in actions:
+            for user in users:
+                evt = {"action": action, "user": dict(user, id="parity@vaultmesh.io")}
+                want = vmq_common._opa_decision(dict(evt))
+                got = vmq_common._embedded_decision(dict(evt))
+                if want != got:
+                    mismatches += 1
+                    print(f"✗ {action} x {user}: opa={want} embedded={got}")
+
+        # A cached decision must only be reused for callers OPA answers the same way.
+        vmq_common._AUTHZ_CACHE, shared = vmq_common._DecisionCache(), groups[:2]
+        for action in actions:
+            for group in groups:
+                evt = {"action": action, "user": {"id": "parity@vaultmesh.io", "group": group, "groups": shared}}
+                want = vmq_common._opa_decision(dict(evt))
+                got = vmq_common.authorize_action(dict(evt))
+                if want != got:
+                    mismatches += 1
+                    print(f"✗ cached {action} x {group} (groups {shared}): opa={want} cache={got}")
+
+        # Likewise the per-batch memo: items of one batch that share groups but not group.
+        vmq_common._AUTHZ_CACHE = vmq_common._DecisionCache(size=0)
+        for action in actions:
+            memo = {}
+            for group in groups:
+                evt = {"action": action, "user": {"id": "parity@vaultmesh.io", "group": group, "groups": shared}}
+                want = vmq_common._opa_decision(dict(evt))
+                got = vmq_common.authorize_action(dict(evt, _batch_authz=memo))
+                if want != got:
+                    mismatches += 1
+                    print(f"✗ batch {action} x {group} (groups {shared}): opa={want} memo={got}")
+
+        # The static fallback keeps its own reading (user.groups, else user.group), batched or not.
+        vmq_common.OPA_URL, memo = "", {}
+        for action in actions:
+            for group in groups:
+                for user in ({"groups": [group]}, {"group": "VaultMesh-Sales", "groups": [group]}):
+                    evt = {"action": action, "user": dict(user, id="parity@vaultmesh.io")}
+                    want = group in vmq_common._GREEN.get(action, {}).get("groups", ())
+                    got = vmq_common.authorize_action(dict(evt, _batch_authz=memo))[0]
+                    if want != got:
+                        mismatches += 1
+                        print(f"✗ fallback {action} x {user}: want allowed={want}, got {got}")
+    finally:
+        vmq_common._AUTHZ_CACHE = vmq_common._DecisionCache(size=0)
+        if stub:
+            stub.__exit__()
+    total = len(actions) * (len(users) + 4 * len(groups))
+    print(f"{'✓' if not mismatches else '✗'} {total - mismatches}/{total} action x user decisions match "
+          f"(policy {vmq_common._POLICY['revision']})")
+    if mismatches:
+        sys.exit(1)
+
+class FakeContext:
+    """Lambda context stand-in with a fixed remaining-time budget."""
+
+    def __init__(self, remaining_ms: float):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+def bench_breaker(args):
+    # OPA answers slower than the deadline allows, so every call times out.
+    ctx = FakeContext(vmq_common.AUTHZ_RESERVE_MS + args.budget_ms)
+    with OpaStub(delay_ms=args.budget_ms * 4) as opa:
+        vmq_common.OPA_URL = opa.url
+        for label, min_calls in (("no breaker", 10 ** 9), ("circuit breaker", vmq_common.OPA_BREAKER_MIN_CALLS)):
+            vmq_common._OPA_BREAKER = vmq_common._CircuitBreaker(min_calls=min_calls)
+            vmq_common._OPA_POOL = None
+            samples = _timed(lambda: vmq_common.authorize_action(dict(SAMPLE_EVENT), ctx), args.iterations)
+            _report(label, samples, f"state={vmq_common._OPA_BREAKER.state}")
+
+    # Half-open probe with no time left: the fallback must not hold the probe slot,
+    # or OPA is never asked again in this container.
+    problems = []
+    with OpaStub() as opa:
+        vmq_common.OPA_URL, vmq_common._OPA_POOL = opa.url, None
+        breaker = vmq_common._OPA_BREAKER = vmq_common._CircuitBreaker(cooldown=0.05)
+        breaker._transition("open")
+        time.sleep(0.1)
+        late, evt = dict(SAMPLE_EVENT), dict(SAMPLE_EVENT)
+        with contextlib.redirect_stdout(io.StringIO()):  # transition metrics
+            vmq_common.authorize_action(late, FakeContext(vmq_common.AUTHZ_RESERVE_MS / 2))
+            vmq_common.authorize_action(evt, FakeContext(vmq_common.AUTHZ_RESERVE_MS + args.budget_ms))
+        if late["_authz"] != {"source": "fallback", "deadline": "exceeded"}:
+            problems.append(f"probe past the deadline decided by {late['_authz']}")
+        if evt["_authz"].get("source") != "opa" or breaker.state != "closed":
+            problems.append(f"next call with time left got {evt['_authz']}, breaker {breaker.state}")
+        print(f"  half-open probe past the deadline: next call {evt['_authz'].get('source')}, "
+              f"breaker {breaker.state}")
+    vmq_common.OPA_URL, vmq_common._OPA_POOL = None, None
+    vmq_common._OPA_BREAKER = vmq_common._CircuitBreaker()
+    for p in problems:
+        print(f"✗ {p}")
+    print("✓ a probe skipped for lack of time leaves the breaker free to probe again"
+          if not problems else "✗ breaker check failed")
+    if problems:
+        sys.exit(1)
+
+def _validate_emf(doc: dict) -> list:
+    """Return schema problems for one EMF document (empty list = valid)."""
+    problems = []
+    meta = doc.get("_aws")
+    if not isinstance(meta, dict) or not isinstance(meta.get("Timestamp"), int):
+        return ["_aws.Timestamp must be an integer (epoch ms)"]
+    directives = meta.get("CloudWatchMetrics")
+    if not isinstance(directives, list) or not directives:
+        return ["_aws.CloudWatchMetrics must be a non-empty list"]
+    for d in directives:
+        if d.get("Namespace") != vmq_common.METRICS_NAMESPACE:
+            problems.append(f"unexpected namespace {d.get('Namespace')!r}")
+        for dimset in d.get("Dimensions", []):
+            for name in dimset:
+                if not isinstance(doc.get(name), str):
+                    problems.append(f"dimension {name} missing or not a string")
+        if not d.get("Metrics"):
+            problems.append("directive without metrics")
+        for m in d.get("Metrics", []):
+            if not isinstance(doc.get(m.get("Name")), (int, float)):
+                problems.append(f"metric {m.get('Name')} missing or not numeric")
+    return problems
+
+def bench_emf(args):
+    handler = registry.handler_for("summarize-docs")
+    recorder = RecordingClient()
+    vmq_common.CW, vmq_common.METRICS_MODE, vmq_common.OPA_URL = recorder, "emf", None
+
+    connects = []
+    real_connect = socket.socket.connect
+    socket.socket.connect = lambda sock, addr: connects.append(addr) or real_connect(sock, addr)
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            samples = _timed(lambda: handler(dict(SAMPLE_EVENT), None), args.iterations)
+    finally:
+        socket.socket.connect = real_connect
+
+    docs = [json.loads(line) for line in out.getvalue().splitlines() if line.startswith('{"')]
+    problems = [p for d in docs for p in _validate_emf(d)]
+    names = {m["Name"] for d in docs for m in d["_aws"]["CloudWatchMetrics"][0]["Metrics"]} if docs else set()
+    if not {"ActionsInvoked", "ActionLatency"} <= names:
+        problems.append(f"expected ActionsInvoked and ActionLatency, got {sorted(names)}")
+    if len(docs) != args.iterations:
+        problems.append(f"expected {args.iterations} EMF lines, got {len(docs)}")
+    if recorder.calls or connects:
+        problems.append(f"{len(recorder.calls)} CloudWatch API calls, {len(connects)} socket connects")
+
+    _report("handler with EMF metrics", samples, f"emf_lines={len(docs)} api_calls={len(recorder.calls)}")
+    for p in sorted(set(problems)):
+        print(f"✗ {p}")
+    print("✓ EMF output valid, zero outbound calls" if not problems else "✗ EMF check failed")
+    if problems:
+        sys.exit(1)
+
+def bench_metrics(args):
+    handlers = {a: registry.handler_for(a) for a in registry.ACTION_FUNCTIONS}
+    recorder = RecordingClient()
+    vmq_common.CW, vmq_common.METRICS_MODE, vmq_common.OPA_URL = recorder, "api", None
+    vmq_common._METRICS = vmq_common._MetricsBuffer(flush_seconds=args.flush_seconds)
+
+    def invoke(i=[0]):
+        evt = json.loads(json.dumps(TEST_EVENTS[i[0] % len(TEST_EVENTS)]))
+        i[0] += 1
+        handlers[evt["action"]](evt, None)
+
+    samples = _timed(invoke, args.iterations)
+    vmq_common._METRICS.flush()  # what SIGTERM/atexit does at shutdown
+
+    data = [m for name, kw in recorder.calls for m in kw["MetricData"]]
+    invoked = sum(m["StatisticValues"]["SampleCount"] for m in data if m["MetricName"] == "ActionsInvoked")
+    largest = max((len(kw["MetricData"]) for _, kw in recorder.calls), default=0)
+    _report("aggregated api metrics", samples,
+            f"api_calls={len(recorder.calls)} (per-request: {args.iterations}) largest_batch={largest}")
+    ok_ = invoked == args.iterations and largest <= vmq_common.METRICS_BATCH_SIZE
+    print(f"{'✓' if ok_ else '✗'} ActionsInvoked SampleCount={invoked:.0f} for {args.iterations} invocations")
+
+    # In Lambda with no extension there is no SIGTERM: no invocation may leave statistics behind.
+    # With a shutdown signal, an invocation ending in an error still flushes a buffer past its age.
+    hold, leftovers = vmq_common._HOLD_METRICS, 0
+    denied = dict(SAMPLE_EVENT, user={"id": "bench@vaultmesh.io", "group": "VaultMesh-Sales"})
+    try:
+        vmq_common.CW = recorder = RecordingClient()
+        vmq_common._METRICS, vmq_common._HOLD_METRICS = vmq_common._MetricsBuffer(flush_seconds=3600), False
+        for _ in range(20):
+            invoke()
+            leftovers += bool(vmq_common._METRICS._stats)
+        unsignalled = sum(m["StatisticValues"]["SampleCount"] for _, kw in recorder.calls for m in kw["MetricData"]
+                          if m["MetricName"] == "ActionsInvoked")
+        vmq_common._HOLD_METRICS = True
+        invoke()
+        vmq_common._METRICS.flush_seconds = 0
+        logging.disable(logging.WARNING)
+        handlers[denied["action"]](json.loads(json.dumps(denied)), None)
+        aged = not vmq_common._METRICS._stats
+    finally:
+        logging.disable(logging.NOTSET)
+        vmq_common._HOLD_METRICS, vmq_common._METRICS = hold, vmq_common._MetricsBuffer()
+    ok_ = ok_ and not leftovers and unsignalled == 20 and aged
+    print(f"{'✓' if not leftovers and unsignalled == 20 else '✗'} without a shutdown signal: "
+          f"{leftovers}/20 invocations left statistics buffered, SampleCount={unsignalled:.0f}")
+    print(f"{'✓' if aged else '✗'} an invocation ending in 403 flushed the aged buffer")
+    if not ok_:
+        sys.exit(1)
+
+_COLDSTART_PROBE = """
+import importlib.util, sys, time
+t0 = time.perf_counter()
+sys.path[:0] = [{root!r}, {fn_dir!r}]
+if {path!r}:
+    spec = importlib.util.spec_from_file_location("coldstart_target", {path!r})
+    spec.loader.exec_module(importlib.util.module_from_spec(spec))
+sys.stdout.write(repr((time.perf_counter() - t0) * 1000))
+"""
+
+def _coldstart_once(path: str) -> tuple:
+    """Import `path` in a fresh interpreter; return (init ms, {module: self import ms})."""
+    probe = _COLDSTART_PROBE.format(root=HERE, fn_dir=os.path.dirname(path) or HERE, path=path)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                          capture_output=True, text=True, check=True)
+    modules = {}
+    for line in proc.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        head, _, rest = line.partition(":")
+        parts = rest.split("|")
+        if head != "import time" or len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        modules[parts[2].strip()] = int(parts[0]) / 1000
+    return float(proc.stdout), modules
+
+def bench_coldstart(args):
+    targets = {a: os.path.join(HERE, d, "handler.py") for a, d in registry.ACTION_FUNCTIONS.items()}
+    targets["router"] = os.path.join(HERE, "router.py")
+    targets["job_worker"] = os.path.join(HERE, "job_worker.py")
+    targets["persona_helper"] = os.path.join(HERE, "persona_helper.py")
+    targets["scripts/persona-helper"] = os.path.join(HERE, "..", "scripts", "persona-helper.py")
+
+    # Modules already imported by the bare interpreter are not part of the handler's cost.
+    _, baseline = _coldstart_once("")
+    over = []
+    for name, path in targets.items():
+        runs = [_coldstart_once(path) for _ in range(args.runs)]
+        init_ms = statistics.median(r[0] for r in runs)
+        mods = {}
+        for _, m in runs:
+            for mod, ms in m.items():
+                if mod not in baseline:
+                    mods.setdefault(mod, []).append(ms)
+        top = sorted(((statistics.median(v), k) for k, v in mods.items()), reverse=True)[:args.top]
+        print(f"{name:<24} init={init_ms:8.2f}ms  " + "  ".join(f"{k}={ms:.2f}ms" for ms, k in top))
+        if args.max_ms and init_ms > args.max_ms:
+            over.append(name)
+    if over:
+        print(f"✗ over {args.max_ms}ms cold-start budget: {', '.join(over)}")
+        sys.exit(1)
+
+class _LogCapture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        msg = record.getMessage()
+        if msg.startswith("{"):
+            self.lines.append(json.loads(msg))
+
+def bench_phases(args):
+    handlers = {a: registry.handler_for(a) for a in registry.ACTION_FUNCTIONS}
+    vmq_common.OPA_URL, vmq_common.METRICS_MODE, vmq_common.CW = None, "api", RecordingClient()
+    capture = _LogCapture()
+    vmq_common.LOG.handlers = [capture]
+
+    def invoke(i=[0]):
+        evt = json.loads(json.dumps(TEST_EVENTS[i[0] % len(TEST_EVENTS)]))
+        i[0] += 1
+        handlers[evt["action"]](evt, None)
+
+    for enabled in (False, True):
+        vmq_common.PHASE_TIMING = enabled
+        gc.disable()
+        try:
+            samples = _timed(invoke, args.iterations)
+        finally:
+            gc.enable()
+        _report(f"phase timing {'on' if enabled else 'off'}", samples)
+
+    # Sums are checked on a clock that ticks 1 ms per reading, so they are exact and
+    # independent of scheduling: every timed block and every gap is a whole number of ticks.
+    ticks = iter(range(10 ** 9))
+    vmq_common.PHASE_CLOCK = lambda: next(ticks) / 1000
+    capture.lines.clear()
+    try:
+        for _ in range(args.iterations):
+            invoke()
+    finally:
+        vmq_common.PHASE_CLOCK = time.perf_counter
+
+    problems = 0
+    for line in capture.lines:
+        phases = line.get("phases") or {}
+        parts = [v for k, v in phases.items() if k != "total_ms"]
+        missing = {"authz_ms", "validate_ms", "work_ms", "emit_ms", "other_ms", "total_ms"} - set(phases)
+        if missing or sum(parts) != phases["total_ms"] or any(v != int(v) or v < 0 for v in parts):
+            problems += 1
+            if problems <= 5:
+                print(f"✗ {line['action']}: {phases} missing={sorted(missing)}")
+    print(f"{'✗' if problems else '✓'} {len(capture.lines) - problems}/{len(capture.lines)} "
+          "action_ok lines have authz+validate+work+emit+other summing exactly to total_ms")
+    if problems or not capture.lines:
+        sys.exit(1)
+
+def _simulate(arrivals, exec_ms, cold_ms, idle_ms, pool_of):
+    """Replay (arrival_ms, action) through Lambda-style warm pools; return (latencies, cold starts)."""
+    pools = {}
+    latencies, colds = [], 0
+    for (t, action), run_ms in zip(arrivals, exec_ms):
+        name = pool_of(action)
+        # Each container is [busy_until_ms]; idle ones past the keep-alive window are reclaimed.
+        pool = pools[name] = [c for c in pools.get(name, []) if t - c[0] <= idle_ms]
+        container = next((c for c in pool if c[0] <= t), None)
+        latency = run_ms
+        if container is None:
+            colds += 1
+            latency += cold_ms[name]
+            container = [0.0]
+            pool.append(container)
+        container[0] = t + latency
+        latencies.append(latency)
+    return latencies, colds
+
+def bench_router(args):
+    import router
+    vmq_common.OPA_URL, vmq_common.METRICS_MODE = None, "emf"
+    vmq_common.LOG.setLevel(logging.WARNING)
+
+    rng = random.Random(args.seed)
+    t, arrivals = 0.0, []
+    for _ in range(args.requests):
+        t += rng.expovariate(1.0 / args.gap_ms)
+        arrivals.append((t, rng.choice(TEST_EVENTS)["action"]))
+
+    # Real execution time of each request (same code path in both deployments).
+    events = {e["action"]: e for e in TEST_EVENTS}
+    exec_ms = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _, action in arrivals:
+            evt = json.loads(json.dumps(events[action]))
+            t0 = time.perf_counter()
+            router.handler(evt, None)
+            exec_ms.append((time.perf_counter() - t0) * 1000)
+
+    cold_ms = {a: statistics.median(_coldstart_once(os.path.join(HERE, d, "handler.py"))[0]
+                                    for _ in range(args.runs))
+               for a, d in registry.ACTION_FUNCTIONS.items()}
+    cold_ms["router"] = statistics.median(_coldstart_once(os.path.join(HERE, "router.py"))[0]
+                                          for _ in range(args.runs))
+
+    idle_ms = args.idle_s * 1000
+    for label, pool_of in (("six per-action functions", lambda a: a), ("single router", lambda a: "router")):
+        latencies, colds = _simulate(arrivals, exec_ms, cold_ms, idle_ms, pool_of)
+        _report(label, latencies, f"cold_starts={colds}")
+
+def bench_batch(args):
+    handler = registry.handler_for(SAMPLE_EVENT["action"])
+    vmq_common.METRICS_MODE = "emf"
+    vmq_common.LOG.setLevel(logging.WARNING)
+    item = {"params": SAMPLE_EVENT["params"]}
+    envelope = dict(SAMPLE_EVENT, events=[item] * args.items)
+    del envelope["params"]
+
+    def single():
+        for _ in range(args.items):
+            handler(json.loads(json.dumps(SAMPLE_EVENT)), None)
+
+    def batch():
+        resp = handler(json.loads(json.dumps(envelope)), None)
+        assert json.loads(resp["body"])["summary"]["succeeded"] == args.items, resp
+
+    with OpaStub(args.delay_ms) as opa:
+        vmq_common.OPA_URL = opa.url
+        for label, fn in ((f"{args.items} single invocations", single), (f"batch of {args.items}", batch)):
+            start, out = opa.requests, io.StringIO()
+            with contextlib.redirect_stdout(out):
+                samples = _timed(fn, args.iterations)
+            rt = (opa.requests - start) / args.iterations
+            emf = len(out.getvalue().splitlines()) / args.iterations
+            _report(label, samples, f"opa_round_trips={rt:.0f} emf_documents={emf:.0f}")
+
+def bench_summarize(args):
+    rng = random.Random(args.seed)
+    store = LocalS3(tempfile.mkdtemp(prefix="vmq-bench-summarize-"), latency_ms=args.latency_ms)
+    s3io.S3 = store
+    problems = []
+    try:
+        for size_kb in args.size_kb:
+            for count in args.docs:
+                uris = []
+                for i in range(count):
+                    store.put("bench", f"{size_kb}k/{i}.md", _synthetic_markdown(rng, size_kb * 1024))
+                    uris.append(f"s3://bench/{size_kb}k/{i}.md")
+                for label, workers in (("sequential", 1), ("pool", s3io.FETCH_WORKERS)):
+                    result = {}
+                    samples = _timed(lambda: result.update(summarize.summarize(uris, max_workers=workers)),
+                                     args.iterations)
+                    mean_s = statistics.fmean(samples) / 1000
+                    mb = sum(src["bytes"] for src in result["sources"]) / 1e6
+                    _report(f"{count:>3} x {size_kb}KB {label}", samples,
+                            f"docs/s={count / mean_s:7.1f} MB/s={mb / mean_s:6.1f}")
+                    if result["summaryMarkdown"].count("None identified"):
+                        problems.append(f"{count} x {size_kb}KB: a section came back empty")
+
+                tracemalloc.start()
+                summarize.summarize(uris[:1], max_workers=1)
+                one = tracemalloc.get_traced_memory()[1]
+                tracemalloc.reset_peak()
+                summarize.summarize(uris, max_workers=1)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"    peak python memory: {peak / 1024:.0f} KiB ({one / 1024:.0f} KiB for one document)")
+    finally:
+        s3io.S3 = FIXTURE_S3
+        shutil.rmtree(store.root, ignore_errors=True)
+
+    # An empty document list is a bad request, not a failed fetch.
+    empty = json.loads(json.dumps(SAMPLE_EVENT))
+    empty["params"]["documentUris"] = []
+    logging.disable(logging.WARNING)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            status = registry.handler_for("summarize-docs")(empty, None)["statusCode"]
+    finally:
+        logging.disable(logging.NOTSET)
+    if status != 400:
+        problems.append(f"empty documentUris answered {status}, expected 400")
+
+    for p in problems:
+        print(f"✗ {p}")
+    if problems:
+        sys.exit(1)
+
+def bench_faq(args):
+    rng = random.Random(args.seed)
+    store = LocalS3(tempfile.mkdtemp(prefix="vmq-bench-faq-"), latency_ms=args.latency_ms)
+    s3io.S3, faq.FAQ_CACHE_URI = store, "s3://bench-cache/faq/"
+    prefix = "s3://bench/kb/"
+    for i in range(args.docs):
+        store.put("bench", f"kb/{i:05d}.md", _synthetic_markdown(rng, args.size_kb * 1024))
+    changed = max(1, args.docs * args.changed_pct // 100)
+
+    def run(label, new_container=False):
+        if new_container:
+            faq._CACHE.clear()
+            faq._MANIFESTS.clear()
+        store.calls.clear()
+        t0 = time.perf_counter()
+        result = faq.generate(prefix, 12)
+        ms = (time.perf_counter() - t0) * 1000
+        d = result["documents"]
+        print(f"{label:<34} {ms:9.1f}ms  listed={d['listed']:<6} reprocessed={d['reprocessed']:<6} "
+              f"gets={store.calls['get_object']:<6} lists={store.calls['list_objects_v2']:<3} "
+              f"questions={result['questionCount']}")
+        return d
+
+    problems = []
+    try:
+        if run("cold (nothing cached)", new_container=True)["reprocessed"] != args.docs:
+            problems.append("cold run did not process every document")
+        if run("warm container")["reprocessed"]:
+            problems.append("warm run reprocessed documents")
+        if run("new container (manifest only)", new_container=True)["reprocessed"]:
+            problems.append("manifest did not cover the prefix")
+        for i in rng.sample(range(args.docs), changed):
+            store.put("bench", f"kb/{i:05d}.md", _synthetic_markdown(rng, args.size_kb * 1024))
+        if run(f"{changed} changed, new container", new_container=True)["reprocessed"] != changed:
+            problems.append("incremental run did not reprocess exactly the changed documents")
+
+        # Terms that strip to nothing are skipped: no failed document, no "What is ?".
+        store.put("bench", "odd/terms.md", b"# Glossary\n\n## Terms\n\n- ** **: no term\n- _ _ : y\n"
+                                           b"- **Tenant**: an organisation\n")
+        odd = faq.generate("s3://bench/odd/", 12)
+        if odd["documents"]["failed"] or "What is ?" in odd["faqMarkdown"] or "What is Tenant?" not in odd["faqMarkdown"]:
+            problems.append(f"empty terms: {odd['documents']} {odd['faqMarkdown']!r}")
+    finally:
+        s3io.S3, faq.FAQ_CACHE_URI = FIXTURE_S3, None
+        shutil.rmtree(store.root, ignore_errors=True)
+
+    for p in problems:
+        print(f"✗ {p}")
+    print("✓ only changed objects were reprocessed, empty terms skipped" if not problems else "✗ FAQ check failed")
+    if problems:
+        sys.exit(1)
+
+def bench_changenote(args):
+    rng = random.Random(args.seed)
+    for size_mb in args.size_mb:
+        v1 = _synthetic_spec(rng, int(size_mb * 1024 * 1024))
+        a_lines = v1.split("\n")
+        t0 = time.perf_counter()
+        base = mddiff.parse_lines(a_lines)
+        parse_ms = (time.perf_counter() - t0) * 1000
+        print(f"{size_mb}MB spec: {len(a_lines)} lines, {len(base.sections)} sections, parse {parse_ms:.1f}ms")
+        for changes in args.changes:
+            structural = max(1, changes // 10)
+            v2 = _revise(v1, rng, changes, structural, structural, structural)
+            b_lines = v2.split("\n")
+            updated = mddiff.parse_lines(b_lines)
+
+            result = {}
+            section = _timed(lambda: result.update(mddiff.diff(base, updated)), args.iterations)
+            whole = _timed(lambda: mddiff.myers(a_lines, b_lines, max_d=10 ** 9), args.iterations)
+            counts = "/".join(str(len(result[k])) for k in ("modified", "added", "removed", "moved", "reordered"))
+            _report(f"  {changes:>4} changes section diff", section, f"mod/add/rm/mv/reord={counts}")
+            _report(f"  {changes:>4} changes whole-doc myers", whole)
+            if not args.skip_difflib:
+                naive = _timed(lambda: list(difflib.unified_diff(a_lines, b_lines, n=0)), 1)
+                _report(f"  {changes:>4} changes difflib", naive)
+
+def bench_validate(args):
+    rng = random.Random(args.seed)
+    store = LocalS3(tempfile.mkdtemp(prefix="vmq-bench-validate-"), latency_ms=args.latency_ms)
+    s3io.S3 = store
+    problems = []
+    try:
+        for count in args.interfaces:
+            model = _synthetic_model(rng, count)
+            uri = f"s3://bench/models/{count}.json"
+            store.put("bench", f"models/{count}.json", json.dumps(model).encode("utf-8"))
+            states = []
+
+            def cold():
+                schemaval._CACHE.clear()
+                states.append(schemaval.validate(uri)["stats"]["cache"])
+
+            cold_samples = _timed(cold, args.iterations)
+            compile_samples = _timed(lambda: schemaval.compile_model(model, "both"), args.iterations)
+            store.calls.clear()
+            warm_samples = _timed(lambda: states.append(schemaval.validate(uri)["stats"]["cache"]), args.iterations)
+            _report(f"{count:>4} interfaces cold", cold_samples)
+            _report(f"{count:>4} interfaces (compile only)", compile_samples)
+            _report(f"{count:>4} interfaces warm", warm_samples,
+                    f"gets={store.calls['get_object']} cache={Counter(states[args.iterations:])}")
+            if set(states[:args.iterations]) != {"miss"} or set(states[args.iterations:]) != {"hit"}:
+                problems.append(f"{count} interfaces: cold/warm cache states were {Counter(states)}")
+            report = schemaval.validate(uri)
+            if report["stats"]["errors"]:
+                problems.append(f"{count} interfaces: clean model reported {report['issues'][:3]}")
+
+        model = _synthetic_model(rng, 10)
+        store.put("bench", "models/instances.json", json.dumps(model).encode("utf-8"))
+        uri = "s3://bench/models/instances.json"
+        for label, bad_pct, array in (("ndjson", 0, False), ("json array", 0, True), ("ndjson, all bad", 100, False)):
+            store.put("bench", "twins.json", _synthetic_instances(rng, model, args.records, bad_pct, array))
+            report = {}
+            samples = _timed(lambda: report.update(schemaval.validate(uri, "both", "s3://bench/twins.json")),
+                             args.iterations)
+            stats = report["stats"]
+            mean_s = statistics.fmean(samples) / 1000
+            _report(f"{args.records} records {label}", samples,
+                    f"records/s={stats['records'] / mean_s:9.0f} MB/s={stats['bytes'] / 1e6 / mean_s:5.1f} "
+                    f"checked={stats['records']} errors={stats['errors']}")
+            if bad_pct == 0 and (stats["errors"] or stats["warnings"]):
+                problems.append(f"{label}: clean instances reported {report['issues'][:3]}")
+            if bad_pct and not (stats["truncated"] and stats["records"] < args.records):
+                problems.append(f"{label}: validation did not stop at {schemaval.VALIDATE_MAX_ISSUES} issues")
+
+        # Enum values that are lists or objects are issues, not a crash.
+        device = next(i for i in model if ":Device" in i["@id"])
+        short = device["@id"].split(";")[0].rsplit(":", 1)[-1]
+        odd = [{"$dtId": "twin-list", "$metadata": {"$model": device["@id"]}, "mode": ["auto"]},
+               {"id": f"urn:ngsi-ld:{short}:dict", "type": short, "mode": {"type": "Property", "value": {"x": 1}}}]
+        store.put("bench", "odd.json", "".join(json.dumps(r) + "\n" for r in odd).encode("utf-8"))
+        try:
+            issues = schemaval.validate(uri, "both", "s3://bench/odd.json")["issues"]
+            enum = [i for i in issues if "is not one of" in json.dumps(i)]
+            print(f"    list/dict enum values: {len(enum)} issue(s)")
+            if len(enum) != len(odd):
+                problems.append(f"list/dict enum values: expected {len(odd)} 'is not one of' issues, got {issues}")
+        except TypeError as e:
+            problems.append(f"list/dict enum values raised {e!r}")
+
+        # The ETag map is bounded like the validators; counters stay exact under concurrent loads.
+        shared, small = schemaval._CACHE, schemaval._ValidatorCache(size=4)
+        schemaval._CACHE = small
+        try:
+            for n in range(10):
+                store.put("bench", f"models/many-{n}.json", json.dumps(_synthetic_model(rng, 2)).encode("utf-8"))
+                schemaval.load_validator(f"s3://bench/models/many-{n}.json", "both")
+            loads = lambda: [schemaval.load_validator("s3://bench/models/many-9.json", "both") for _ in range(50)]
+            threads = [threading.Thread(target=loads) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            print(f"    10 models through a 4-entry cache: etags={len(small._etags)} "
+                  f"hits={small.hits} misses={small.misses}")
+            if len(small._etags) > small.size or small.hits + small.misses != 10 + 8 * 50:
+                problems.append(f"validator cache: {len(small._etags)} etags kept, "
+                                f"{small.hits + small.misses} of {10 + 8 * 50} loads counted")
+        finally:
+            schemaval._CACHE = shared
+
+        tracemalloc.start()
+        schemaval.validate(uri, "both", "s3://bench/twins.json")
+        store.put("bench", "twins.json", _synthetic_instances(rng, model, args.records * 4))
+        tracemalloc.reset_peak()
+        schemaval.validate(uri, "both", "s3://bench/twins.json")
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"    peak python memory for {args.records * 4} records: {peak / 1024:.0f} KiB")
+    finally:
+        s3io.S3 = FIXTURE_S3
+        schemaval._CACHE.clear()
+        shutil.rmtree(store.root, ignore_errors=True)
+
+    for p in problems:
+        print(f"✗ {p}")
+    print("✓ warm validations reused the compiled validator" if not problems else "✗ validation check failed")
+    if problems:
+        sys.exit(1)
+
+def _pack_child(args):
+    """Build one pack inside this (fresh) interpreter and print its peak RSS as JSON."""
+    store = LocalS3(args.child_root)
+    s3io.S3 = store
+    uris = [f"s3://bench/{key}" for key in json.loads(args.child_keys)]
+    idle = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    dedupe = None
+    if args.child_mode != "buffered":  # streaming (cold content store) or warm (second pack, same sources)
+        result = pack.build(uris, f"s3://bench-out/packages/{args.child_mode}.zip",
+                            {"regime": "ISO27k", "request_id": "bench", "requested_by": "bench"},
+                            cas_root="s3://bench-out/cas/")
+        size, parts, dedupe = result["bytes"], store.calls["upload_part"], result["dedupe"]
+    else:  # whole archive in memory, then one put_object
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=pack.PACK_COMPRESS_LEVEL) as zf:
+            for uri in uris:
+                bucket, key = s3io.parse_uri(uri)
+                zf.writestr(key, store.get_object(Bucket=bucket, Key=key)["Body"].read())
+        store.put_object(Bucket="bench-out", Key="packages/buffered.zip", Body=buf.getvalue())
+        size, parts = buf.tell(), 0
+    print(json.dumps({"seconds": time.perf_counter() - t0, "idle_kb": idle, "bytes": size, "parts": parts,
+                      "peak_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "dedupe": dedupe,
+                      "source_bytes": store.calls["bytes_out:bench"]}))
+
+def _verify_pack(path: str) -> list:
+    """Problems found in a finished pack: CRCs, manifest hashes and required members."""
+    problems = []
+    with zipfile.ZipFile(path) as zf:
+        names = set(zf.namelist())
+        for required in ("README.md", "manifest.json", "MANIFEST.sha256"):
+            if required not in names:
+                problems.append(f"{required} missing from the archive")
+        sums = dict(reversed(line.split("  ", 1)) for line in zf.read("MANIFEST.sha256").decode().splitlines())
+        for name in names - {"MANIFEST.sha256"}:
+            digest = hashlib.sha256()
+            with zf.open(name) as f:  # also checks the CRC
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            if sums.get(name) != digest.hexdigest():
+                problems.append(f"{name}: SHA-256 does not match MANIFEST.sha256")
+    return problems
+
+def _compare_packs(cold: str, warm: str) -> list:
+    """A pack built from stored blobs must list the same content as the one built from the sources."""
+    def listing(path):
+        with zipfile.ZipFile(path) as zf:
+            return [(f["path"], f["sha256"], f["bytes"]) for f in json.loads(zf.read("manifest.json"))["files"]]
+    cold_files, warm_files = listing(cold), listing(warm)
+    dup = cold_files[-1]
+    cold_files[-1] = (cold_files[0][0], dup[1], dup[2])  # the copy is folded into the original in the warm pack
+    return [] if cold_files == warm_files else [f"warm pack content differs: {cold_files} != {warm_files}"]
+
+def bench_pack(args):
+    if args.child_root:
+        return _pack_child(args)
+    rng = random.Random(args.seed)
+    root = tempfile.mkdtemp(prefix="vmq-bench-pack-")
+    store = LocalS3(root)
+    keys, per_file = [], int(args.size_mb * 1024 * 1024 / args.files)
+    text = _synthetic_markdown(rng, 1024 * 1024)
+    for n in range(args.files):
+        # Alternate compressible Markdown with incompressible "PDFs" (stored, not deflated).
+        key = f"evidence/{n:03d}.md" if n % 2 == 0 else f"evidence/{n:03d}.pdf"
+        path = store._path("bench", key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            written = 0
+            while written < per_file:
+                block = (text + f"\n<!-- file {n} block {written} -->\n".encode()) if key.endswith(".md") else \
+                    rng.randbytes(1024 * 1024)
+                block = block[:per_file - written]
+                f.write(block)
+                written += len(block)
+        keys.append(key)
+    # The same evidence filed twice under another name: stored once per pack once it is known.
+    shutil.copyfile(store._path("bench", keys[0]), store._path("bench", "evidence/copy-of-000.md"))
+    keys.append("evidence/copy-of-000.md")
+    print(f"pack of {len(keys)} sources, {args.size_mb:.0f} MB total (function memory: {args.memory_mb} MB)")
+    problems = []
+    try:
+        modes = ["streaming", "warm"] + (["buffered"] if args.baseline else [])
+        for mode in modes:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "pack", "--child-root", root,
+                                   "--child-mode", mode, "--child-keys", json.dumps(keys)],
+                                  capture_output=True, text=True)
+            if proc.returncode:
+                problems.append(f"{mode}: child failed: {proc.stderr.strip().splitlines()[-1:]}")
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(f"  {mode:<10} {r['seconds']:7.2f}s  archive={r['bytes'] / 1e6:7.1f}MB  parts={r['parts']:<4} "
+                  f"peak RSS={r['peak_kb'] / 1024:6.1f}MB (idle {r['idle_kb'] / 1024:.1f}MB)  "
+                  f"MB/s={args.size_mb / r['seconds']:6.1f}  origin reads={r['source_bytes'] / 1e6:.1f}MB")
+            if mode == "buffered":
+                continue
+            d = r["dedupe"]
+            print(f"  {'':<10} content store: reused={d['reused']} duplicates={d['duplicates']} "
+                  f"saved={d['bytesSaved'] / 1e6:.1f}MB ({d['ratio']:.1f}%)")
+            if r["peak_kb"] / 1024 >= args.memory_mb:
+                problems.append(f"{mode} peak RSS {r['peak_kb'] / 1024:.0f}MB exceeds {args.memory_mb}MB")
+            problems += _verify_pack(store._path("bench-out", f"packages/{mode}.zip"))
+            if mode == "warm" and (d["reused"] != args.files or d["duplicates"] != 1 or r["source_bytes"]):
+                problems.append(f"warm pack did not reuse every stored source: {d}")
+        if not problems:
+            problems += _compare_packs(*(store._path("bench-out", f"packages/{m}.zip") for m in ("streaming", "warm")))
+        if os.path.isdir(os.path.join(root, ".uploads")) and os.listdir(os.path.join(root, ".uploads")):
+            problems.append("an incomplete multipart upload was left behind")
+        if os.path.isdir(store._path("bench-out", "cas/staging")) and os.listdir(store._path("bench-out", "cas/staging")):
+            problems.append("a staged content-store blob was left behind")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    for p in problems:
+        print(f"✗ {p}")
+    print(f"✓ pack verified (CRCs, SHA-256 manifest) within {args.memory_mb} MB" if not problems
+          else "✗ pack check failed")
+    if problems:
+        sys.exit(1)
+
+def _jira_items(rng: random.Random, count: int, dup_pct: float, description_kb: float) -> list:
+    words = ("rotate", "ledger", "twin", "gateway", "policy", "audit", "export", "sensor", "quorum", "drift",
+             "token", "replica", "schema", "alert", "backfill", "tenant")
+    items = []
+    for n in range(count):
+        if items and rng.random() < dup_pct / 100:
+            # Same issue filed again with different case and spacing.
+            dup = dict(rng.choice(items))
+            dup["summary"] = "  " + dup["summary"].upper().replace(" ", "  ")
+            dup["labels"] = ["duplicate-import"]
+            items.append(dup)
+            continue
+        summary = f"{' '.join(rng.choice(words) for _ in range(5)).capitalize()} ({n})"
+        text = " ".join(rng.choice(words) for _ in range(int(description_kb * 1024 / 7)))
+        items.append({"summary": summary, "description": f"h3. Context\n{text}\n\nh3. Done when\n* {summary}",
+                      "labels": ["backlog-import"]})
+    return items
+
+def bench_jira(args):
+    handler = registry.handler_for("create-jira-draft")
+    vmq_common.METRICS_MODE = "emf"
+    vmq_common.LOG.setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    items = _jira_items(rng, args.items, args.dup_pct, args.description_kb)
+    base = {"action": "create-jira-draft", "user": {"id": "dana@vaultmesh.io", "group": "VaultMesh-Delivery"},
+            "context": {"request_id": "bench", "persona": "delivery-manager"}}
+    problems, pages = [], []
+
+    def single():
+        for item in items:
+            resp = handler(dict(base, params=dict(item, projectKey="VM")), None)
+            assert resp["statusCode"] == 200, resp
+
+    def bulk():
+        pages.clear()
+        cursor = 0
+        while cursor is not None:
+            resp = handler(dict(base, params={"projectKey": "VM", "issues": items, "cursor": cursor}), None)
+            assert resp["statusCode"] == 200, resp
+            pages.append((len(json.dumps(resp)), json.loads(resp["body"])["jiraBulk"]))
+            cursor = pages[-1][1].get("nextCursor")
+
+    print(f"{args.items} issues, ~{args.description_kb:g} KB descriptions, {args.dup_pct:g}% re-filed duplicates")
+    with OpaStub(args.delay_ms) as opa, contextlib.redirect_stdout(io.StringIO()):
+        vmq_common.OPA_URL = opa.url
+        results = []
+        for label, fn in ((f"{args.items} single invocations", single), ("bulk (all pages)", bulk)):
+            start = opa.requests
+            results.append((label, _timed(fn, args.iterations), (opa.requests - start) / args.iterations))
+    for label, samples, rt in results:
+        _report(label, samples, f"issues/s={args.items / (statistics.fmean(samples) / 1000):9.0f} "
+                                f"opa_round_trips={rt:.0f}")
+
+    first = pages[0][1]["summary"]
+    drafted = [i for _, page in pages for chunk in page["chunks"] for i in chunk["items"]]
+    largest = max(size for size, _ in pages)
+    print(f"  pages={len(pages)} chunks={sum(p['summary']['chunks'] for _, p in pages)} drafted={first['drafted']} "
+          f"duplicates={first['duplicates']} invalid={first['invalid']} largest response={largest / 1e6:.2f}MB")
+    if largest > 6 * 1000 * 1000:
+        problems.append(f"a response is {largest} bytes, over the 6 MB Lambda limit")
+    kept = [r["index"] for r in pages[0][1]["items"] if r["status"] == "drafted"]
+    if drafted != kept:
+        problems.append("pages did not return every drafted issue exactly once")
+    if any(len(c["body"]["issueUpdates"]) > jirabulk.JIRA_BULK_CHUNK_ISSUES for _, p in pages for c in p["chunks"]):
+        problems.append("a chunk exceeds the Jira bulk-create limit")
+    expected = len({(" ".join(i["summary"].split()).casefold(), i["description"]) for i in items})
+    if first["drafted"] != expected:
+        problems.append(f"{first['drafted']} drafts, expected {expected} distinct issues")
+
+    for p in problems:
+        print(f"✗ {p}")
+    print("✓ bulk drafts complete, deduplicated and within the response limit" if not problems
+          else "✗ jira check failed")
+    if problems:
+        sys.exit(1)
+
+def _wait_for_jobs(status_handler, user: dict, job_ids: list, timeout_s: float) -> dict:
+    """Poll get-job-status until every job is final; returns {jobId: job view}."""
+    views, deadline = {}, time.monotonic() + timeout_s
+    while len(views) < len(job_ids) and time.monotonic() < deadline:
+        for job_id in job_ids:
+            if job_id in views:
+                continue
+            resp = status_handler({"action": "get-job-status", "user": user, "params": {"jobId": job_id}}, None)
+            job = json.loads(resp["body"]).get("job") or {}
+            if job.get("status") in (jobs.SUCCEEDED, jobs.FAILED):
+                views[job_id] = job
+        time.sleep(0.01)
+    return views
+
+class _NoPutS3(LocalS3):
+    """LocalS3 that refuses every write."""
+
+    def put_object(self, **kwargs):
+        raise _S3Error("AccessDenied", "injected write failure")
+
+def bench_jobs(args):
+    import job_worker
+    vmq_common.OPA_URL, vmq_common.METRICS_MODE = None, "emf"
+    vmq_common.LOG.setLevel(logging.WARNING)
+    root = tempfile.mkdtemp(prefix="vmq-bench-jobs-")
+    jobs.reset(f"sqlite:{os.path.join(root, 'jobs.sqlite3')}")
+    s3io.S3 = LocalS3(FIXTURE_DIR, latency_ms=args.latency_ms)  # slow sources: the work outlasts a chat turn
+    status = registry.handler_for("get-job-status")
+    events = [e for e in TEST_EVENTS if e["action"] in ("compliance-pack", "generate-faq")]
+    problems = []
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            sync = {e["action"]: _timed(lambda e=e: registry.handler_for(e["action"])(json.loads(json.dumps(e)), None),
+                                        1)[0] for e in events}
+            submitted, submit_ms = [], []
+            for i in range(args.jobs):
+                evt = json.loads(json.dumps(events[i % len(events)]))
+                evt["params"]["async"] = True
+                t0 = time.perf_counter()
+                resp = registry.handler_for(evt["action"])(evt, None)
+                submit_ms.append((time.perf_counter() - t0) * 1000)
+                submitted.append((evt, json.loads(resp["body"]).get("jobId")))
+            t0, views = time.perf_counter(), {}
+            for e in events:
+                views.update(_wait_for_jobs(status, e["user"], [j for se, j in submitted if se["user"] == e["user"]],
+                                            args.timeout_s))
+            drain_s = time.perf_counter() - t0
+            other = status({"action": "get-job-status", "user": {"id": "mallory@vaultmesh.io",
+                                                                 "group": "VaultMesh-Engineering"},
+                            "params": {"jobId": submitted[0][1]}}, None)
+
+            # SQS path: submit with a queue configured, then hand the recorded message to job_worker.
+            queue_client, jobs.JOB_QUEUE_URL = RecordingClient(), "https://sqs.local/vmq-jobs"
+            jobs.SQS = queue_client
+            try:
+                evt = json.loads(json.dumps(events[0]))
+                evt["params"]["async"] = True
+                with contextlib.redirect_stdout(io.StringIO()) as emf:
+                    queued_id = json.loads(registry.handler_for(evt["action"])(evt, None)["body"])["jobId"]
+                    records = [{"messageId": str(n), "body": kw["MessageBody"]} for n, (_, kw) in
+                               enumerate(queue_client.calls)]
+                    worker_resp = job_worker.handler({"Records": records + records}, None)  # redelivered once
+                docs = [json.loads(line) for line in emf.getvalue().splitlines() if line.startswith("{")]
+                counted = {m: sum(d.get(m, 0) for d in docs) for m in ("ActionsInvoked", "JobsSubmitted")}
+                queued_view = _wait_for_jobs(status, evt["user"], [queued_id], 1.0).get(queued_id, {})
+
+                # A result that cannot be written fails the job instead of leaving it running.
+                s3io.S3, jobs.JOB_RESULT_URI = _NoPutS3(FIXTURE_DIR), "s3://bench-jobs/jobs/"
+                unstored_id = json.loads(registry.handler_for(evt["action"])(evt, None)["body"])["jobId"]
+                logging.disable(logging.ERROR)  # the failed write is logged with its traceback
+                try:
+                    unstored = (jobs.run(unstored_id, None), jobs.status(unstored_id, evt["user"]["id"]))
+                finally:
+                    logging.disable(logging.NOTSET)
+
+                # Jobs submitted without a user id are readable by nobody, not by every anonymous caller.
+                anon = dict(evt, user={"group": evt["user"]["group"]})
+                anon_id = json.loads(registry.handler_for(evt["action"])(anon, None)["body"])["jobId"]
+                anon_view = status(dict(anon, action="get-job-status", params={"jobId": anon_id}), None)
+            finally:
+                jobs.SQS, jobs.JOB_QUEUE_URL, jobs.JOB_RESULT_URI = None, "", ""
+
+        for action, ms in sync.items():
+            print(f"{'sync ' + action:<28} {ms:9.1f}ms")
+        _report("async submit", submit_ms, f"jobs={args.jobs} drained in {drain_s:.2f}s "
+                                           f"({jobs.JOB_WORKERS} in-process workers)")
+        failed = [v for v in views.values() if v["status"] != jobs.SUCCEEDED]
+        if len(views) != args.jobs or failed:
+            problems.append(f"{args.jobs - len(views)} job(s) unfinished, {len(failed)} failed: {failed[:1]}")
+        if not all((v.get("progress") or {}).get("done") == (v.get("progress") or {}).get("total")
+                   for v in views.values() if v["action"] == "compliance-pack"):
+            problems.append("compliance-pack jobs did not report their final progress")
+        if views and max(submit_ms) > min(sync.values()):
+            problems.append("submitting a job took longer than running the action")
+        if other["statusCode"] != 404:
+            problems.append(f"another user's job was visible: {other['statusCode']}")
+        if worker_resp["batchItemFailures"] or queued_view.get("status") != jobs.SUCCEEDED:
+            problems.append(f"SQS worker path failed: {worker_resp} {queued_view}")
+        print(f"  sqs worker: {len(queue_client.calls)} message(s), redelivery skipped, "
+              f"status={queued_view.get('status')}, metrics={counted}")
+        if counted != {"ActionsInvoked": 1, "JobsSubmitted": 1}:
+            problems.append(f"one job counted as {counted}, expected one invocation and one submit")
+        print(f"  result write denied: status={unstored[1]['status']} error={unstored[1].get('error')!r}")
+        if unstored[0] != jobs.FAILED or unstored[1]["status"] != jobs.FAILED or not unstored[1].get("error"):
+            problems.append(f"a job whose result could not be stored ended as {unstored}")
+        if anon_view["statusCode"] != 404:
+            problems.append(f"an anonymous caller read an anonymous job: {anon_view['statusCode']}")
+    finally:
+        s3io.S3 = FIXTURE_S3
+        jobs.reset()
+        shutil.rmtree(root, ignore_errors=True)
+
+    for p in problems:
+        print(f"✗ {p}")
+    print("✓ jobs queued at once, completed out of band, visible to their owner only" if not problems
+          else "✗ jobs check failed")
+    if problems:
+        sys.exit(1)
+
+def _replay_traffic(rng: random.Random, count: int, retry_pct: float, repeat_pct: float) -> list:
+    """(event, kind) stream of new requests, retries (same request_id) and repeats (new request_id)."""
+    base = [e for e in TEST_EVENTS if e["action"] != "create-jira-draft"]
+    sent, out = [], []
+    for n in range(count):
+        roll = rng.random() * 100
+        if sent and roll < retry_pct:
+            evt, kind = rng.choice(sent), "retry"
+        elif sent and roll < retry_pct + repeat_pct:
+            evt = json.loads(json.dumps(rng.choice(sent)))
+            evt["context"]["request_id"], kind = f"q-{n}", "repeat"
+        else:
+            evt = json.loads(json.dumps(base[n % len(base)]))
+            evt["context"]["request_id"], kind = f"q-{n}", "new"
+            evt["params"]["nonce"] = n  # a distinct request each time
+            sent.append(evt)
+        out.append((evt, kind))
+    return out
+
+def bench_idempotency(args):
+    vmq_common.OPA_URL, vmq_common.METRICS_MODE = None, "emf"
+    vmq_common.LOG.setLevel(logging.WARNING)
+    traffic = _replay_traffic(random.Random(7), args.requests, args.retry_pct, args.repeat_pct)
+    kinds = Counter(k for _, k in traffic)
+    root = tempfile.mkdtemp(prefix="vmq-bench-idem-")
+    dynamo = LocalDynamo()
+    s3io.S3 = LocalS3(FIXTURE_DIR, latency_ms=args.latency_ms)
+    problems = []
+
+    def run(spec):
+        idempotency.reset(spec)
+        out, samples, bodies = io.StringIO(), [], {}
+        with contextlib.redirect_stdout(out):
+            for evt, kind in traffic:
+                t0 = time.perf_counter()
+                resp = registry.handler_for(evt["action"])(json.loads(json.dumps(evt)), None)
+                samples.append((time.perf_counter() - t0) * 1000)
+                replayed = "Idempotent-Replayed" in resp["headers"]
+                if resp["statusCode"] != 200 or replayed != (kind != "new" and spec != "off"):
+                    problems.append(f"{spec}: {kind} {evt['action']} -> {resp['statusCode']} replayed={replayed}")
+                first = bodies.setdefault(idempotency.request_key(evt), resp["body"])
+                if replayed and resp["body"] != first:
+                    problems.append(f"{spec}: replayed {evt['action']} body differs from the original")
+        docs = [json.loads(line) for line in out.getvalue().splitlines() if line.startswith('{"')]
+        return samples, sum("ActionsInvoked" in d for d in docs), sum("IdempotencyHits" in d for d in docs)
+
+    try:
+        for label, spec in (("replay off", "off"), ("memory LRU", "memory"),
+                            ("sqlite", f"sqlite:{os.path.join(root, 'idem.sqlite3')}"),
+                            ("dynamodb (local stand-in)", "dynamodb:vmq-idempotency")):
+            idempotency.DYNAMODB = dynamo
+            samples, invoked, hits = run(spec)
+            _report(label, samples, f"ActionsInvoked={invoked} IdempotencyHits={hits}")
+            if spec != "off" and (invoked != kinds["new"] or hits != args.requests - kinds["new"]):
+                problems.append(f"{label}: {invoked} invoked/{hits} hits for {kinds['new']} distinct requests")
+
+        # Identity and freshness: another user, a reused request_id with new params, an expired reuse window.
+        idempotency.reset("memory")
+        evt, _ = traffic[0]
+        handler = registry.handler_for(evt["action"])
+        call = lambda e: handler(json.loads(json.dumps(e)), None)["headers"].get("Idempotent-Replayed")
+        other_user = dict(evt, user={"id": "erin@vaultmesh.io", "group": evt["user"]["group"]})
+        new_params = dict(evt, params=dict(evt["params"], nonce=-1))
+        later_repeat = dict(evt, context=dict(evt["context"], request_id="q-later"))
+        reuse = idempotency.IDEMPOTENCY_REUSE_SECONDS
+        with contextlib.redirect_stdout(io.StringIO()):
+            call(evt)
+            idempotency.IDEMPOTENCY_REUSE_SECONDS = 0.0
+            try:
+                checks = {"another user's identical request": (call(other_user), None),
+                          "request_id reused with other params": (call(new_params), None),
+                          "retry after the reuse window": (call(evt), "true"),
+                          "repeat after the reuse window": (call(later_repeat), None)}
+            finally:
+                idempotency.IDEMPOTENCY_REUSE_SECONDS = reuse
+        for name, (got, want) in checks.items():
+            if got != want:
+                problems.append(f"{name}: replayed={got}, expected {want}")
+        print(f"  traffic: {kinds['new']} new, {kinds['retry']} retries, {kinds['repeat']} repeats; "
+              f"dynamodb calls {dict(dynamo.calls)}")
+    finally:
+        s3io.S3 = FIXTURE_S3
+        idempotency.DYNAMODB = None
+        idempotency.reset("off")
+        shutil.rmtree(root, ignore_errors=True)
+
+    for p in problems[:10]:
+        print(f"✗ {p}")
+    print("✓ retries and repeats replayed once computed, ActionsInvoked counts distinct requests only"
+          if not problems else "✗ idempotency check failed")
+    if problems:
+        sys.exit(1)
+
+class _TtlDictCache:
+    """The previous persona_helper cache: unbounded dict, full GET after the TTL, None on errors."""
+
+    def __init__(self, client, ttl):
+        self._client, self.ttl, self._entries = client, ttl, {}
+
+    def get(self, bucket, key):
+        hit = self._entries.get((bucket, key))
+        if hit and time.time() - hit[1] < self.ttl:
+            return hit[0]
+        resp = self._client().get_object(Bucket=bucket, Key=key)
+        data = json.loads(resp["Body"].read().decode("utf-8"))
+        self._entries[(bucket, key)] = (data, time.time())
+        return data
+
+class _FlakyS3(LocalS3):
+    """LocalS3 whose GETs fail with a 503 while `down` is set."""
+
+    down = False
+
+    def get_object(self, **kwargs):
+        if self.down:
+            self.calls["get_object_failed"] += 1
+            raise _S3Error("ServiceUnavailable", "injected outage")
+        return super().get_object(**kwargs)
+
+def _session_storm(sessions: int, workers: int) -> list:
+    """Start `sessions` chat sessions at once (persona + handoff choices); per-session latency in ms."""
+    groups = ["VaultMesh-Engineering", "VaultMesh-Delivery", "VaultMesh-Compliance", "VaultMesh-Management"]
+    barrier, samples = threading.Barrier(workers), []
+
+    def worker(n):
+        barrier.wait()
+        for i in range(n, sessions, workers):
+            t0 = time.perf_counter()
+            session = persona_helper.init_session_with_persona([groups[i % len(groups)]])
+            choices = persona_helper.get_handoff_choices(session["persona_id"])
+            samples.append((time.perf_counter() - t0) * 1000)
+            assert session["persona"].get("id") and choices, (session, choices)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+def _persona_bucket(root: str, latency_ms: float) -> "_FlakyS3":
+    """The export bucket persona_helper reads: the repo's personas and actions catalog."""
+    s3 = _FlakyS3(root, latency_ms=latency_ms)
+    for name in ("engineer", "delivery-manager", "compliance"):
+        with open(os.path.join(HERE, "..", "02-qbusiness", "personas", f"{name}.json"), "rb") as f:
+            s3.put(persona_helper.BUCKET, f"personas/{name}.json", f.read())
+    with open(os.path.join(HERE, "..", "02-qbusiness", "actions", "actions-catalog.json"), "rb") as f:
+        s3.put(persona_helper.BUCKET, persona_helper.CATALOG_KEY, f.read())
+    return s3
+
+def bench_personas(args):
+    root = tempfile.mkdtemp(prefix="vmq-bench-personas-")
+    s3 = _persona_bucket(root, args.latency_ms)
+    keys = 4  # three personas and the catalog
+    persona_helper.S3, problems = s3, []
+    ttl = args.ttl_ms / 1000.0
+
+    def gets():
+        return s3.calls["get_object"]
+
+    try:
+        for label, cache in (("ttl dict", _TtlDictCache(persona_helper._s3, ttl)),
+                             ("revalidating", objcache.ObjectCache(persona_helper._s3, ttl=ttl))):
+            persona_helper._cache = cache
+            before = gets()
+            cold = _session_storm(args.sessions, args.workers)
+            cold_gets = gets() - before
+            hit = _timed(lambda: [persona_helper.load_persona_s3("engineer") for _ in range(1000)],
+                         max(1, args.iterations // 1000))
+            time.sleep(ttl * 1.5)
+            before = gets()
+            expired = _session_storm(args.sessions, args.workers)
+            expired_gets = gets() - before
+            if isinstance(cache, objcache.ObjectCache):
+                if cold_gets != keys or expired_gets > keys:
+                    problems.append(f"{cold_gets} GETs for a cold storm, {expired_gets} after expiry "
+                                    f"(expected {keys} and at most {keys})")
+                if max(expired) > args.latency_ms:
+                    problems.append(f"a session waited {max(expired):.1f}ms on revalidation after expiry")
+            _report(f"{label}: 1000 hits", hit)
+            _report(f"{label}: cold storm", cold, f"s3_gets={cold_gets} for {args.sessions} sessions")
+            _report(f"{label}: expired storm", expired, f"s3_gets={expired_gets}")
+
+        # Revalidation picks up a change; an outage keeps serving the last good copy.
+        cache = persona_helper._cache
+        s3.put(persona_helper.BUCKET, "personas/engineer.json",
+               json.dumps({"id": "engineer", "tone": "revised"}).encode("utf-8"))
+        time.sleep(ttl * 1.5)
+        persona_helper.load_persona_s3("engineer")
+        deadline = time.monotonic() + 5
+        while persona_helper.load_persona_s3("engineer").get("tone") != "revised" and time.monotonic() < deadline:
+            time.sleep(0.005)
+        if persona_helper.load_persona_s3("engineer").get("tone") != "revised":
+            problems.append("a changed persona was not picked up after the TTL")
+        s3.down = True
+        time.sleep(ttl * 1.5)
+        during = _session_storm(args.sessions, args.workers)
+        failed = s3.calls["get_object_failed"]
+        if failed > keys:
+            problems.append(f"{failed} failed GETs during the outage: refreshes not backed off")
+        s3.down = False
+        bounded = objcache.ObjectCache(persona_helper._s3, size=2)
+        for key in ("personas/engineer.json", "personas/compliance.json", persona_helper.CATALOG_KEY):
+            bounded.get(persona_helper.BUCKET, key)
+        if bounded.stats()["size"] != 2:
+            problems.append(f"LRU bound not kept: {bounded.stats()}")
+        _report("outage (S3 503s)", during, f"failed_gets={failed} stats={cache.stats()}")
+    finally:
+        persona_helper.S3, persona_helper._cache = None, objcache.ObjectCache(persona_helper._s3)
+        shutil.rmtree(root, ignore_errors=True)
+
+    for p in problems:
+        print(f"✗ {p}")
+    print("✓ one GET per key under storms, stale copies served while revalidating and through an outage"
+          if not problems else "✗ persona cache check failed")
+    if problems:
+        sys.exit(1)
+
+def _scan_handoffs(doc: dict) -> list:
+    """get_handoff_choices before the index: every action, rebuilt on each call."""
+    return [{"id": a["id"], "name": a["name"], "handoffText": a.get("invocation", {}).get("handoffText", a["name"]),
+             "description": a["description"], "lambda": a["lambda"], "safetyTier": a.get("safetyTier", "UNKNOWN")}
+            for a in doc.get("catalog", [])]
+
+def bench_catalog(args):
+    with open(os.path.join(HERE, "..", "02-qbusiness", "actions", "actions-catalog.json"), encoding="utf-8") as f:
+        doc = json.load(f)
+    ids = [a["id"] for a in doc["catalog"]]
+    groups = vmq_common._POLICY["groups"]
+    problems = []
+
+    compile_ms = _timed(lambda: catalog.CatalogIndex(doc), max(1, args.iterations // 100))
+    _report("compile index", compile_ms, f"actions={len(ids)}")
+    scan_target = lambda: [next(a for a in doc["catalog"] if a["id"] == i)["lambda"] for i in ids]
+    index_target = lambda: [catalog.index_for(doc).targets[i] for i in ids]
+    _report(f"scan for {len(ids)} targets", _timed(scan_target, args.iterations))
+    _report(f"index for {len(ids)} targets", _timed(index_target, args.iterations))
+    _report("rebuild handoffs (previous)", _timed(lambda: _scan_handoffs(doc), args.iterations))
+    _report("indexed handoffs", _timed(lambda: catalog.index_for(doc).handoffs["engineer"], args.iterations))
+
+    # The offered actions must be exactly those the embedded policy lets each user run. Only
+    # user.group counts: a groups array listing every group must not add a choice that gets a 403.
+    index = catalog.index_for(doc)
+    allowed_for = lambda user: {i for i in ids if any(vmq_common._embedded_decision({"action": i, "user": user})[:2])}
+    for group in groups + ["Anonymous"]:
+        for user in ({"group": group}, {"group": group, "groups": groups}):
+            offered = {c["id"] for c in index.handoffs_for_user(user)}
+            allowed = allowed_for(user)
+            if offered != allowed:
+                problems.append(f"{user}: offered {sorted(offered ^ allowed)} differently from the policy")
+    # A persona's list must pass for each group mapped to it.
+    for persona in set(catalog.GROUP_PERSONAS.values()):
+        members = [g for g, p in catalog.GROUP_PERSONAS.items() if p == persona]
+        offered = {c["id"] for c in index.handoffs[persona]}
+        allowed = set.intersection(*(allowed_for({"group": g}) for g in members))
+        if offered != allowed:
+            problems.append(f"persona {persona}: offered {sorted(offered ^ allowed)} not allowed for all of {members}")
+    env = {"AWS_REGION": "eu-west-1", "AWS_ACCOUNT_ID": "123456789012"}
+    resolved = catalog.CatalogIndex(doc, env=env).targets
+    if any("${" in t or not t.startswith("arn:aws:lambda:eu-west-1:123456789012:function:vmq-")
+           for t in resolved.values()):
+        problems.append(f"ARNs not resolved: {dict(resolved)}")
+    if any(":" in t for t in catalog.CatalogIndex(doc, env={}).targets.values()):
+        problems.append("unresolvable ARNs did not fall back to function names")
+    if catalog.index_for(json.loads(json.dumps(doc))) is index:
+        problems.append("a new catalog object reused the old index")
+
+    for p in problems:
+        print(f"✗ {p}")
+    print(f"✓ handoffs match the policy for {len(groups) + 1} groups with and without a groups array, "
+          f"and for every persona; ARNs resolved" if not problems
+          else "✗ catalog index check failed")
+    if problems:
+        sys.exit(1)
+
+class LocalLambda:
+    """
+    Lambda client stand-in: runs the real handlers in-process after an injectable delay.
+
+    Event invocations return 202 after `dispatch_ms` and run on a pool of
+    `event_workers` threads, like Lambda's internal queue; `drain()` waits for them.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, slow: dict = None, fail: set = (), dispatch_ms: float = 0.0,
+                 event_workers: int = 16):
+        self.latency, self.slow, self.fail = latency_ms / 1000.0, slow or {}, set(fail)
+        self.dispatch, self.event_workers, self._events = dispatch_ms / 1000.0, event_workers, None
+        self.calls = Counter()
+        self.in_flight = self.peak = 0
+        self._lock = threading.Lock()
+        self._actions = {fn: a for a, fn in registry.ACTION_FUNCTIONS.items()}
+
+    def invoke(self, FunctionName, Payload, InvocationType="RequestResponse", **_):
+        name = FunctionName.rsplit(":function:", 1)[-1].split(":", 1)[0]
+        if InvocationType == "Event":
+            time.sleep(self.dispatch)
+            with self._lock:
+                if self._events is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._events = ThreadPoolExecutor(max_workers=self.event_workers, thread_name_prefix="event")
+                self.calls["event"] += 1
+            self._events.submit(self._run, name, Payload)
+            return {"StatusCode": 202, "Payload": io.BytesIO(b"")}
+        return self._run(name, Payload)
+
+    def drain(self):
+        if self._events is not None:
+            self._events.shutdown(wait=True)
+            self._events = None
+
+    def _run(self, name, Payload):
+        with self._lock:
+            self.calls[name] += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.slow.get(name, self.latency * 1000) / 1000.0)
+            if name in self.fail:
+                return {"StatusCode": 200, "FunctionError": "Unhandled",
+                        "Payload": io.BytesIO(json.dumps({"errorMessage": "injected failure"}).encode("utf-8"))}
+            resp = registry.handler_for(self._actions[name])(json.loads(Payload), None)
+            return {"StatusCode": 200, "Payload": io.BytesIO(json.dumps(resp).encode("utf-8"))}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+def bench_fanout(args):
+    import asyncio
+    vmq_common.OPA_URL, vmq_common.METRICS_MODE = None, "emf"
+    vmq_common.LOG.setLevel(logging.WARNING)
+    root = tempfile.mkdtemp(prefix="vmq-bench-fanout-")
+    persona_helper.S3 = _persona_bucket(root, 0.0)
+    persona_helper.INVOKE_CONCURRENCY, persona_helper._pool = args.workers, None
+    by_action = {e["action"]: e for e in TEST_EVENTS}
+    user = by_action["validate-schema"]["user"]  # Engineering: may run all three
+    items = [{"action": a, "params": by_action[a]["params"]}
+             for a in ("summarize-docs", "validate-schema", "draft-change-note")] * (args.items // 3)
+    problems = []
+
+    def check(label, results, expect_ok=True):
+        for i, (item, r) in enumerate(zip(items, results)):
+            if r.get("index") != i or r.get("action") != item["action"]:
+                problems.append(f"{label}: result {i} out of order: {r.get('index')} {r.get('action')}")
+            elif expect_ok and not r.get("ok", r.get("statusCode") == 200):
+                problems.append(f"{label}: {item['action']} failed: {r.get('error') or r.get('statusCode')}")
+
+    runs = {
+        "sequential invoke_action": lambda: [dict(persona_helper.invoke_action(it["action"], user, it["params"]),
+                                                  index=i, action=it["action"]) for i, it in enumerate(items)],
+        "thread-pool fan-out": lambda: persona_helper.invoke_actions_concurrent(items, user),
+        "asyncio fan-out": lambda: asyncio.run(persona_helper.invoke_actions_async(items, user)),
+    }
+    try:
+        for label, run in runs.items():
+            persona_helper.LAMBDA = client = LocalLambda(args.latency_ms)
+            with contextlib.redirect_stdout(io.StringIO()):
+                samples, results = [], None
+                for _ in range(args.iterations):
+                    t0 = time.perf_counter()
+                    results = run()
+                    samples.append((time.perf_counter() - t0) * 1000)
+            check(label, results)
+            _report(label, samples, f"calls={len(items)} peak_in_flight={client.peak}")
+            if client.peak > args.workers:
+                problems.append(f"{label}: {client.peak} calls in flight, pool bound is {args.workers}")
+
+        # Partial failure: one function raises, one outlives its timeout, one action is unknown.
+        mixed = items[:3] + [{"action": "no-such-action", "params": {}}]
+        for label, run in (("threads", lambda: persona_helper.invoke_actions_concurrent(mixed, user, timeout=0.5)),
+                           ("asyncio", lambda: asyncio.run(persona_helper.invoke_actions_async(mixed, user,
+                                                                                              timeout=0.5)))):
+            persona_helper.LAMBDA = LocalLambda(args.latency_ms, slow={"vmq-validate-schema": 1500},
+                                                fail={"vmq-draft-change-note"})
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = run()
+                wall = time.perf_counter() - t0
+                time.sleep(1.2)  # let the timed-out call finish before its metrics reach stdout
+            got = [(r["action"], r["ok"], bool(r.get("timedOut")), "error" in r) for r in results]
+            want = [("summarize-docs", True, False, False), ("validate-schema", False, True, True),
+                    ("draft-change-note", False, False, True), ("no-such-action", False, False, True)]
+            if got != want:
+                problems.append(f"partial failure ({label}): {got}")
+            if wall > 1.0:
+                problems.append(f"partial failure ({label}): waited {wall:.2f}s past a 0.5s timeout")
+            print(f"  partial failure ({label}): {sum(ok for _, ok, _, _ in got)} ok, "
+                  f"{sum(t for _, _, t, _ in got)} timed out, {sum(not ok and not t for _, ok, t, _ in got)} failed "
+                  f"in {wall * 1000:.0f}ms")
+    finally:
+        persona_helper.S3 = persona_helper.LAMBDA = None
+        persona_helper._cache = objcache.ObjectCache(persona_helper._s3)
+        shutil.rmtree(root, ignore_errors=True)
+
+    for p in problems[:10]:
+        print(f"✗ {p}")
+    print("✓ results in input order, bounded concurrency, failures and timeouts isolated per item"
+          if not problems else "✗ fan-out check failed")
+    if problems:
+        sys.exit(1)
+
+def bench_dispatch(args):
+    vmq_common.OPA_URL, vmq_common.METRICS_MODE = None, "emf"
+    vmq_common.LOG.setLevel(logging.WARNING)
+    root = tempfile.mkdtemp(prefix="vmq-bench-dispatch-")
+    persona_helper.S3 = _persona_bucket(root, 0.0)
+    persona_helper.INVOKE_CONCURRENCY, persona_helper._pool = args.workers, None
+    results.RESULT_POLL_SECONDS = 0.02
+    draft = next(e for e in TEST_EVENTS if e["action"] == "draft-change-note")
+    user, items = draft["user"], [{"action": "draft-change-note", "params": draft["params"]}] * args.items
+    problems = []
+
+    def run_sync():
+        persona_helper.LAMBDA = client = LocalLambda(args.latency_ms)
+        t0 = time.perf_counter()
+        out = persona_helper.invoke_actions_concurrent(items, user)
+        return time.perf_counter() - t0, out, client
+
+    def run_dispatch():
+        persona_helper.LAMBDA = client = LocalLambda(args.latency_ms, dispatch_ms=args.dispatch_ms,
+                                                     event_workers=args.event_workers)
+        t0 = time.perf_counter()
+        sent = persona_helper.dispatch_actions(items, user)
+        held = time.perf_counter() - t0
+        found = persona_helper.collect_results([r["correlationId"] for r in sent], timeout=60)
+        done = time.perf_counter() - t0
+        client.drain()
+        return held, done, sent, found
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            wall, sync_out, _ = run_sync()
+        expected = sync_out[0].get("body")
+        print(f"waiting (invoke_actions_concurrent, {args.workers} threads): {len(items)} drafts in "
+              f"{wall * 1000:.0f}ms, client busy throughout, {len(items) / wall * 60:,.0f} drafts/min")
+        for spec in (f"file:{os.path.join(root, 'results')}", "s3://bench-results/results/"):
+            results.reset(spec)
+            with contextlib.redirect_stdout(io.StringIO()):
+                held, done, sent, found = run_dispatch()
+            accepted = sum(1 for r in sent if r.get("statusCode") == 202)
+            records = [found.get(r.get("correlationId")) for r in sent]
+            missing = sum(1 for rec in records if rec is None)
+            print(f"dispatch ({spec.split(':', 1)[0]} sink): {accepted}/{len(items)} accepted in "
+                  f"{held * 1000:.0f}ms ({len(items) / held * 60:,.0f} dispatches/min), all collected after "
+                  f"{done * 1000:.0f}ms")
+            if accepted != len(items) or missing:
+                problems.append(f"{spec}: {accepted} accepted, {missing} results missing")
+            for r, rec in zip(sent, records):
+                if rec and (rec["correlationId"] != r["correlationId"] or rec["statusCode"] != 200
+                            or rec["body"] != expected):
+                    problems.append(f"{spec}: record {r['correlationId']} differs from the waited-for response")
+                    break
+
+        # Errors, batch envelopes and unsafe ids, through the handler directly.
+        handler = registry.handler_for("draft-change-note")
+        ctx = lambda cid: {"request_id": cid, "correlation_id": cid}  # noqa: E731
+        logging.disable(logging.WARNING)  # the expected 400s and the refused id
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                handler({"action": "draft-change-note", "user": user, "context": ctx("bad-params"), "params": {}},
+                        None)
+                handler({"action": "draft-change-note", "user": user, "context": ctx("envelope"),
+                         "events": [{"params": draft["params"]}, {"params": {}}]}, None)
+                handler(dict(draft, context=ctx("../escape")), None)
+        finally:
+            logging.disable(logging.NOTSET)
+        bad, envelope = results.get("bad-params"), results.get("envelope")
+        if not bad or bad["statusCode"] != 400:
+            problems.append(f"error response not delivered: {bad}")
+        if not envelope or envelope["statusCode"] != 207 or envelope["body"]["summary"]["items"] != 2:
+            problems.append(f"batch envelope not delivered whole: {envelope}")
+        if os.path.exists(FIXTURE_S3._path("bench-results", "escape.json")):
+            problems.append("a correlation_id with a path separator was written")
+    finally:
+        persona_helper.S3 = persona_helper.LAMBDA = None
+        persona_helper._cache = objcache.ObjectCache(persona_helper._s3)
+        results.reset("off")
+        shutil.rmtree(root, ignore_errors=True)
+
+    for p in problems[:10]:
+        print(f"✗ {p}")
+    print("✓ every dispatch collected with the waited-for response; errors and envelopes delivered, unsafe ids refused"
+          if not problems else "✗ dispatch check failed")
+    if problems:
+        sys.exit(1)
+
+def _sequential_session(user_groups: list) -> dict:
+    """Session init as it was: the persona, then the catalog for the handoff choices."""
+    persona_id = persona_helper.resolve_persona(user_groups)
+    persona = persona_helper.load_persona_s3(persona_id)
+    return {"persona_id": persona_id, "persona": persona,
+            "handoff_choices": persona_helper.get_handoff_choices(
+                persona_id, {"group": persona_helper._persona_group(user_groups)})}
+
+def bench_session(args):
+    root = tempfile.mkdtemp(prefix="vmq-bench-session-")
+    s3 = _persona_bucket(root, args.latency_ms)
+    persona_helper.S3, problems = s3, []
+    groups = [["VaultMesh-Engineering"], ["VaultMesh-Delivery"], ["VaultMesh-Compliance"],
+              ["VaultMesh-Management", "VaultMesh-Engineering"], ["VaultMesh-Sales"]]
+    p50 = {}
+    try:
+        for label, init in (("sequential", _sequential_session), ("prefetch", persona_helper.init_session_with_persona)):
+            for state in ("cold", "cached"):
+                if state == "cached":
+                    for g in groups:
+                        init(g)
+                samples = []
+                for i in range(args.iterations):
+                    if state == "cold":
+                        persona_helper._cache = objcache.ObjectCache(persona_helper._s3)
+                    t0 = time.perf_counter()
+                    init(groups[i % len(groups)])
+                    samples.append((time.perf_counter() - t0) * 1000)
+                p50[label, state] = statistics.median(samples)
+                _report(f"{label} init, {state}", samples)
+        if p50["prefetch", "cold"] > 0.75 * p50["sequential", "cold"]:
+            problems.append(f"cold prefetch p50 {p50['prefetch', 'cold']:.1f}ms is not clearly below "
+                            f"sequential {p50['sequential', 'cold']:.1f}ms")
+        for g in groups:
+            want, got = _sequential_session(g), persona_helper.init_session_with_persona(g)
+            if any(want[k] != got[k] for k in want):
+                problems.append(f"{g}: prefetched session differs from the sequential one")
+        # Choices follow the enforced user.group only: extra groups must not offer an action authz denies.
+        for g, user_group in ((["VaultMesh-Engineering", "VaultMesh-Compliance"], None),
+                              (["VaultMesh-Delivery", "VaultMesh-Compliance"], None),
+                              (["VaultMesh-Engineering", "VaultMesh-Compliance"], "VaultMesh-Compliance")):
+            session = persona_helper.init_session_with_persona(g, user_group=user_group)
+            enforced = user_group or g[0]
+            denied = [c["id"] for c in session["handoff_choices"]
+                      if not any(vmq_common._embedded_decision({"action": c["id"], "user": {"group": enforced}})[:2])]
+            if denied or not session["handoff_choices"]:
+                problems.append(f"{g} as {enforced}: offered {denied or 'nothing'}")
+
+        # Warm-ups: one Event per distinct handoff function, none again within the interval, no action run.
+        client = persona_helper.LAMBDA = LocalLambda()
+        persona_helper._warmed = {}
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            session = persona_helper.init_session_with_persona(groups[0], warm=True)
+            deadline = time.monotonic() + 5
+            while client.calls["event"] < len(session["warming"]) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            persona_helper.init_session_with_persona(groups[0], warm=True)
+            persona_helper._prefetch_pool().submit(lambda: None).result()  # queued warm-ups have run
+            client.drain()
+        names = {c["lambda"].rsplit(":function:", 1)[-1] for c in session["handoff_choices"]}
+        warmed = {n for n in client.calls if n.startswith("vmq-")}
+        print(f"  warm-up: {client.calls['event']} event(s) for {len(session['handoff_choices'])} handoff choices "
+              f"over {len(names)} function(s), repeat session sent none")
+        if warmed != names or client.calls["event"] != len(names):
+            problems.append(f"warm-ups {sorted(warmed)} ({client.calls['event']} events), expected {sorted(names)}")
+        if "ActionsInvoked" in out.getvalue():
+            problems.append("a warm-up event ran an action")
+    finally:
+        persona_helper.S3 = persona_helper.LAMBDA = None
+        persona_helper._cache = objcache.ObjectCache(persona_helper._s3)
+        persona_helper._warmed = {}
+        shutil.rmtree(root, ignore_errors=True)
+
+    for p in problems[:10]:
+        print(f"✗ {p}")
+    print("✓ persona and catalog fetched together, same sessions as before, one warm-up per function"
+          if not problems else "✗ session check failed")
+    if problems:
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="VaultMesh action Lambda benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    opa_p = subparsers.add_parser("opa", help="Combined decision vs per-rule OPA queries")
+    opa_p.add_argument("--iterations", type=int, default=500)
+    opa_p.add_argument("--delay-ms", type=float, default=1.0, help="Injected OPA latency per request")
+    opa_p.set_defaults(func=bench_opa)
+
+    pool_p = subparsers.add_parser("pool", help="Keep-alive OPA pool vs connection per request")
+    pool_p.add_argument("--iterations", type=int, default=1000)
+    pool_p.add_argument("--delay-ms", type=float, default=0.0, help="Injected OPA latency per request")
+    pool_p.set_defaults(func=bench_pool)
+
+    parity_p = subparsers.add_parser("parity", help="Embedded evaluator vs OPA for every action x group")
+    parity_p.add_argument("--opa-url", help="Real OPA data URL (default: local stand-in)")
+    parity_p.set_defaults(func=bench_parity)
+
+    breaker_p = subparsers.add_parser("breaker", help="Hung OPA with and without the circuit breaker")
+    breaker_p.add_argument("--iterations", type=int, default=40)
+    breaker_p.add_argument("--budget-ms", type=float, default=100.0, help="Authz budget left by the fake context")
+    breaker_p.set_defaults(func=bench_breaker)
+
+    emf_p = subparsers.add_parser("emf", help="Validate EMF output and count outbound calls")
+    emf_p.add_argument("--iterations", type=int, default=200)
+    emf_p.set_defaults(func=bench_emf)
+
+    metrics_p = subparsers.add_parser("metrics", help="Aggregated put_metric_data batches vs per request")
+    metrics_p.add_argument("--iterations", type=int, default=5000)
+    metrics_p.add_argument("--flush-seconds", type=float, default=1.0)
+    metrics_p.set_defaults(func=bench_metrics)
+
+    cold_p = subparsers.add_parser("coldstart", help="Import+init time per handler in a fresh interpreter")
+    cold_p.add_argument("--runs", type=int, default=5, help="Fresh interpreters per target (median reported)")
+    cold_p.add_argument("--top", type=int, default=5, help="Modules with the largest self import time to show")
+    cold_p.add_argument("--max-ms", type=float, help="Fail if any target's median init exceeds this")
+    cold_p.set_defaults(func=bench_coldstart)
+
+    phases_p = subparsers.add_parser("phases", help="Phase timings sum to the total; on/off overhead")
+    phases_p.add_argument("--iterations", type=int, default=3000)
+    phases_p.set_defaults(func=bench_phases)
+
+    router_p = subparsers.add_parser("router", help="Six functions vs one router: cold starts and p99")
+    router_p.add_argument("--requests", type=int, default=2000, help="Mixed test-events.json replay length")
+    router_p.add_argument("--gap-ms", type=float, default=30000, help="Mean inter-arrival time")
+    router_p.add_argument("--idle-s", type=float, default=420, help="Warm container keep-alive")
+    router_p.add_argument("--runs", type=int, default=3, help="Fresh interpreters per cold-start measurement")
+    router_p.add_argument("--seed", type=int, default=7)
+    router_p.set_defaults(func=bench_router)
+
+    batch_p = subparsers.add_parser("batch", help="One batch envelope vs N single invocations")
+    batch_p.add_argument("--items", type=int, default=25)
+    batch_p.add_argument("--iterations", type=int, default=50)
+    batch_p.add_argument("--delay-ms", type=float, default=2.0, help="Simulated OPA latency")
+    batch_p.set_defaults(func=bench_batch)
+
+    int_list = lambda v: [int(x) for x in v.split(",")]
+    sum_p = subparsers.add_parser("summarize", help="summarize-docs throughput vs document count and size")
+    sum_p.add_argument("--docs", type=int_list, default=[1, 4, 16], help="Comma-separated document counts")
+    sum_p.add_argument("--size-kb", type=int_list, default=[64, 512], help="Comma-separated document sizes")
+    sum_p.add_argument("--latency-ms", type=float, default=20.0, help="Simulated S3 time to first byte")
+    sum_p.add_argument("--iterations", type=int, default=3)
+    sum_p.add_argument("--seed", type=int, default=7)
+    sum_p.set_defaults(func=bench_summarize)
+
+    faq_p = subparsers.add_parser("faq", help="generate-faq cold, warm and incremental over a prefix")
+    faq_p.add_argument("--docs", type=int, default=2000)
+    faq_p.add_argument("--size-kb", type=int, default=4)
+    faq_p.add_argument("--changed-pct", type=int, default=1)
+    faq_p.add_argument("--latency-ms", type=float, default=5.0, help="Simulated S3 time to first byte")
+    faq_p.add_argument("--seed", type=int, default=7)
+    faq_p.set_defaults(func=bench_faq)
+
+    float_list = lambda v: [float(x) for x in v.split(",")]
+    cn_p = subparsers.add_parser("changenote", help="Section-aware diff vs whole-document diffs on multi-MB specs")
+    cn_p.add_argument("--size-mb", type=float_list, default=[1, 4], help="Comma-separated spec sizes")
+    cn_p.add_argument("--changes", type=int_list, default=[1, 10, 100], help="Comma-separated modified-section counts")
+    cn_p.add_argument("--iterations", type=int, default=5)
+    cn_p.add_argument("--skip-difflib", action="store_true", help="Skip the (slow) difflib baseline")
+    cn_p.add_argument("--seed", type=int, default=7)
+    cn_p.set_defaults(func=bench_changenote)
+
+    val_p = subparsers.add_parser("validate", help="Cold vs warm compiled validators and instance throughput")
+    val_p.add_argument("--interfaces", type=int_list, default=[10, 200], help="Comma-separated model sizes")
+    val_p.add_argument("--records", type=int, default=20000, help="Twins/entities per instance document")
+    val_p.add_argument("--latency-ms", type=float, default=5.0, help="Simulated S3 time to first byte")
+    val_p.add_argument("--iterations", type=int, default=5)
+    val_p.add_argument("--seed", type=int, default=7)
+    val_p.set_defaults(func=bench_validate)
+
+    pack_p = subparsers.add_parser("pack", help="Streaming compliance pack larger than function memory, peak RSS")
+    pack_p.add_argument("--size-mb", type=float, default=320, help="Total size of the source documents")
+    pack_p.add_argument("--files", type=int, default=8)
+    pack_p.add_argument("--memory-mb", type=int, default=256, help="Peak RSS the streaming build must stay under")
+    pack_p.add_argument("--baseline", action="store_true", help="Also build the archive in memory for comparison")
+    pack_p.add_argument("--seed", type=int, default=7)
+    pack_p.add_argument("--child-root", help=argparse.SUPPRESS)
+    pack_p.add_argument("--child-mode", help=argparse.SUPPRESS)
+    pack_p.add_argument("--child-keys", help=argparse.SUPPRESS)
+    pack_p.set_defaults(func=bench_pack)
+
+    jira_p = subparsers.add_parser("jira", help="Bulk create-jira-draft vs single invocations, response size")
+    jira_p.add_argument("--items", type=int, default=200)
+    jira_p.add_argument("--dup-pct", type=float, default=10, help="Items re-filed with different case/spacing")
+    jira_p.add_argument("--description-kb", type=float, default=2)
+    jira_p.add_argument("--iterations", type=int, default=20)
+    jira_p.add_argument("--delay-ms", type=float, default=2.0, help="Simulated OPA latency")
+    jira_p.add_argument("--seed", type=int, default=7)
+    jira_p.set_defaults(func=bench_jira)
+
+    jobs_p = subparsers.add_parser("jobs", help="Async job submit latency vs synchronous runs, SQS worker path")
+    jobs_p.add_argument("--jobs", type=int, default=20)
+    jobs_p.add_argument("--latency-ms", type=float, default=50.0, help="Simulated S3 time to first byte")
+    jobs_p.add_argument("--timeout-s", type=float, default=120.0)
+    jobs_p.set_defaults(func=bench_jobs)
+
+    idem_p = subparsers.add_parser("idempotency", help="Retried/repeated requests replayed vs recomputed, per store")
+    idem_p.add_argument("--requests", type=int, default=200)
+    idem_p.add_argument("--retry-pct", type=float, default=20.0, help="Requests resent with the same request_id")
+    idem_p.add_argument("--repeat-pct", type=float, default=30.0, help="Identical requests with a new request_id")
+    idem_p.add_argument("--latency-ms", type=float, default=5.0, help="Simulated S3 time to first byte")
+    idem_p.set_defaults(func=bench_idempotency)
+
+    personas_p = subparsers.add_parser("personas", help="Persona/catalog cache hit path and S3 GETs under init storms")
+    personas_p.add_argument("--sessions", type=int, default=400, help="Sessions started at once per storm")
+    personas_p.add_argument("--workers", type=int, default=32, help="Concurrent session threads")
+    personas_p.add_argument("--latency-ms", type=float, default=20.0, help="Simulated S3 time to first byte")
+    personas_p.add_argument("--ttl-ms", type=float, default=200.0, help="Cache TTL for the run")
+    personas_p.add_argument("--iterations", type=int, default=20000, help="Hit-path lookups")
+    personas_p.set_defaults(func=bench_personas)
+
+    catalog_p = subparsers.add_parser("catalog", help="Compiled catalog index vs per-call scans; policy parity")
+    catalog_p.add_argument("--iterations", type=int, default=20000)
+    catalog_p.set_defaults(func=bench_catalog)
+
+    fanout_p = subparsers.add_parser("fanout", help="Concurrent/asyncio multi-action fan-out vs sequential invokes")
+    fanout_p.add_argument("--items", type=int, default=12, help="Calls per fan-out (three actions, repeated)")
+    fanout_p.add_argument("--workers", type=int, default=8, help="INVOKE_CONCURRENCY for the run")
+    fanout_p.add_argument("--latency-ms", type=float, default=100.0, help="Simulated invoke round trip")
+    fanout_p.add_argument("--iterations", type=int, default=5)
+    fanout_p.set_defaults(func=bench_fanout)
+
+    dispatch_p = subparsers.add_parser("dispatch", help="Fire-and-forget Event invokes collected from the result sink")
+    dispatch_p.add_argument("--items", type=int, default=200, help="Drafts to generate")
+    dispatch_p.add_argument("--workers", type=int, default=8, help="INVOKE_CONCURRENCY for the run")
+    dispatch_p.add_argument("--latency-ms", type=float, default=200.0, help="Simulated action duration")
+    dispatch_p.add_argument("--dispatch-ms", type=float, default=10.0, help="Simulated Event invoke round trip")
+    dispatch_p.add_argument("--event-workers", type=int, default=50, help="Concurrent executions serving Events")
+    dispatch_p.set_defaults(func=bench_dispatch)
+
+    session_p = subparsers.add_parser("session", help="Session init: persona/catalog prefetch, handoffs, warm-ups")
+    session_p.add_argument("--latency-ms", type=float, default=40.0, help="Injected S3 time to first byte")
+    session_p.add_argument("--iterations", type=int, default=20)
+    session_p.set_defaults(func=bench_session)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Lazy, thread-safe boto3 client factory shared by the action Lambdas and persona helpers.
+
+Neither boto3 nor any client is built until a code path actually needs it, so
+cold starts only pay for the services an invocation touches. Clients are
+cached per (service, region) for the lifetime of the process.
+"""
+import logging
+import os
+import threading
+
+LOG = logging.getLogger(__name__)
+
+_clients = {}
+_lock = threading.Lock()
+_boto3 = None
+_boto3_missing = False
+
+def _load_boto3():
+    global _boto3, _boto3_missing
+    if _boto3 is None and not _boto3_missing:
+        try:
+            import boto3
+            _boto3 = boto3
+        except ImportError:
+            _boto3_missing = True
+            LOG.warning("boto3 not available, AWS clients disabled")
+    return _boto3
+
+def client(service: str, region: str = None, **kwargs):
+    """Return a shared boto3 client for `service`, or None if boto3 is not installed.
+
+    `kwargs` (e.g. a botocore Config) only apply when the client is first built.
+    """
+    region = region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION")
+    key = (service, region)
+    c = _clients.get(key)
+    if c is not None:
+        return c
+    with _lock:
+        c = _clients.get(key)
+        if c is None:
+            boto3 = _load_boto3()
+            if boto3 is None:
+                return None
+            # boto3.client() is not thread-safe on the shared default session, hence the lock.
+            c = _clients[key] = boto3.client(service, region_name=region, **kwargs)
+        return c
+
+def reset():
+    """Drop cached clients (for tests and benchmarks)."""
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,179 @@
+"""
+Content-addressed blob store for compliance-pack sources.
+
+Blobs live under a root URI (s3://<EXPORT_BUCKET>/cas/) as
+`sha256/<aa>/<sha256>.<form>`, holding a document in the exact form it
+takes inside a ZIP entry (`deflate<level>` or `stored`), so a pack copies a
+known blob without re-downloading or recompressing the source. A ref per source object,
+`refs/<sha256(uri)[:32]>.json`, maps the source's ETag to its blob: when a
+conditional GET with If-None-Match on that ETag answers 304, the source is
+unchanged and the blob is used. Refs are cached in process; blobs are
+immutable, so stale refs only ever cost a cache miss.
+"""
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+try:
+    from . import s3io
+except ImportError:  # loaded as a top-level module
+    from common import s3io
+
+LOG = logging.getLogger(__name__)
+
+CAS_REF_CACHE_ENTRIES = int(os.getenv("CAS_REF_CACHE_ENTRIES", "4096"))
+_MAX_COPY_BYTES = 5 * 1024 ** 3  # single copy_object limit
+
+class Ref:
+    """Source object -> blob: the source ETag it was made from and the ZIP entry fields."""
+
+    __slots__ = ("etag", "blob", "sha256", "size", "csize", "crc", "method")
+
+    def __init__(self, etag, blob, sha256, size, csize, crc, method):
+        self.etag, self.blob, self.sha256 = etag, blob, sha256
+        self.size, self.csize, self.crc, self.method = size, csize, crc, method
+
+    def to_json(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+class _RefCache:
+    """Bounded LRU of refs keyed by ref URI."""
+
+    def __init__(self, size=CAS_REF_CACHE_ENTRIES):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+            return hit
+
+    def put(self, key, ref):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = ref
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_REFS = _RefCache()
+
+def _root(root: str) -> str:
+    return root.rstrip("/") + "/"
+
+def blob_name(sha256: str, form: str) -> str:
+    return f"sha256/{sha256[:2]}/{sha256}.{form}"
+
+def ref_uri(root: str, source_uri: str) -> str:
+    return f"{_root(root)}refs/{hashlib.sha256(source_uri.encode('utf-8')).hexdigest()[:32]}.json"
+
+def lookup(root: str, source_uri: str):
+    """The last known Ref for `source_uri`, or None (missing or unreadable refs are misses)."""
+    uri = ref_uri(root, source_uri)
+    ref = _REFS.get(uri)
+    if ref is not None:
+        return ref
+    try:
+        doc, _ = s3io.get_json(uri)
+        ref = Ref(**{k: doc[k] for k in Ref.__slots__})
+    except Exception as e:
+        if s3io.error_code(e) not in ("NoSuchKey", "404"):
+            LOG.warning("cas ref for %s unreadable: %s", source_uri, s3io.describe_error(e))
+        return None
+    _REFS.put(uri, ref)
+    return ref
+
+def remember(root: str, source_uri: str, ref: Ref):
+    uri = ref_uri(root, source_uri)
+    _REFS.put(uri, ref)
+    try:
+        s3io.put_json(uri, ref.to_json())
+    except Exception as e:
+        LOG.warning("cas ref for %s not written: %s", source_uri, s3io.describe_error(e))
+
+def _stored_size(uri: str):
+    bucket, key = s3io.parse_uri(uri)
+    try:
+        return s3io._client().head_object(Bucket=bucket, Key=key).get("ContentLength")
+    except Exception:
+        return None
+
+def open_blob(root: str, ref: Ref):
+    """
+    Streaming body of the blob behind `ref` (caller closes it); raises
+    LookupError when the blob is gone or does not have the expected size.
+    """
+    bucket, key = s3io.parse_uri(_root(root) + ref.blob)
+    resp = s3io._client().get_object(Bucket=bucket, Key=key)
+    if resp.get("ContentLength") != ref.csize:
+        resp["Body"].close()
+        raise LookupError(f"blob {ref.blob} is {resp.get('ContentLength')} bytes, expected {ref.csize}")
+    return resp["Body"]
+
+class BlobSink:
+    """
+    Receives a blob's bytes while its ZIP entry is written, before its hash
+    is known. Blobs that fit one part go straight to their final key with a
+    single PUT; larger ones are uploaded to `staging/` and copied into place.
+    Any S3 failure disables the sink and is logged: the pack never fails
+    because the cache could not be written.
+    """
+
+    def __init__(self, root: str, form: str):
+        self.root, self.form = _root(root), form
+        self.failed = False
+        self._out = s3io.MultipartWriter(f"{self.root}staging/{uuid.uuid4().hex}", concurrency=2)
+
+    def write(self, data: bytes):
+        if self.failed:
+            return
+        try:
+            self._out.write(data)
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, e):
+        LOG.warning("cas blob not stored: %s", s3io.describe_error(e))
+        self.failed = True
+        self._out.abort()
+
+    def abort(self):
+        if not self.failed:
+            self.failed = True
+            self._out.abort()
+
+    def finish(self, sha256: str):
+        """Store the blob as `sha256` unless it already exists; its name when in place, else None."""
+        if self.failed:
+            return None
+        name = blob_name(sha256, self.form)
+        final = self.root + name
+        try:
+            if _stored_size(final) == self._out.size:
+                self._out.abort()
+                return name
+            if self._out.retarget(final):
+                self._out.close()
+                return name
+            if self._out.size > _MAX_COPY_BYTES:
+                self._out.abort()
+                return None
+            self._out.close()
+            client, src_bucket, src_key = s3io._client(), self._out.bucket, self._out.key
+            bucket, key = s3io.parse_uri(final)
+            client.copy_object(Bucket=bucket, Key=key, CopySource={"Bucket": src_bucket, "Key": src_key})
+            client.delete_object(Bucket=src_bucket, Key=src_key)
+            return name
+        except Exception as e:
+            self._fail(e)
+            return None
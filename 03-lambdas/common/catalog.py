@@ -0,0 +1,128 @@
+"""
+Compiled index over a loaded actions catalog (actions-catalog.json).
+
+`index_for(catalog)` compiles a catalog once and returns the same immutable
+`CatalogIndex` for as long as it is handed the same catalog object (the
+object cache returns one object per ETag). The index holds:
+
+  actions    id -> catalog entry
+  targets    id -> Lambda ARN with ${AWS_REGION}/${AWS_ACCOUNT_ID} filled in
+             from the environment, or the bare function name when a value is
+             unknown (Invoke resolves a name in the caller's account/region)
+  handoffs   persona -> handoff choices every group mapped to it may run
+
+Handoffs are filtered with the policy tables vmq_common's embedded mode
+evaluates (policy_tables.json, compiled from actions.rego): an action is
+offered when it is green for the user's `user.group`, the one field authz
+decides on (vmq_common._policy_group), or yellow (offered with
+`approvalRequired`). Other groups a user or persona has grant nothing, as
+they would be denied. Treat the returned entries and choices as read-only.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from types import MappingProxyType
+try:
+    from . import vmq_common
+except ImportError:  # loaded as a top-level module
+    import vmq_common
+
+LOG = logging.getLogger(__name__)
+
+POLICY_TABLES_PATH = os.getenv("POLICY_TABLES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                  "policy_tables.json"))
+
+# Identity Center group -> persona; users in no listed group get DEFAULT_PERSONA.
+GROUP_PERSONAS = MappingProxyType({
+    "VaultMesh-Engineering": "engineer",
+    "VaultMesh-Delivery": "delivery-manager",
+    "VaultMesh-Compliance": "compliance",
+    "VaultMesh-Management": "delivery-manager",  # fallback for management
+})
+DEFAULT_PERSONA = "engineer"
+
+_PLACEHOLDER = re.compile(r"\$\{(\w+)\}")
+
+def _load_policy(path=POLICY_TABLES_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            t = json.load(f)
+    except Exception as e:
+        LOG.error("Policy tables unavailable at %s, offering no actions: %s", path, e)
+        return {}, {}, frozenset()
+    bits = {g: 1 << i for i, g in enumerate(t["groups"])}
+    return bits, t["green"], frozenset(t["yellow"])
+
+def resolve_target(arn: str, env=os.environ) -> str:
+    """The catalog's Lambda ARN with placeholders substituted, or its function name if one is unknown."""
+    values = {"AWS_REGION": env.get("AWS_REGION") or env.get("AWS_DEFAULT_REGION"),
+              "AWS_ACCOUNT_ID": env.get("AWS_ACCOUNT_ID")}
+    resolved = _PLACEHOLDER.sub(lambda m: values.get(m.group(1)) or m.group(0), arn)
+    if "${" in resolved:
+        return resolved.rsplit(":function:", 1)[-1]
+    return resolved
+
+class CatalogIndex:
+    __slots__ = ("version", "actions", "targets", "handoffs", "_bits", "_green", "_yellow", "_by_bit", "_lock")
+
+    def __init__(self, catalog: dict, policy=None, env=os.environ):
+        self._bits, self._green, self._yellow = policy or _load_policy()
+        entries = [a for a in catalog.get("catalog", []) if isinstance(a, dict) and a.get("id")]
+        self.version = catalog.get("version")
+        self.actions = MappingProxyType({a["id"]: a for a in entries})
+        self.targets = MappingProxyType({a["id"]: resolve_target(a.get("lambda", ""), env) for a in entries})
+        self._by_bit, self._lock = {}, threading.Lock()
+        personas = {}
+        for group, persona in GROUP_PERSONAS.items():
+            personas.setdefault(persona, []).append(group)
+        personas.setdefault(DEFAULT_PERSONA, [])
+        self.handoffs = MappingProxyType({p: self._persona_handoffs(groups) for p, groups in personas.items()})
+
+    def _choice(self, action: dict) -> dict:
+        invocation = action.get("invocation", {})
+        return {
+            "id": action["id"],
+            "name": action["name"],
+            "handoffText": invocation.get("handoffText", action["name"]),
+            "description": action["description"],
+            "lambda": self.targets[action["id"]],
+            "safetyTier": action.get("safetyTier", "UNKNOWN"),
+            "approvalRequired": action["id"] in self._yellow,
+        }
+
+    def handoffs_for_group(self, group) -> tuple:
+        """Choices for a user whose user.group is `group`, in catalog order (memoized per group)."""
+        bit = self._bits.get(group, 0)
+        hit = self._by_bit.get(bit)
+        if hit is None:
+            hit = tuple(self._choice(a) for a in self.actions.values()
+                        if self._green.get(a["id"], 0) & bit or a["id"] in self._yellow)
+            with self._lock:
+                hit = self._by_bit.setdefault(bit, hit)
+        return hit
+
+    def handoffs_for_user(self, user: dict) -> tuple:
+        """Choices for an action event's `user`, filtered on the group authz decides on."""
+        return self.handoffs_for_group(vmq_common._policy_group({"user": user}))
+
+    def _persona_handoffs(self, groups) -> tuple:
+        """Choices that pass for every group mapped to a persona: each of its users carries one as user.group."""
+        lists = [self.handoffs_for_group(g) for g in groups or [None]]
+        passing = set.intersection(*({c["id"] for c in choices} for choices in lists))
+        return tuple(c for c in lists[0] if c["id"] in passing)
+
+_compiled = (None, None)
+_compiled_lock = threading.Lock()
+
+def index_for(catalog: dict) -> CatalogIndex:
+    """The index of `catalog`, compiled on first sight of this catalog object."""
+    global _compiled
+    seen, index = _compiled
+    if seen is catalog:
+        return index
+    with _compiled_lock:
+        if _compiled[0] is not catalog:
+            _compiled = (catalog, CatalogIndex(catalog))
+        return _compiled[1]
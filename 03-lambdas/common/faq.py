@@ -0,0 +1,354 @@
+"""
+FAQ extraction behind generate-faq.
+
+Walks an S3 prefix page by page and extracts candidate Q&A pairs from each
+Markdown document: question headings and list items ("- What ...?" with an
+indented answer), "## Definition" sections, definition lists ("- **Term**:
+text", "Term" + ": text") and alias lists ("- alias → canonical"). The
+candidates are ranked down to maxQuestions.
+
+Per-document results are cached by (key, ETag): in process for warm
+containers and, with FAQ_CACHE_URI set, in one JSON manifest per prefix, so a
+regeneration only fetches the objects whose ETag changed since the last run.
+"""
+import hashlib
+import heapq
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+try:
+    from . import s3io
+    from .summarize import strip_markup, tokenize
+except ImportError:  # loaded as a top-level module
+    from common import s3io
+    from common.summarize import strip_markup, tokenize
+
+LOG = logging.getLogger(__name__)
+
+FAQ_MAX_OBJECTS = int(os.getenv("FAQ_MAX_OBJECTS", "10000"))
+FAQ_MAX_BYTES = int(os.getenv("FAQ_MAX_BYTES", str(1024 * 1024)))
+FAQ_CACHE_ENTRIES = int(os.getenv("FAQ_CACHE_ENTRIES", "20000"))
+FAQ_CACHE_URI = os.getenv("FAQ_CACHE_URI")  # e.g. s3://bucket/cache/faq/
+FAQ_SUFFIXES = tuple(os.getenv("FAQ_SUFFIXES", ".md,.markdown,.txt").split(","))
+
+# Bump when extraction changes so cached results from older code are ignored.
+EXTRACTOR_VERSION = 2
+
+_MAX_PAIRS = 50           # candidates kept per document
+_MAX_TERMS = 40           # most frequent terms kept per document (for ranking)
+_MAX_SECTION_LINES = 80   # lines buffered per section
+_ANSWER_CHARS = 400
+
+_WEIGHTS = {"qa": 3.0, "heading": 3.0, "definition": 2.5, "term": 2.0, "alias": 1.0, "section": 1.0}
+_SAME_DOC_DECAY = 0.8
+
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_ITEM = re.compile(r"^(\s*)(?:[-*+]|\d+[.)])\s+(.*)$")
+_ALIAS = re.compile(r"^(.{1,60}?)\s*(?:→|->|=>)\s*(.{1,120})$")
+_TERM = re.compile(r"^(?:\*\*|__)(.{1,60}?)(?:\*\*|__)\s*(?::|—|–|-)?\s+(.+)$|^([^:]{1,40}):\s+(.+)$")
+_DEF_LINE = re.compile(r"^:\s+(.+)$")
+_SUBTITLE = re.compile(r"\s+[—–-]\s+")
+_PRONOUN = re.compile(r"\bit\b", re.I)
+_TITLE_NOISE = re.compile(r"^(faq|faqs)\s*[:\-–—]\s*|\s+(overview|faq|faqs)$", re.I)
+_SKIP_SECTIONS = {"see also", "relations", "aliases", "q&a", "faq", "faqs", "references", "links",
+                  "contents", "table of contents", "changelog"}
+_DEFINITION_SECTIONS = {"definition", "overview", "summary", "what is it", "about"}
+_GENERIC_TITLES = {"glossary", "readme", "index", "notes"}
+
+def _subject(title: str) -> str:
+    title = _SUBTITLE.split(title or "", 1)[0]
+    return _TITLE_NOISE.sub("", title).strip()
+
+def _what_is(subject: str) -> str:
+    last = subject.split()[-1]
+    plural = last.endswith("s") and not last.endswith(("ss", "is", "us")) and not last.isupper()
+    return f"What {'are' if plural else 'is'} {subject}?"
+
+class _Extractor:
+    """Line-at-a-time state machine; one instance per document."""
+
+    def __init__(self):
+        self.title, self.pairs, self.tf = None, [], Counter()
+        self.heading, self.body, self.in_fence = None, [], False
+
+    def feed(self, line: str):
+        if _FENCE.match(line):
+            self.in_fence = not self.in_fence
+            return
+        if self.in_fence:
+            return
+        m = _HEADING.match(line)
+        if m:
+            self._section()
+            text = strip_markup(m.group(2))
+            if self.title is None and len(m.group(1)) == 1:
+                self.title = text
+                return
+            self.heading = text
+            return
+        if line.strip():
+            self.tf.update(tokenize(line))
+        if len(self.body) < _MAX_SECTION_LINES:
+            self.body.append(line.rstrip())
+
+    def close(self):
+        self._section()
+        return {
+            "v": EXTRACTOR_VERSION,
+            "title": self.title,
+            "pairs": self.pairs[:_MAX_PAIRS],
+            "terms": [t for t, _ in self.tf.most_common(_MAX_TERMS)],
+        }
+
+    def _add(self, question, answer, kind):
+        question, answer = strip_markup(question), strip_markup(answer)
+        subject = _subject(self.title)
+        if kind in ("qa", "heading") and subject and subject.lower() not in _GENERIC_TITLES:
+            # "How does it relate to X?" only makes sense next to its document.
+            question = _PRONOUN.sub(subject, question, count=1)
+        if question and answer and len(self.pairs) < _MAX_PAIRS:
+            if len(answer) > _ANSWER_CHARS:
+                answer = answer[:_ANSWER_CHARS].rsplit(" ", 1)[0] + "…"
+            self.pairs.append([question, answer, kind])
+
+    def _section(self):
+        heading, body = self.heading, self.body
+        self.body = []
+        items, paragraph, pending_term = [], [], None
+        for line in body:
+            item = _ITEM.match(line)
+            if item:
+                items.append([item.group(2).strip(), []])
+                continue
+            text = line.strip()
+            if not text:
+                if paragraph and not items:
+                    paragraph.append("")
+                continue
+            definition = _DEF_LINE.match(text)
+            if definition and pending_term and strip_markup(pending_term).strip():
+                self._add(_what_is(pending_term), definition.group(1), "term")
+                if paragraph and paragraph[-1] == pending_term:
+                    paragraph.pop()  # the term line is not prose
+                continue
+            if items and line[:1].isspace():
+                items[-1][1].append(text)  # continuation of the last list item
+            elif not items:
+                paragraph.append(text)
+            pending_term = text if len(text.split()) <= 6 and not text.endswith((".", ":")) else None
+
+        first = " ".join(paragraph[:paragraph.index("")] if "" in paragraph else paragraph)
+        name = (heading or "").strip().lower()
+        if heading and heading.endswith("?"):
+            answer = first or " ".join(text for text, _ in items[:3])
+            self._add(heading, answer, "heading")
+        elif name in _DEFINITION_SECTIONS or (heading is None and first):
+            subject = _subject(self.title)
+            if first and subject and subject.lower() not in _GENERIC_TITLES:
+                self._add(_what_is(subject), first, "definition")
+        elif heading and first and name not in _SKIP_SECTIONS:
+            self._add(f"What should I know about {heading}?", first, "section")
+
+        for text, cont in items:
+            if text.endswith("?"):
+                if cont:
+                    self._add(text, " ".join(cont), "qa")
+                continue
+            alias = _ALIAS.match(text)
+            if alias:
+                self._add(f"What does “{strip_markup(alias.group(1))}” refer to?", alias.group(2), "alias")
+                continue
+            term = _TERM.match(text)
+            if term and name not in _SKIP_SECTIONS:
+                word, definition = (term.group(1), term.group(2)) if term.group(1) else (term.group(3), term.group(4))
+                word = strip_markup(word).strip().rstrip(":").strip()
+                if word:  # "- ** **: x" names no term
+                    self._add(_what_is(word), definition, "term")
+
+def extract_lines(lines) -> dict:
+    """Extract {"v", "title", "pairs": [[question, answer, kind]], "terms"} from Markdown lines."""
+    ex = _Extractor()
+    for line in lines:
+        ex.feed(line)
+    return ex.close()
+
+def extract(uri: str) -> dict:
+    """Stream `uri` from S3 through extract_lines (at most FAQ_MAX_BYTES)."""
+    body = s3io.open_object(uri)
+    try:
+        return extract_lines(s3io.iter_lines(body, max_bytes=FAQ_MAX_BYTES))
+    finally:
+        body.close()
+
+class _ExtractionCache:
+    """Bounded LRU of per-document extractions keyed by (bucket, key, etag)."""
+
+    def __init__(self, size=FAQ_CACHE_ENTRIES):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return hit
+
+    def put(self, key, extraction):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = extraction
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_CACHE = _ExtractionCache()
+_MANIFESTS = {}  # manifest uri -> (etag, entries), revalidated with If-None-Match
+
+def _manifest_uri(prefix_uri: str):
+    if not FAQ_CACHE_URI:
+        return None
+    digest = hashlib.sha256(prefix_uri.encode("utf-8")).hexdigest()[:16]
+    return f"{FAQ_CACHE_URI.rstrip('/')}/{digest}.json"
+
+def _load_manifest(uri: str) -> dict:
+    etag, entries = _MANIFESTS.get(uri, (None, None))
+    try:
+        doc, new_etag = s3io.get_json(uri, if_none_match=etag)
+    except Exception as e:
+        if s3io.error_code(e) not in ("NoSuchKey", "404"):
+            LOG.warning("faq manifest %s unreadable: %s", uri, s3io.describe_error(e))
+        return {}
+    if doc is not None:
+        entries = doc.get("entries", {}) if doc.get("v") == EXTRACTOR_VERSION else {}
+        _MANIFESTS[uri] = (new_etag, entries)
+    return entries or {}
+
+def _save_manifest(uri: str, entries: dict):
+    try:
+        _MANIFESTS[uri] = (s3io.put_json(uri, {"v": EXTRACTOR_VERSION, "entries": entries}), entries)
+    except Exception as e:
+        LOG.warning("faq manifest %s not written: %s", uri, s3io.describe_error(e))
+
+def rank(docs: list, max_questions: int) -> list:
+    """docs: [(key, extraction)] -> up to max_questions (question, answer, key), best first."""
+    doc_freq = Counter(t for _, ext in docs for t in ext["terms"])
+    candidates = []
+    for key, ext in docs:
+        for question, answer, kind in ext["pairs"]:
+            words = tokenize(question) or [""]
+            spread = sum(math.log1p(doc_freq[t]) for t in words) / len(words)
+            score = _WEIGHTS.get(kind, 1.0) * (1 + 0.5 * spread) * (0.7 if len(answer) < 20 else 1.0)
+            candidates.append((score, key, question, answer))
+    heap = [(-score, key, question, answer, 0) for score, key, question, answer in candidates]
+    heapq.heapify(heap)
+
+    picked, seen, per_doc = [], set(), Counter()
+    # Lazy greedy: a document's candidates lose _SAME_DOC_DECAY for every pick from it,
+    # so a popped entry scored before its document's latest pick is re-scored and pushed back.
+    while heap and len(picked) < max_questions:
+        neg, key, question, answer, scored_at = heapq.heappop(heap)
+        if scored_at != per_doc[key]:
+            decay = _SAME_DOC_DECAY ** (per_doc[key] - scored_at)
+            heapq.heappush(heap, (neg * decay, key, question, answer, per_doc[key]))
+            continue
+        norm = " ".join(tokenize(question)) or question.lower()
+        if norm in seen:
+            continue
+        seen.add(norm)
+        per_doc[key] += 1
+        picked.append((question, answer, key))
+    return picked
+
+def generate(prefix_uri: str, max_questions: int = 12, max_workers: int = 0, progress=None) -> dict:
+    """
+    Build the FAQ for every Markdown/text object under `prefix_uri`.
+
+    `progress(done, total, message)` (optional) is called as documents that
+    are not cached are extracted.
+
+    Returns {"faqMarkdown", "questionCount", "documents": {listed, cached,
+    reprocessed, failed, truncated}}. Listing errors propagate.
+    """
+    bucket = s3io.parse_uri(prefix_uri.rstrip("/") + "/x")[0]
+    manifest_uri = _manifest_uri(prefix_uri)
+    manifest = _load_manifest(manifest_uri) if manifest_uri else {}
+
+    listed, docs, todo = 0, [], []
+    for obj in s3io.list_objects(prefix_uri, FAQ_MAX_OBJECTS):
+        listed += 1
+        key, etag = obj["Key"], obj["ETag"]
+        if not key.lower().endswith(FAQ_SUFFIXES):
+            continue
+        ext = _CACHE.get((bucket, key, etag))
+        if ext is None:
+            stored = manifest.get(key)
+            if stored and stored[0] == etag:
+                ext = stored[1]
+                _CACHE.put((bucket, key, etag), ext)
+        if ext is None:
+            todo.append((key, etag))
+        docs.append([key, etag, ext])
+
+    fn = extract
+    if progress is not None:
+        done, lock = [0], threading.Lock()
+
+        def fn(uri):
+            try:
+                return extract(uri)
+            finally:
+                with lock:
+                    done[0] += 1
+                    count = done[0]
+                progress(count, len(todo), uri)
+    results = s3io.fetch_many([f"s3://{bucket}/{key}" for key, _ in todo], fn, max_workers)
+    fresh, failed = {}, []
+    for (key, etag), (ext, error) in zip(todo, results):
+        if error is not None:
+            failed.append({"key": key, "error": s3io.describe_error(error)})
+            continue
+        fresh[key] = ext
+        _CACHE.put((bucket, key, etag), ext)
+    for doc in docs:
+        if doc[2] is None:
+            doc[2] = fresh.get(doc[0])
+
+    ready = [(key, ext) for key, _, ext in docs if ext is not None]
+    if manifest_uri and (fresh or len(manifest) != len(ready)):
+        _save_manifest(manifest_uri, {key: [etag, ext] for key, etag, ext in docs if ext is not None})
+
+    pairs = rank(ready, max_questions)
+    md = ["# FAQ", f"_Derived from **{prefix_uri}**: {len(ready)} document(s)_", ""]
+    for question, answer, key in pairs:
+        md += [f"## Q: {question}", f"- {answer} _(source: {key})_"]
+    if not pairs:
+        md.append("_No question/answer candidates found._")
+    if failed:
+        md += ["", "### Unreadable documents"] + [f"- {f['key']} ({f['error']})" for f in failed[:20]]
+
+    return {
+        "faqMarkdown": "\n".join(md),
+        "questionCount": len(pairs),
+        "documents": {
+            "listed": listed,
+            "cached": len(ready) - len(fresh),
+            "reprocessed": len(todo),
+            "failed": len(failed),
+            "truncated": listed >= FAQ_MAX_OBJECTS,
+        },
+    }
@@ -0,0 +1,187 @@
+"""
+Idempotent replay of action responses (used by vmq_common.batchable).
+
+A request is identified by a canonical hash of its action, user, persona and
+params. A successful response is saved under that hash together with the
+request_id that produced it and is replayed for:
+
+  - the same hash and request_id within IDEMPOTENCY_TTL_SECONDS (a retry of
+    the same invocation, e.g. Q Business after a client timeout), or
+  - the same hash with any request_id within IDEMPOTENCY_REUSE_SECONDS (a
+    user re-running an identical request).
+
+The reuse window is short on purpose: the documents behind a request can
+change, and a replay never re-reads them. The user is part of the hash
+because responses carry per-user state (pack provenance, job ownership).
+
+Backends (IDEMPOTENCY_STORE):
+  memory            LRU in the warm container (default; a retry that lands
+                    on another container recomputes)
+  sqlite:<path>     local file, shared by processes on one host
+  dynamodb:<table>  shared by every container; items expire through the
+                    table's TTL on `expiresAt`
+  off               disabled
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+try:
+    from . import aws_clients
+except ImportError:  # loaded as a top-level module
+    import aws_clients
+
+LOG = logging.getLogger(__name__)
+
+# Override hook for tests and bench.py; otherwise the shared lazy DynamoDB client.
+DYNAMODB = None
+
+IDEMPOTENCY_STORE = os.getenv("IDEMPOTENCY_STORE", "memory")
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+IDEMPOTENCY_REUSE_SECONDS = float(os.getenv("IDEMPOTENCY_REUSE_SECONDS", "300"))
+IDEMPOTENCY_CACHE_ENTRIES = int(os.getenv("IDEMPOTENCY_CACHE_ENTRIES", "256"))
+IDEMPOTENCY_MAX_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BYTES", str(256 * 1024)))  # DynamoDB items: 400 KB
+
+class _MemoryStore:
+    """Bounded LRU of saved entries with an absolute expiry each."""
+
+    def __init__(self, size=IDEMPOTENCY_CACHE_ENTRIES):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit and hit[0] > time.time():
+                self._entries.move_to_end(key)
+                return hit[1]
+            if hit:
+                del self._entries[key]
+            return None
+
+    def put(self, key: str, entry: dict, expires: float):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (expires, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+class _SqliteStore:
+    """One table of JSON entries; expired rows are purged every few hundred writes."""
+
+    _PURGE_EVERY = 256
+
+    def __init__(self, path: str):
+        import sqlite3
+        self._db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, doc TEXT, expires REAL)")
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT doc FROM responses WHERE key = ? AND expires > ?",
+                                   (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, entry: dict, expires: float):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, json.dumps(entry), expires))
+            self._writes += 1
+            if self._writes % self._PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+
+class _DynamoStore:
+    """Items {key, doc (JSON), expiresAt (TTL attribute)}; TTL deletion lags, so reads check expiry too."""
+
+    def __init__(self, table: str):
+        self.table = table
+
+    def _client(self):
+        client = DYNAMODB or aws_clients.client("dynamodb")
+        if client is None:
+            raise RuntimeError("DynamoDB unavailable (boto3 not installed)")
+        return client
+
+    def get(self, key: str):
+        item = self._client().get_item(TableName=self.table, Key={"key": {"S": key}}).get("Item")
+        if not item or float(item["expiresAt"]["N"]) <= time.time():
+            return None
+        return json.loads(item["doc"]["S"])
+
+    def put(self, key: str, entry: dict, expires: float):
+        self._client().put_item(TableName=self.table, Item={
+            "key": {"S": key}, "doc": {"S": json.dumps(entry)}, "expiresAt": {"N": str(int(expires))}})
+
+_store = None
+_store_lock = threading.Lock()
+
+def store():
+    """The configured store, or None when replay is disabled."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                kind, _, where = IDEMPOTENCY_STORE.partition(":")
+                if kind in ("", "off"):
+                    _store = False
+                elif kind == "memory":
+                    _store = _MemoryStore()
+                elif kind == "sqlite":
+                    _store = _SqliteStore(where)
+                elif kind == "dynamodb":
+                    _store = _DynamoStore(where)
+                else:
+                    LOG.error("IDEMPOTENCY_STORE must be memory, sqlite:<path>, dynamodb:<table> or off, "
+                              "not %r; replay disabled", IDEMPOTENCY_STORE)
+                    _store = False
+    return _store or None
+
+def reset(store_spec: str = None):
+    """Drop the current store, optionally switching backend (for tests and bench.py)."""
+    global _store, IDEMPOTENCY_STORE
+    with _store_lock:
+        _store = None
+        if store_spec:
+            IDEMPOTENCY_STORE = store_spec
+
+def request_key(event: dict) -> str:
+    """Canonical hash of what determines the response: action, user, persona and params."""
+    doc = {"action": event.get("action"), "user": (event.get("user") or {}).get("id"),
+           "persona": (event.get("context") or {}).get("persona"), "params": event.get("params") or {}}
+    text = json.dumps(doc, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def replay(key: str, request_id: str):
+    """(response, "retry" | "repeat", age_s) for a saved response that may be replayed, else None."""
+    st = store()
+    if st is None:
+        return None
+    entry = st.get(key)
+    if entry is None:
+        return None
+    age = time.time() - entry["created"]
+    if age < IDEMPOTENCY_REUSE_SECONDS:
+        kind = "retry" if request_id and request_id == entry.get("requestId") else "repeat"
+    elif request_id and request_id == entry.get("requestId") and age < IDEMPOTENCY_TTL_SECONDS:
+        kind = "retry"
+    else:
+        return None
+    return entry["response"], kind, age
+
+def save(key: str, request_id: str, response: dict) -> bool:
+    """Save a successful response; False when it is not kept (disabled, too large or failed status)."""
+    st = store()
+    if st is None or response.get("statusCode") != 200 or len(response.get("body") or "") > IDEMPOTENCY_MAX_BYTES:
+        return False
+    now = time.time()
+    window = IDEMPOTENCY_TTL_SECONDS if request_id else 0.0
+    st.put(key, {"created": now, "requestId": request_id, "response": response},
+           now + max(window, IDEMPOTENCY_REUSE_SECONDS))
+    return True
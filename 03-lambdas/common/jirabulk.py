@@ -0,0 +1,134 @@
+"""
+Bulk Jira drafts behind create-jira-draft (`issues: [...]`).
+
+Every item is validated in one pass and problems are reported per item
+instead of failing the request. Items with the same project and the same
+normalized summary and description (NFKC, case-folded, whitespace
+collapsed) collapse into the first one, which takes their labels. Drafts
+come back as Jira bulk-create bodies (`POST /rest/api/2/issue/bulk`, at
+most JIRA_BULK_CHUNK_ISSUES issues each). Chunks are added while the
+response, measured as Lambda serializes it, stays under
+JIRA_BULK_RESPONSE_BYTES. Drafts that do not fit are returned by the next
+call with the same `issues` and `cursor` set to the returned `nextCursor`.
+"""
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+JIRA_BULK_MAX_ITEMS = int(os.getenv("JIRA_BULK_MAX_ITEMS", "1000"))
+JIRA_BULK_CHUNK_ISSUES = int(os.getenv("JIRA_BULK_CHUNK_ISSUES", "50"))  # Jira's bulk-create limit
+JIRA_BULK_RESPONSE_BYTES = int(os.getenv("JIRA_BULK_RESPONSE_BYTES", str(5 * 1024 * 1024)))  # Lambda: 6 MB
+JIRA_SUMMARY_MAX_CHARS = 255
+JIRA_DESCRIPTION_MAX_CHARS = 32767
+DEFAULT_ISSUE_TYPE = "Task"
+
+_PROJECT_KEY = re.compile(r"^[A-Z][A-Z0-9_]{1,9}$")
+_SPACE = re.compile(r"\s+")
+
+def _wire_size(doc) -> int:
+    """Bytes `doc` adds to a Lambda response: ok() dumps it, then the runtime escapes that string."""
+    return len(json.dumps(json.dumps(doc))) - 2
+
+def _normalized(text: str) -> str:
+    if not text.isascii():
+        text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.casefold().split())
+
+def _check(item, defaults: dict):
+    """(fields, errors) for one input item; fields is None when the item is invalid."""
+    if not isinstance(item, dict):
+        return None, ["item must be an object"]
+    errors = []
+    project = item.get("projectKey") or defaults.get("projectKey")
+    summary, description = item.get("summary"), item.get("description")
+    labels = item.get("labels", defaults.get("labels")) or []
+    issue_type = item.get("issueType") or defaults.get("issueType") or DEFAULT_ISSUE_TYPE
+    if not isinstance(project, str) or not _PROJECT_KEY.match(project):
+        errors.append("projectKey must be an uppercase Jira project key")
+    if not isinstance(summary, str) or not summary.strip():
+        errors.append("summary is required")
+    elif len(summary) > JIRA_SUMMARY_MAX_CHARS or "\n" in summary:
+        errors.append(f"summary must be one line of at most {JIRA_SUMMARY_MAX_CHARS} characters")
+    if not isinstance(description, str) or not description.strip():
+        errors.append("description is required")
+    elif len(description) > JIRA_DESCRIPTION_MAX_CHARS:
+        errors.append(f"description exceeds {JIRA_DESCRIPTION_MAX_CHARS} characters")
+    if not isinstance(labels, list) or not all(isinstance(l, str) and l and not _SPACE.search(l) for l in labels):
+        errors.append("labels must be a list of strings without spaces")
+    if not isinstance(issue_type, str) or not issue_type.strip():
+        errors.append("issueType must be a string")
+    if errors:
+        return None, errors
+    return {"project": {"key": project}, "summary": summary.strip(), "description": description,
+            "issuetype": {"name": issue_type}, "labels": list(dict.fromkeys(labels))}, []
+
+def _fingerprint(fields: dict) -> str:
+    text = "\0".join((fields["project"]["key"], _normalized(fields["summary"]), _normalized(fields["description"])))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def draft(issues: list, defaults: dict = None, cursor: int = 0) -> dict:
+    """
+    Validate, deduplicate and chunk `issues`.
+
+    `defaults` may carry projectKey, labels and issueType for items that
+    omit them. `cursor` skips drafts already returned by an earlier call.
+    Raises ValueError for an unusable request (not a list, too many items,
+    bad cursor).
+    """
+    if not isinstance(issues, list) or not issues:
+        raise ValueError("issues must be a non-empty list")
+    if len(issues) > JIRA_BULK_MAX_ITEMS:
+        raise ValueError(f"at most {JIRA_BULK_MAX_ITEMS} issues per request")
+    if isinstance(cursor, bool) or not isinstance(cursor, int) or cursor < 0:
+        raise ValueError("cursor must be a non-negative integer")
+    defaults = defaults or {}
+
+    report, drafts, first = [], [], {}  # drafts: [fields, input indices]; first: fingerprint -> drafts index
+    for index, item in enumerate(issues):
+        fields, errors = _check(item, defaults)
+        if fields is None:
+            report.append({"index": index, "status": "invalid", "errors": errors})
+            continue
+        key = _fingerprint(fields)
+        if key in first:
+            kept = drafts[first[key]]
+            kept[0]["labels"] = list(dict.fromkeys(kept[0]["labels"] + fields["labels"]))
+            kept[1].append(index)
+            report.append({"index": index, "status": "duplicate", "duplicateOf": kept[1][0]})
+            continue
+        first[key] = len(drafts)
+        drafts.append([fields, [index]])
+        report.append({"index": index, "status": "drafted", "draft": first[key]})
+    if cursor > len(drafts):
+        raise ValueError(f"cursor beyond the {len(drafts)} draft(s) in this request")
+
+    summary = {"received": len(issues), "drafted": len(drafts),
+               "duplicates": sum(r["status"] == "duplicate" for r in report),
+               "invalid": sum(r["status"] == "invalid" for r in report)}
+    # Everything but the chunks, plus room for the chunk counters and nextCursor filled in below.
+    used = _wire_size({"items": report, "summary": summary, "dryRun": True, "approverRequired": True}) + 128
+    chunks, position = [], cursor
+    while position < len(drafts):
+        chunk = {"items": [], "body": {"issueUpdates": []}}
+        size = _wire_size(chunk) + 2
+        while position < len(drafts) and len(chunk["body"]["issueUpdates"]) < JIRA_BULK_CHUNK_ISSUES:
+            fields, indices = drafts[position]
+            issue = {"fields": fields}
+            grow = _wire_size(issue) + _wire_size(indices[0]) + 4
+            if used + size + grow > JIRA_BULK_RESPONSE_BYTES and (chunks or chunk["items"]):
+                break
+            chunk["body"]["issueUpdates"].append(issue)
+            chunk["items"].append(indices[0])
+            size += grow
+            position += 1
+        if not chunk["items"]:
+            break
+        chunks.append(chunk)
+        used += size
+    out = {"chunks": chunks, "items": report, "summary": dict(summary, chunks=len(chunks), bytes=used),
+           "dryRun": True, "approverRequired": True}
+    if position < len(drafts):
+        out["nextCursor"] = position
+    return out
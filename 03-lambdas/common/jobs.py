@@ -0,0 +1,270 @@
+"""
+Asynchronous job mode for long-running actions.
+
+A handler that supports it calls `submit()` once the request is authorized
+and validated. When the caller asked for a job (`params.async`, or
+ASYNC_DEFAULT on the function), the event is saved as a job record and
+queued, and the caller gets a `jobId` straight away. A worker later runs
+the same handler on the saved event, with `_job_id` set so the handler does
+the work this time. The outcome goes into the record: the response body
+(inline, and at `JOB_RESULT_URI/<jobId>.json` when set), or the error.
+`get-job-status` reads the record.
+
+Backends:
+  JOB_STORE      sqlite:<path> (default, local) or dynamodb:<table>
+  JOB_QUEUE_URL  SQS queue consumed by job_worker.handler; unset runs jobs
+                 on an in-process thread pool (local development only: a
+                 frozen Lambda container does not run background threads)
+
+The worker claims a job with a conditional update (queued -> running), so a
+redelivered message never runs a job twice. A job still "running" long
+after its last update is reported as lost.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+try:
+    from . import aws_clients, registry, s3io, vmq_common
+except ImportError:  # loaded as a top-level module
+    from common import aws_clients, registry, s3io, vmq_common
+
+LOG = logging.getLogger(__name__)
+
+# Override hook for tests and bench.py; otherwise the shared lazy SQS client.
+SQS = None
+
+JOB_STORE = os.getenv("JOB_STORE", "sqlite:/tmp/vmq-jobs.sqlite3")
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", "")
+JOB_RESULT_URI = os.getenv("JOB_RESULT_URI", "")  # e.g. s3://<EXPORT_BUCKET>/jobs/
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "960"))  # worker timeout plus a margin
+JOB_PROGRESS_SECONDS = float(os.getenv("JOB_PROGRESS_SECONDS", "2"))
+JOB_INLINE_RESULT_BYTES = int(os.getenv("JOB_INLINE_RESULT_BYTES", str(64 * 1024)))
+ASYNC_DEFAULT = os.getenv("ASYNC_DEFAULT", "0") == "1"
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+class _SqliteStore:
+    """One table of JSON documents; updates run in an immediate transaction."""
+
+    def __init__(self, path: str):
+        import sqlite3
+        self._db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, doc TEXT, expires REAL)")
+        self._lock = threading.Lock()
+
+    def create(self, job: dict):
+        with self._lock:
+            self._db.execute("INSERT INTO jobs VALUES (?, ?, ?, ?)",
+                             (job["jobId"], job["status"], json.dumps(job), job["expiresAt"]))
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT doc FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, job_id: str, changes: dict, expect: str = None) -> bool:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT doc FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                job = json.loads(row[0]) if row else None
+                if job is None or (expect and job["status"] != expect):
+                    return False
+                job.update(changes)
+                self._db.execute("UPDATE jobs SET status = ?, doc = ? WHERE id = ?",
+                                 (job["status"], json.dumps(job), job_id))
+                return True
+            finally:
+                self._db.execute("COMMIT")
+
+class _DynamoStore:
+    """Items {jobId, status, doc (JSON), expiresAt (TTL attribute)}; status guards every update."""
+
+    def __init__(self, table: str):
+        self.table = table
+
+    def _client(self):
+        client = aws_clients.client("dynamodb")
+        if client is None:
+            raise RuntimeError("DynamoDB unavailable (boto3 not installed)")
+        return client
+
+    def create(self, job: dict):
+        self._client().put_item(TableName=self.table, Item={
+            "jobId": {"S": job["jobId"]}, "status": {"S": job["status"]}, "doc": {"S": json.dumps(job)},
+            "expiresAt": {"N": str(int(job["expiresAt"]))}}, ConditionExpression="attribute_not_exists(jobId)")
+
+    def get(self, job_id: str):
+        item = self._client().get_item(TableName=self.table, Key={"jobId": {"S": job_id}},
+                                       ConsistentRead=True).get("Item")
+        return json.loads(item["doc"]["S"]) if item else None
+
+    def update(self, job_id: str, changes: dict, expect: str = None) -> bool:
+        job = self.get(job_id)
+        if job is None or (expect and job["status"] != expect):
+            return False
+        was = job["status"]
+        job.update(changes)
+        try:
+            self._client().update_item(
+                TableName=self.table, Key={"jobId": {"S": job_id}},
+                UpdateExpression="SET #s = :s, doc = :d", ConditionExpression="#s = :was",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={":s": {"S": job["status"]}, ":d": {"S": json.dumps(job)},
+                                           ":was": {"S": was}})
+            return True
+        except Exception as e:
+            if s3io.error_code(e) == "ConditionalCheckFailedException":
+                return False
+            raise
+
+_store = None
+_store_lock = threading.Lock()
+
+def store():
+    """The configured job store (built on first use)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                kind, _, where = JOB_STORE.partition(":")
+                if kind == "sqlite":
+                    _store = _SqliteStore(where)
+                elif kind == "dynamodb":
+                    _store = _DynamoStore(where)
+                else:
+                    raise ValueError(f"JOB_STORE must be sqlite:<path> or dynamodb:<table>, not {JOB_STORE!r}")
+    return _store
+
+def reset(store_spec: str = None):
+    """Point the module at another store (for tests and bench.py)."""
+    global _store, JOB_STORE
+    with _store_lock:
+        _store = None
+        if store_spec:
+            JOB_STORE = store_spec
+
+def requested(event: dict) -> bool:
+    """True when this invocation should become a job instead of doing the work."""
+    if "_job_id" in event:
+        return False
+    flag = (event.get("params") or {}).get("async")
+    return ASYNC_DEFAULT if flag is None else flag in (True, "true", "1", 1)
+
+def submit(event: dict) -> dict:
+    """Save and queue `event` as a job; returns the handler response carrying the jobId."""
+    now = time.time()
+    job_id = uuid.uuid4().hex
+    saved = {k: v for k, v in event.items() if not k.startswith("_")}
+    job = {"jobId": job_id, "action": event.get("action"), "userId": (event.get("user") or {}).get("id"),
+           "status": QUEUED, "created": now, "updated": now, "expiresAt": now + JOB_TTL_SECONDS,
+           "requestId": (event.get("context") or {}).get("request_id"), "event": saved, "progress": None}
+    with vmq_common.phase(event, "work"):
+        try:
+            store().create(job)
+            _dispatch(job_id)
+        except Exception as e:
+            LOG.exception("job %s not queued", job_id)
+            return vmq_common.err(503, f"job not queued: {s3io.describe_error(e)}", event)
+    vmq_common.metric(event, "JobsSubmitted", 1)
+    # Counted as JobsSubmitted only: run() counts the invocation when the job's handler answers.
+    return vmq_common.ok({"jobId": job_id, "status": QUEUED, "statusAction": "get-job-status"}, event,
+                         invoked=False)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _dispatch(job_id: str):
+    global _pool
+    if JOB_QUEUE_URL:
+        client = SQS or aws_clients.client("sqs")
+        if client is None:
+            raise RuntimeError("SQS unavailable (boto3 not installed)")
+        client.send_message(QueueUrl=JOB_QUEUE_URL, MessageBody=json.dumps({"jobId": job_id}))
+        return
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+    _pool.submit(run, job_id, None)
+
+def run(job_id: str, ctx) -> str:
+    """Run a queued job to completion; returns its final status (or the status that stopped it)."""
+    st = store()
+    if not st.update(job_id, {"status": RUNNING, "started": time.time(), "updated": time.time()}, expect=QUEUED):
+        job = st.get(job_id)
+        return job["status"] if job else "missing"
+    job = st.get(job_id)
+    event = dict(job["event"], _job_id=job_id)
+    fn = registry.handler_for(event.get("action"))
+    try:
+        resp = fn(event, ctx) if fn else vmq_common.err(400, f"unknown action: {event.get('action')}", event)
+        body = json.loads(resp["body"])
+    except Exception as e:
+        LOG.exception("job %s failed", job_id)
+        resp, body = {"statusCode": 500}, {"error": f"internal error: {e}"}
+    changes = {"status": SUCCEEDED if resp["statusCode"] < 400 else FAILED, "statusCode": resp["statusCode"],
+               "updated": time.time()}
+    if changes["status"] == FAILED:
+        changes["error"] = body.get("error")
+    else:
+        try:
+            changes.update(_store_result(job_id, body))
+        except Exception as e:
+            # The job must still leave RUNNING: a redelivery only claims QUEUED jobs.
+            LOG.exception("job %s result not stored", job_id)
+            changes.update(status=FAILED, statusCode=500, error=f"result not stored: {s3io.describe_error(e)}")
+    st.update(job_id, changes, expect=RUNNING)
+    return changes["status"]
+
+def _store_result(job_id: str, body: dict) -> dict:
+    out = {}
+    if JOB_RESULT_URI:
+        out["resultUri"] = f"{JOB_RESULT_URI.rstrip('/')}/{job_id}.json"
+        s3io.put_json(out["resultUri"], body)
+    if len(json.dumps(body)) <= JOB_INLINE_RESULT_BYTES or not JOB_RESULT_URI:
+        out["result"] = body
+    return out
+
+class _Progress:
+    """Throttled progress writer handed to long-running work as a callback."""
+
+    def __init__(self, job_id: str):
+        self.job_id, self._last, self._lock = job_id, 0.0, threading.Lock()
+
+    def __call__(self, done: int, total: int, message: str = ""):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last < JOB_PROGRESS_SECONDS and done < total:
+                return
+            self._last = now
+        try:
+            store().update(self.job_id, {"progress": {"done": done, "total": total, "message": message},
+                                         "updated": time.time()}, expect=RUNNING)
+        except Exception as e:  # progress is best effort
+            LOG.warning("job %s progress not saved: %s", self.job_id, e)
+
+def progress(event: dict):
+    """Callback(done, total, message="") recording progress for a job run, or None outside a job."""
+    job_id = event.get("_job_id")
+    return _Progress(job_id) if job_id else None
+
+def status(job_id: str, user_id: str):
+    """Public view of a job for its owner, or None (unknown, expired or someone else's)."""
+    job = store().get(job_id)
+    # Jobs without an owner are nobody's: anonymous callers must not read each other's jobs.
+    if job is None or not user_id or job.get("userId") != user_id or job["expiresAt"] < time.time():
+        return None
+    view = {k: job.get(k) for k in ("jobId", "action", "status", "progress", "created", "updated", "statusCode")}
+    if job["status"] == RUNNING and time.time() - job["updated"] > JOB_STALE_SECONDS:
+        view.update(status=FAILED, error="worker lost (no update within JOB_STALE_SECONDS)")
+    for key in ("resultUri", "result", "error"):
+        if key in job:
+            view[key] = job[key]
+    return view
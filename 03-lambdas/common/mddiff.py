@@ -0,0 +1,339 @@
+"""
+Section-aware Markdown diff behind draft-change-note.
+
+Both documents are streamed (common.s3io) into a flat list of sections, each
+keyed by its heading path ("Spec › Auth › Tokens") and hashed. The section
+lists are compared first: identical hashes are skipped without looking at a
+single line, equal bodies under a different path are moves/renames, and the
+order of the remaining common sections yields reorders. Only sections whose
+path matches but whose hash differs get a line-level Myers diff, so the diff
+cost follows the size of the change rather than the size of the documents.
+"""
+import bisect
+import hashlib
+import os
+import re
+try:
+    from . import s3io
+except ImportError:  # loaded as a top-level module
+    from common import s3io
+
+CHANGE_NOTE_MAX_BYTES = int(os.getenv("CHANGE_NOTE_MAX_BYTES", str(32 * 1024 * 1024)))
+CHANGE_NOTE_MAX_EDIT = int(os.getenv("CHANGE_NOTE_MAX_EDIT", "2000"))
+CHANGE_NOTE_SAMPLES = int(os.getenv("CHANGE_NOTE_SAMPLES", "3"))
+CHANGE_NOTE_MAX_ITEMS = int(os.getenv("CHANGE_NOTE_MAX_ITEMS", "25"))
+
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_MARKER = re.compile(r"^\s{0,3}(?:#|```|~~~)|^\s*(?:```|~~~)")  # cheap pre-check per line
+_META = re.compile(r"^\s*(owners?|reviewers?|approvers?)\s*:\s*(.+)$", re.I)
+_NORMATIVE = re.compile(r"\b(MUST|SHALL|REQUIRED|SHOULD NOT|MUST NOT|SHALL NOT|breaking|deprecated)\b")
+_SEP = " › "
+
+class Section:
+    """One heading and the lines up to the next heading (subsections are separate sections)."""
+
+    __slots__ = ("path", "level", "lines", "digest")
+
+    def __init__(self, path: tuple, level: int):
+        self.path, self.level, self.lines, self.digest = path, level, [], None
+
+    def label(self, root: tuple = ()) -> str:
+        """Heading path without the shared document title `root`."""
+        path = self.path[len(root):] if self.path[:len(root)] == root and len(self.path) > len(root) else self.path
+        return _SEP.join(path) or "(preamble)"
+
+class Outline:
+    """A parsed document: sections in document order plus owner metadata."""
+
+    def __init__(self):
+        self.sections, self.reviewers, self.lines, self.bytes, self.truncated = [], [], 0, 0, False
+
+def parse_lines(lines) -> Outline:
+    """Split Markdown lines into hashed sections keyed by heading path (code fences are not headings)."""
+    out, stack, seen = Outline(), [], {}
+    current = Section((), 0)
+    in_fence, front_matter = False, None
+
+    def close(section):
+        body = "\n".join(section.lines).strip("\n")
+        section.digest = hashlib.blake2b(body.encode("utf-8"), digest_size=16).digest()
+        out.sections.append(section)
+
+    for n, line in enumerate(lines):
+        out.lines += 1
+        # YAML front matter: only owner/reviewer fields are read.
+        if n == 0 and line.strip() == "---":
+            front_matter = True
+            continue
+        if front_matter:
+            if line.strip() == "---":
+                front_matter = False
+                continue
+            meta = _META.match(line)
+            if meta:
+                out.reviewers += [r.strip(" []'\"") for r in meta.group(2).split(",") if r.strip(" []'\"")]
+            continue
+        if not _MARKER.match(line):
+            current.lines.append(line)
+            continue
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        heading = None if in_fence else _HEADING.match(line)
+        if heading is None:
+            current.lines.append(line)
+            continue
+        close(current)
+        level, text = len(heading.group(1)), " ".join(heading.group(2).split())
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, text))
+        path = tuple(t for _, t in stack)
+        # Repeated headings under one parent ("Example", "Notes") get an ordinal.
+        seen[path] = seen.get(path, 0) + 1
+        if seen[path] > 1:
+            path = path[:-1] + (f"{text} ({seen[path]})",)
+        current = Section(path, level)
+    close(current)
+    if len(out.sections) > 1 and not "".join(out.sections[0].lines).strip():
+        out.sections.pop(0)  # empty preamble
+    return out
+
+def parse(uri: str) -> Outline:
+    body = s3io.open_object(uri)
+    stats = {}
+    try:
+        outline = parse_lines(s3io.iter_lines(body, max_bytes=CHANGE_NOTE_MAX_BYTES, stats=stats))
+    finally:
+        body.close()
+    outline.bytes, outline.truncated = stats["bytes"], stats["truncated"]
+    return outline
+
+def myers(a: list, b: list, max_d: int = CHANGE_NOTE_MAX_EDIT):
+    """
+    Myers O((N+M)D) shortest edit script between line lists a and b.
+
+    Returns [(op, line)] with op in "=", "-", "+", or None when more than
+    `max_d` edits are needed (the caller reports the section as rewritten).
+    """
+    # Common prefix/suffix never need the search.
+    head = 0
+    while head < len(a) and head < len(b) and a[head] == b[head]:
+        head += 1
+    tail = 0
+    while tail < len(a) - head and tail < len(b) - head and a[-1 - tail] == b[-1 - tail]:
+        tail += 1
+    a_mid, b_mid = a[head:len(a) - tail], b[head:len(b) - tail]
+    ops = [("=", line) for line in a[:head]]
+
+    ids = {}
+    x_ids = [ids.setdefault(line, len(ids)) for line in a_mid]
+    y_ids = [ids.setdefault(line, len(ids)) for line in b_mid]
+    n, m = len(x_ids), len(y_ids)
+    offset = min(n + m, max_d) + 1
+    v = [0] * (2 * offset + 1)
+    trace, found = [], n == 0 and m == 0
+    for d in range(offset):
+        if found:
+            break
+        # Only diagonals -d-1..d+1 are read when backtracking from step d.
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and x_ids[x] == y_ids[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                found = True
+                break
+    if not found:
+        return None
+
+    mid = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        vd, base = trace[d], d + 1  # vd[k + base] is diagonal k
+        k = x - y
+        if k == -d or (k != d and vd[k - 1 + base] < vd[k + 1 + base]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = vd[prev_k + base]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x, y = x - 1, y - 1
+            mid.append(("=", a_mid[x]))
+        if x == prev_x:
+            y -= 1
+            mid.append(("+", b_mid[y]))
+        else:
+            x -= 1
+            mid.append(("-", a_mid[x]))
+    while x > 0 and y > 0:
+        x, y = x - 1, y - 1
+        mid.append(("=", a_mid[x]))
+    mid.reverse()
+    return ops + mid + [("=", line) for line in a[len(a) - tail:]]
+
+def _lis_members(seq: list) -> set:
+    """Indexes of one longest increasing subsequence of `seq` (patience sorting)."""
+    tails, tails_idx, prev = [], [], [-1] * len(seq)
+    for i, value in enumerate(seq):
+        j = bisect.bisect_left(tails, value)
+        if j == len(tails):
+            tails.append(value)
+            tails_idx.append(i)
+        else:
+            tails[j], tails_idx[j] = value, i
+        prev[i] = tails_idx[j - 1] if j else -1
+    members, i = set(), tails_idx[-1] if tails_idx else -1
+    while i >= 0:
+        members.add(i)
+        i = prev[i]
+    return members
+
+def diff(base: Outline, updated: Outline) -> dict:
+    """Section-level diff with line diffs for modified sections only."""
+    old = {s.path: (i, s) for i, s in enumerate(base.sections)}
+    new = {s.path: (i, s) for i, s in enumerate(updated.sections)}
+
+    removed = [s for s in base.sections if s.path not in new]
+    added = [s for s in updated.sections if s.path not in old]
+    common = [(old[s.path][0], s) for s in updated.sections if s.path in old]
+
+    # Same non-empty body under another path: a rename or a move to another parent.
+    moved, by_digest, matched = [], {}, set()
+    for s in removed:
+        if any(line.strip() for line in s.lines):
+            by_digest.setdefault(s.digest, []).append(s)
+    for s in added:
+        twins = by_digest.get(s.digest)
+        if twins:
+            src = twins.pop(0)
+            moved.append((src, s))
+            matched.update((id(src), id(s)))
+    if matched:
+        added = [s for s in added if id(s) not in matched]
+        removed = [s for s in removed if id(s) not in matched]
+
+    # Common sections whose relative order changed (outside one longest in-order run).
+    in_order = _lis_members([i for i, _ in common])
+    reordered = [s for n, (_, s) in enumerate(common) if n not in in_order]
+
+    modified, changed_lines = [], 0
+    for _, s in common:
+        before = old[s.path][1]
+        if before.digest == s.digest:
+            continue
+        ops = myers(before.lines, s.lines)
+        if ops is None:
+            plus, minus, samples = len(s.lines), len(before.lines), []
+        else:
+            plus = sum(1 for op, _ in ops if op == "+")
+            minus = sum(1 for op, _ in ops if op == "-")
+            samples = [(op, line) for op, line in ops if op != "=" and line.strip()]
+        if plus or minus:
+            modified.append({"section": s, "plus": plus, "minus": minus, "samples": samples,
+                             "rewritten": ops is None})
+            changed_lines += plus + minus
+
+    changed_lines += sum(len(s.lines) + 1 for s in added) + sum(len(s.lines) + 1 for s in removed)
+    return {"added": added, "removed": removed, "moved": moved, "reordered": reordered,
+            "modified": modified, "changed_lines": changed_lines}
+
+def impact(result: dict, base: Outline) -> tuple:
+    """(level, reason) from the share of changed lines and the structural changes."""
+    structural = len(result["added"]) + len(result["removed"]) + len(result["moved"]) + len(result["reordered"])
+    share = result["changed_lines"] / max(1, base.lines)
+    normative = any(_NORMATIVE.search(line) for m in result["modified"] for _, line in m["samples"])
+    top_removed = any(s.level <= 2 for s in result["removed"])
+    if not structural and not result["modified"]:
+        return "None", "documents are identical section by section"
+    if share >= 0.2 or structural >= 10 or top_removed:
+        level = "High"
+    elif share >= 0.05 or structural >= 3:
+        level = "Medium"
+    else:
+        level = "Low"
+    if normative and level == "Low":
+        level = "Medium"
+    reason = f"{share:.1%} of lines changed, {structural} structural change(s)"
+    if top_removed:
+        reason += ", top-level section removed"
+    if normative:
+        reason += ", normative wording (MUST/SHALL/deprecated) touched"
+    return level, reason
+
+def _quote(line: str, limit: int = 120) -> str:
+    line = line.strip().replace("`", "'")
+    return line if len(line) <= limit else line[:limit - 1] + "…"
+
+def render(result: dict, base: Outline, updated: Outline, baseline_uri: str, updated_uri: str,
+           window: str) -> tuple:
+    """Return (markdown, impact level)."""
+    level, reason = impact(result, base)
+    # A single H1 shared by every section is the document title; leave it out of the paths.
+    titles = {s.path[:1] for s in base.sections + updated.sections if s.level == 1}
+    root = titles.pop() if len(titles) == 1 else ()
+    counts = {k: len(result[k]) for k in ("modified", "added", "removed", "moved", "reordered")}
+    cap = CHANGE_NOTE_MAX_ITEMS
+
+    md = ["# Change Note", f"**Window:** {window}", "", "## Summary",
+          f"- Compared **{baseline_uri}** ({len(base.sections)} sections) with "
+          f"**{updated_uri}** ({len(updated.sections)} sections).",
+          "- " + (", ".join(f"{n} {k}" for k, n in counts.items() if n) or "no changes") + "."]
+    if base.truncated or updated.truncated:
+        md.append(f"- Only the first {CHANGE_NOTE_MAX_BYTES // (1024 * 1024)} MiB of each document were compared.")
+
+    md += ["", "## Deltas"]
+    if result["added"]:
+        md.append("### Added")
+        md += [f"- **{s.label(root)}** ({len(s.lines)} lines)" for s in result["added"][:cap]]
+    if result["removed"]:
+        md.append("### Removed")
+        md += [f"- **{s.label(root)}** ({len(s.lines)} lines)" for s in result["removed"][:cap]]
+    if result["moved"] or result["reordered"]:
+        md.append("### Moved")
+        md += [f"- **{a.label(root)}** → **{b.label(root)}**" for a, b in result["moved"][:cap]]
+        md += [f"- **{s.label(root)}** (reordered)" for s in result["reordered"][:cap]]
+    if result["modified"]:
+        md.append("### Modified")
+        for m in result["modified"][:cap]:
+            note = ", rewritten" if m["rewritten"] else ""
+            md.append(f"- **{m['section'].label(root)}** (+{m['plus']}/−{m['minus']} lines{note})")
+            md += [f"  - `{op} {_quote(line)}`" for op, line in m["samples"][:CHANGE_NOTE_SAMPLES]]
+    hidden = sum(max(0, len(result[k]) - cap) for k in ("added", "removed", "moved", "reordered", "modified"))
+    if hidden:
+        md.append(f"- …and {hidden} more change(s).")
+    if md[-1] == "## Deltas":
+        md.append("- No differences found.")
+
+    md += ["", "## Impact", f"- **{level}**: {reason}.", "", "## Reviewers"]
+    reviewers = list(dict.fromkeys(updated.reviewers or base.reviewers))
+    md += [f"- {r if r.startswith('@') else '@' + r}" for r in reviewers] or \
+          ["- _Assign reviewers: no owner/reviewers front matter in either document._"]
+    return "\n".join(md) + "\n", level
+
+def change_note(baseline_uri: str, updated_uri: str, window: str = "Unspecified") -> dict:
+    """Fetch both documents concurrently, diff them and render the change note."""
+    (base, base_err), (updated, updated_err) = s3io.fetch_many([baseline_uri, updated_uri], parse)
+    for uri, error in ((baseline_uri, base_err), (updated_uri, updated_err)):
+        if error is not None:
+            raise LookupError(f"{uri}: {s3io.describe_error(error)}")
+    result = diff(base, updated)
+    md, level = render(result, base, updated, baseline_uri, updated_uri, window)
+    return {
+        "changeMarkdown": md,
+        "impact": level,
+        "stats": {
+            "sections": {"baseline": len(base.sections), "updated": len(updated.sections)},
+            "modified": len(result["modified"]), "added": len(result["added"]),
+            "removed": len(result["removed"]), "moved": len(result["moved"]) + len(result["reordered"]),
+            "changedLines": result["changed_lines"],
+        },
+    }
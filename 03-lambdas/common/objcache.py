@@ -0,0 +1,140 @@
+"""
+Revalidating cache of small JSON objects in S3 (personas, the actions catalog).
+
+An entry is served from memory for OBJECT_CACHE_TTL seconds. After that it
+is revalidated with a conditional GET (`IfNoneMatch` on the stored ETag), so
+an unchanged object costs a 304 and no body. Within
+OBJECT_CACHE_STALE_SECONDS past the TTL the stale copy is returned at once
+and one background thread revalidates it (stale-while-revalidate); older
+entries are revalidated inline. Either way only one request per key is in
+flight: concurrent callers of a missing key wait for that request instead of
+issuing their own.
+
+A failed refresh keeps the last good copy and is not retried for
+OBJECT_CACHE_ERROR_BACKOFF seconds. A key that never loaded re-raises its
+last error during the backoff. NoSuchKey is authoritative and drops the
+copy. Entries are evicted least recently used beyond OBJECT_CACHE_ENTRIES.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+LOG = logging.getLogger(__name__)
+
+OBJECT_CACHE_TTL = float(os.getenv("OBJECT_CACHE_TTL", "300"))
+OBJECT_CACHE_STALE_SECONDS = float(os.getenv("OBJECT_CACHE_STALE_SECONDS", "3600"))
+OBJECT_CACHE_ERROR_BACKOFF = float(os.getenv("OBJECT_CACHE_ERROR_BACKOFF", "30"))
+OBJECT_CACHE_ENTRIES = int(os.getenv("OBJECT_CACHE_ENTRIES", "128"))
+
+def _error_code(e: Exception):
+    return (getattr(e, "response", None) or {}).get("Error", {}).get("Code")
+
+class _Entry:
+    __slots__ = ("value", "loaded", "etag", "checked", "retry_at", "error", "flight")
+
+    def __init__(self):
+        self.value, self.loaded, self.etag = None, False, None
+        self.checked = self.retry_at = 0.0
+        self.error = self.flight = None
+
+class ObjectCache:
+    """
+    get(bucket, key) -> parsed JSON, through the cache.
+
+    `client` is a callable returning the S3 client to use, so callers keep
+    their own override hooks and lazy construction.
+    """
+
+    def __init__(self, client, ttl=OBJECT_CACHE_TTL, stale=OBJECT_CACHE_STALE_SECONDS,
+                 backoff=OBJECT_CACHE_ERROR_BACKOFF, size=OBJECT_CACHE_ENTRIES, background=True):
+        self._client = client
+        self.ttl, self.stale, self.backoff, self.size = ttl, stale, backoff, size
+        self.background = background
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.stale_hits = self.fetches = self.not_modified = self.errors = self.evictions = 0
+
+    def get(self, bucket: str, key: str):
+        k = (bucket, key)
+        with self._lock:
+            e = self._entries.get(k)
+            if e is None:
+                e = self._entries[k] = _Entry()
+                while len(self._entries) > max(self.size, 1):
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._entries.move_to_end(k)
+            now = time.monotonic()
+            age = now - e.checked
+            if e.loaded and age < self.ttl:
+                self.hits += 1
+                return e.value
+            flight, lead = e.flight, False
+            if flight is None and now >= e.retry_at:
+                flight = e.flight = threading.Event()
+                lead = True
+            if e.loaded:
+                self.stale_hits += 1
+                if not lead:
+                    return e.value  # being refreshed, or backing off after an error
+                if self.background and age < self.ttl + self.stale:
+                    threading.Thread(target=self._refresh, args=(k, e, flight), name="objcache-refresh",
+                                     daemon=True).start()
+                    return e.value
+            elif not lead and flight is None:
+                raise e.error
+        if lead:
+            self._refresh(k, e, flight)
+        else:
+            flight.wait()
+        with self._lock:
+            if e.loaded:
+                return e.value
+            raise e.error
+
+    def _refresh(self, k, e: _Entry, flight: threading.Event):
+        bucket, key = k
+        kwargs = {"Bucket": bucket, "Key": key}
+        if e.loaded and e.etag:
+            kwargs["IfNoneMatch"] = e.etag
+        try:
+            resp = self._client().get_object(**kwargs)
+            try:
+                value = json.loads(resp["Body"].read().decode("utf-8"))
+            finally:
+                resp["Body"].close()
+            with self._lock:
+                e.value, e.loaded, e.etag, e.error = value, True, resp.get("ETag"), None
+                e.checked, e.retry_at = time.monotonic(), 0.0
+                self.fetches += 1
+        except Exception as err:
+            code = _error_code(err)
+            with self._lock:
+                if code in ("304", "NotModified") and e.loaded:
+                    e.checked, e.retry_at, e.error = time.monotonic(), 0.0, None
+                    self.not_modified += 1
+                    return
+                self.errors += 1
+                e.error, e.retry_at = err, time.monotonic() + self.backoff
+                if code in ("NoSuchKey", "404"):
+                    e.value, e.loaded, e.etag = None, False, None
+            if e.loaded:
+                LOG.warning("Refreshing s3://%s/%s failed, serving the cached copy: %s", bucket, key, code or err)
+        finally:
+            with self._lock:
+                e.flight = None
+            flight.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "stale_hits": self.stale_hits,
+                    "fetches": self.fetches, "not_modified": self.not_modified, "errors": self.errors,
+                    "evictions": self.evictions}
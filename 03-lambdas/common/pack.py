@@ -0,0 +1,275 @@
+"""
+Streaming compliance-pack builder behind generate-compliance-pack.
+
+Source objects are read in parallel by a small pool of prefetchers, each
+filling a bounded queue of chunks, and written in order into a ZIP stream
+(zipstream: entries use data descriptors and ZIP64 where needed). The ZIP
+stream is an s3io.MultipartWriter: finished parts go to S3 while later
+entries are still being read. Neither the archive nor any source is held
+whole in memory or /tmp, so a pack can be many times larger than the
+function's memory. Each entry is hashed as it streams; README.md
+(provenance), manifest.json and MANIFEST.sha256 are written last.
+
+With a content-addressed store (`cas_root`, see cas.py), a source whose
+ETag still matches its ref is copied from its stored blob, already
+compressed, instead of being downloaded and deflated again; sources seen
+for the first time are stored as they are written. A source whose content
+already appears in the pack is listed in the manifest but not stored twice.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import queue
+import threading
+import time
+import zlib
+try:
+    from . import cas, s3io, zipstream
+except ImportError:  # loaded as a top-level module
+    from common import cas, s3io, zipstream
+
+PACK_FETCH_WORKERS = int(os.getenv("PACK_FETCH_WORKERS", "4"))
+PACK_PREFETCH_CHUNKS = int(os.getenv("PACK_PREFETCH_CHUNKS", "8"))
+PACK_MAX_SOURCES = int(os.getenv("PACK_MAX_SOURCES", "500"))
+PACK_COMPRESS_LEVEL = int(os.getenv("PACK_COMPRESS_LEVEL", "6"))
+PACK_STORED_SUFFIXES = tuple(s.strip().lower() for s in os.getenv(
+    "PACK_STORED_SUFFIXES", ".zip,.gz,.bz2,.xz,.7z,.png,.jpg,.jpeg,.gif,.pdf,.docx,.xlsx,.pptx,.mp4").split(",")
+    if s.strip())
+
+GUARDRAILS = ("credentials-and-secrets", "confidential-business-info")
+_COVER_ROWS = 50       # files listed in the returned cover before "…and N more"
+_INFLATE_CHUNK = 1024 * 1024
+
+LOG = logging.getLogger(__name__)
+
+class _Done:
+    """End-of-object marker on a prefetch queue."""
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _open_source(uri: str, cas_root: str):
+    """
+    ("cas", ref, body) when the source still matches its stored blob,
+    otherwise ("origin", response, body). A known ref turns the source read
+    into a conditional GET: 304 means the blob is current, 200 is the new
+    content, so a changed source still costs one request.
+    """
+    bucket, key = s3io.parse_uri(uri)
+    client = s3io._client()
+    ref = cas.lookup(cas_root, uri) if cas_root else None
+    if ref is not None:
+        try:
+            resp = client.get_object(Bucket=bucket, Key=key, IfNoneMatch=f'"{ref.etag}"')
+            return "origin", resp, resp["Body"]
+        except Exception as e:
+            if s3io.error_code(e) not in ("304", "NotModified"):
+                raise
+        try:
+            return "cas", ref, cas.open_blob(cas_root, ref)
+        except Exception as e:  # blob gone or replaced: read the (unchanged) source again
+            LOG.warning("cas blob %s for %s unusable: %s", ref.blob, uri, s3io.describe_error(e))
+    resp = client.get_object(Bucket=bucket, Key=key)
+    return "origin", resp, resp["Body"]
+
+def _prefetch(uri: str, cas_root: str, q: queue.Queue, stop: threading.Event):
+    """Stream `uri` into `q`: ("meta", kind, info) first, then chunks, then _Done or the exception."""
+    try:
+        kind, info, body = _open_source(uri, cas_root)
+    except Exception as e:
+        _put(q, ("missing", e), stop)
+        return
+    try:
+        if not _put(q, ("meta", kind, info), stop):
+            return
+        while not stop.is_set():
+            chunk = body.read(s3io.READ_CHUNK_BYTES)
+            if not chunk:
+                _put(q, _Done, stop)
+                return
+            if not _put(q, chunk, stop):
+                return
+    except Exception as e:
+        _put(q, ("failed", e), stop)
+    finally:
+        body.close()
+
+def _chunks(q: queue.Queue):
+    while True:
+        item = q.get()
+        if item is _Done:
+            return
+        if isinstance(item, tuple):  # ("failed", exception) mid-stream: the entry would be truncated
+            raise item[1]
+        yield item
+
+def _entry_name(uri: str, taken: set) -> str:
+    """sources/<key> with unsafe segments dropped and collisions numbered."""
+    key = uri[5:].partition("/")[2]
+    parts = [p for p in key.split("/") if p not in ("", ".", "..")]
+    name = "sources/" + ("/".join(parts) or "object")
+    stem, ext = posixpath.splitext(name)
+    n = 1
+    while name in taken:
+        n += 1
+        name = f"{stem}-{n}{ext}"
+    taken.add(name)
+    return name
+
+def _readme(meta: dict, files: list, missing: list, limit: int = 0) -> str:
+    rows = files[:limit] if limit else files
+    md = ["# Compliance Pack", f"**Regime:** {meta['regime']}",
+          f"**Request:** {meta['request_id']} · **Requested by:** {meta['requested_by']} · "
+          f"**Generated:** {meta['generated']}", "", "## Contents",
+          f"{len(files)} source document(s), {sum(f['bytes'] for f in files):,} bytes.", "",
+          "| File | Source | Bytes | SHA-256 |", "|------|--------|------:|---------|"]
+    md += [f"| `{f['path']}`{' (same content)' if f.get('duplicate') else ''} | {f['uri']} | {f['bytes']:,} "
+           f"| `{f['sha256']}` |" for f in rows]
+    if len(rows) < len(files):
+        md.append(f"| …and {len(files) - len(rows)} more | | | |")
+    if missing:
+        md += ["", "## Unavailable sources"] + [f"- {m['uri']} ({m['error']})" for m in missing]
+    md += ["", "## Provenance & Controls",
+           f"- Guardrails: {', '.join(GUARDRAILS)} (active)",
+           "- OPA Gate: vaultmesh.actions.* (green only)",
+           "- Integrity: `MANIFEST.sha256` lists the SHA-256 of every file in this archive "
+           "(`sha256sum -c MANIFEST.sha256`); `manifest.json` adds source URIs and ETags, and lists sources "
+           "with identical content under the one file that holds it."]
+    return "\n".join(md) + "\n"
+
+def _dedupe_stats(files: list) -> dict:
+    total = sum(f["bytes"] for f in files)
+    reused = [f for f in files if f["source"] == "cas" and not f.get("duplicate")]
+    duplicates = [f for f in files if f.get("duplicate")]
+    saved = sum(f["bytes"] for f in reused + duplicates)
+    return {"reused": len(reused), "duplicates": len(duplicates), "bytesSaved": saved,
+            "ratio": round(100.0 * saved / total, 2) if total else 0.0}
+
+def build(source_uris: list, package_uri: str, meta: dict, deadline: float = None, cas_root: str = None,
+          progress=None) -> dict:
+    """
+    Stream `source_uris` into a ZIP at `package_uri`.
+
+    `meta` carries regime, request_id and requested_by for the README.
+    `deadline` (time.monotonic()) aborts the upload before the function
+    times out. `cas_root` (an s3:// prefix) enables the content-addressed
+    store. `progress(done, total, message)` is called after each source.
+    Returns {"packageUri", "bytes", "sha256", "files", "missing",
+    "readme", "dedupe"}; raises LookupError when no source can be read,
+    TimeoutError on the deadline, and read/upload errors otherwise (the
+    upload is aborted in every failure case).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    meta = dict(meta, generated=datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"))
+    stop, queues = threading.Event(), [queue.Queue(maxsize=PACK_PREFETCH_CHUNKS) for _ in source_uris]
+    files, missing, taken, stored = [], [], set(), {}
+    archive_hash = hashlib.sha256()
+    workers = max(1, min(PACK_FETCH_WORKERS, len(source_uris)))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pack")
+    try:
+        for uri, q in zip(source_uris, queues):
+            pool.submit(_prefetch, uri, cas_root, q, stop)
+        with s3io.MultipartWriter(package_uri, "application/zip") as out:
+            zs = zipstream.ZipStream(_HashingWriter(out, archive_hash), PACK_COMPRESS_LEVEL)
+            for uri, q in zip(source_uris, queues):
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"pack not finished before the deadline ({len(files)} files written)")
+                head = q.get()
+                if head[0] == "missing":
+                    missing.append({"uri": uri, "error": s3io.describe_error(head[1])})
+                else:
+                    if head[1] == "cas":
+                        entry = _copy_blob(zs, uri, head[2], q, taken, stored)
+                    else:
+                        entry = _write_entry(zs, uri, head[2], q, taken, cas_root)
+                    stored.setdefault(entry["sha256"], entry["path"])
+                    files.append(entry)
+                if progress is not None:
+                    progress(len(files) + len(missing), len(source_uris), uri)
+            if not files:
+                raise LookupError("; ".join(f"{m['uri']}: {m['error']}" for m in missing) or "no sources")
+            dedupe = _dedupe_stats(files)
+            readme = _readme(meta, files, missing)
+            manifest = {"regime": meta["regime"], "requestId": meta["request_id"],
+                        "generated": meta["generated"], "files": files, "missing": missing, "dedupe": dedupe}
+            sums = []
+            for name, data in (("README.md", readme), ("manifest.json", json.dumps(manifest, indent=2))):
+                data = data.encode("utf-8")
+                zs.writestr(name, data)
+                sums.append(f"{hashlib.sha256(data).hexdigest()}  {name}")
+            sums += [f"{f['sha256']}  {f['path']}" for f in files if not f.get("duplicate")]
+            zs.writestr("MANIFEST.sha256", ("\n".join(sums) + "\n").encode("utf-8"))
+            zs.close()
+    finally:
+        stop.set()
+        pool.shutdown(wait=True)
+    return {"packageUri": package_uri, "bytes": out.size, "sha256": archive_hash.hexdigest(), "files": files,
+            "missing": missing, "readme": _readme(meta, files, missing, limit=_COVER_ROWS), "dedupe": dedupe}
+
+def _write_entry(zs: zipstream.ZipStream, uri: str, resp: dict, q: queue.Queue, taken: set, cas_root: str) -> dict:
+    name = _entry_name(uri, taken)
+    compress = not name.lower().endswith(PACK_STORED_SUFFIXES)
+    etag = resp.get("ETag", "").strip('"')
+    sink = cas.BlobSink(cas_root, f"deflate{PACK_COMPRESS_LEVEL}" if compress else "stored") \
+        if cas_root and etag else None
+    digest = hashlib.sha256()
+    try:
+        with zs.open(name, compress, size_hint=resp.get("ContentLength"), tee=sink) as entry:
+            for chunk in _chunks(q):
+                digest.update(chunk)
+                entry.write(chunk)
+    except BaseException:
+        if sink is not None:
+            sink.abort()
+        raise
+    sha256 = digest.hexdigest()
+    blob = sink.finish(sha256) if sink is not None else None
+    if blob is not None:
+        cas.remember(cas_root, uri, cas.Ref(etag, blob, sha256, entry.size, entry.csize, entry.crc, entry.method))
+    return {"path": name, "uri": uri, "bytes": entry.size, "sha256": sha256, "etag": etag, "source": "origin"}
+
+def _copy_blob(zs: zipstream.ZipStream, uri: str, ref, q: queue.Queue, taken: set, stored: dict) -> dict:
+    """Copy a stored blob into the archive as-is, checking it against its SHA-256 on the way."""
+    entry = {"path": stored.get(ref.sha256), "uri": uri, "bytes": ref.size, "sha256": ref.sha256,
+             "etag": ref.etag, "source": "cas"}
+    if entry["path"] is not None:  # same content already in this pack
+        for _ in _chunks(q):
+            pass
+        return dict(entry, duplicate=True)
+    entry["path"] = _entry_name(uri, taken)
+    digest = hashlib.sha256()
+    inflate = zlib.decompressobj(-15) if ref.method == zipstream.DEFLATED else None
+
+    def verified():
+        for chunk in _chunks(q):
+            data = inflate.decompress(chunk, _INFLATE_CHUNK) if inflate else chunk
+            digest.update(data)
+            while inflate and inflate.unconsumed_tail:
+                digest.update(inflate.decompress(inflate.unconsumed_tail, _INFLATE_CHUNK))
+            yield chunk
+        if inflate:
+            digest.update(inflate.flush())
+
+    zs.add_raw(entry["path"], verified(), ref.method, ref.crc, ref.size, ref.csize)
+    if digest.hexdigest() != ref.sha256:
+        raise ValueError(f"cas blob {ref.blob} does not match its SHA-256")
+    return entry
+
+class _HashingWriter:
+    """Pass-through writer that hashes the archive bytes on their way to S3."""
+
+    def __init__(self, out, digest):
+        self.out, self.digest = out, digest
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.out.write(data)
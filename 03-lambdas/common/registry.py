@@ -0,0 +1,51 @@
+"""
+Action registry: maps catalog action ids to the per-action handler modules.
+
+The handlers live in `<root>/vmq-*/handler.py` next to `common/` both in the
+source tree and in the router package built by deploy.sh, so they are loaded
+by path and cached. Every handler loaded this way shares the one
+`common.vmq_common` module (authz cache, OPA pool, metrics buffer).
+"""
+import importlib.util
+import os
+import threading
+
+ACTION_FUNCTIONS = {
+    "summarize-docs": "vmq-summarize-docs",
+    "generate-faq": "vmq-generate-faq",
+    "draft-change-note": "vmq-draft-change-note",
+    "validate-schema": "vmq-validate-schema",
+    "create-jira-draft": "vmq-create-jira-draft",
+    "compliance-pack": "vmq-generate-compliance-pack",
+    "get-job-status": "vmq-get-job-status",
+}
+
+ROOT = os.getenv("VMQ_ACTIONS_ROOT") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_handlers = {}
+_lock = threading.Lock()
+
+def _load(fn_dir: str):
+    path = os.path.join(ROOT, fn_dir, "handler.py")
+    spec = importlib.util.spec_from_file_location(f"{fn_dir.replace('-', '_')}_handler", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+def handler_for(action: str):
+    """Return the handler callable for `action`, or None if it is not registered."""
+    fn_dir = ACTION_FUNCTIONS.get(action)
+    if fn_dir is None:
+        return None
+    h = _handlers.get(action)
+    if h is None:
+        with _lock:
+            h = _handlers.get(action)
+            if h is None:
+                h = _handlers[action] = _load(fn_dir)
+    return h
+
+def preload():
+    """Import every registered handler (call during Lambda init, which is not billed per request)."""
+    for action in ACTION_FUNCTIONS:
+        handler_for(action)
@@ -0,0 +1,168 @@
+"""
+Result sink for actions invoked without waiting (InvocationType=Event).
+
+A caller that does not wait puts a `correlation_id` in the event's context.
+The response the action produces (vmq_common.ok()/err(), a replay, or a
+batch envelope's summary) is then written to RESULT_SINK under that id, and
+the caller picks it up later with `get` or `collect`. Requests without a
+correlation id are not written.
+
+Sinks (RESULT_SINK):
+  off            disabled (default)
+  file:<dir>     one JSON file per id in a local directory (development;
+                 the caller and the function must share the directory)
+  s3://bkt/pfx/  one object per id under the prefix; expire them with a
+                 lifecycle rule
+
+Writes are best effort: a failed write is logged and never fails the action.
+An action submitted as a job (params.async) first leaves its submit
+response, carrying the jobId, then the job's outcome once the worker ends.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+try:
+    from . import s3io
+except ImportError:  # loaded as a top-level module
+    import s3io
+
+LOG = logging.getLogger(__name__)
+
+RESULT_SINK = os.getenv("RESULT_SINK", "off")
+RESULT_POLL_SECONDS = float(os.getenv("RESULT_POLL_SECONDS", "1"))
+
+# Ids become file names and object keys: no separators, no leading dot.
+_ID = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9._-]{0,127}$")
+
+class _FileSink:
+    """<dir>/<id>.json, written to a temporary name and renamed so readers never see half a record."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, correlation_id: str, record: dict):
+        path = os.path.join(self.root, f"{correlation_id}.json")
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def get(self, correlation_id: str):
+        try:
+            with open(os.path.join(self.root, f"{correlation_id}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+class _S3Sink:
+    """s3://bucket/prefix/<id>.json through s3io (its S3 override hook applies)."""
+
+    def __init__(self, prefix: str):
+        s3io.parse_uri(prefix.rstrip("/") + "/x")  # validate the bucket part up front
+        self.prefix = prefix.rstrip("/") + "/"
+
+    def put(self, correlation_id: str, record: dict):
+        s3io.put_json(f"{self.prefix}{correlation_id}.json", record)
+
+    def get(self, correlation_id: str):
+        try:
+            return s3io.get_json(f"{self.prefix}{correlation_id}.json")[0]
+        except Exception as e:
+            if s3io.error_code(e) in ("NoSuchKey", "404"):
+                return None
+            raise
+
+_sink = None
+_sink_lock = threading.Lock()
+
+def sink():
+    """The configured sink, or None when results are not collected."""
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                spec = RESULT_SINK
+                if spec in ("", "off"):
+                    _sink = False
+                elif spec.startswith("file:"):
+                    _sink = _FileSink(spec[5:])
+                elif spec.startswith("s3://"):
+                    _sink = _S3Sink(spec)
+                else:
+                    LOG.error("RESULT_SINK must be file:<dir>, s3://bucket/prefix/ or off, not %r; "
+                              "results not collected", spec)
+                    _sink = False
+    return _sink or None
+
+def reset(sink_spec: str = None):
+    """Drop the current sink, optionally switching to another (for tests and bench.py)."""
+    global _sink, RESULT_SINK
+    with _sink_lock:
+        _sink = None
+        if sink_spec:
+            RESULT_SINK = sink_spec
+
+def new_id() -> str:
+    return uuid.uuid4().hex
+
+def valid_id(correlation_id) -> bool:
+    return isinstance(correlation_id, str) and bool(_ID.match(correlation_id))
+
+def deliver(event: dict, response: dict) -> bool:
+    """Write `response` for the event's correlation_id; False when there is nothing to write or it failed."""
+    cid = (event.get("context") or {}).get("correlation_id")
+    if cid is None or "_batch_metrics" in event:
+        return False  # not a fire-and-forget request, or a batch item (the envelope is delivered whole)
+    st = sink()
+    if st is None:
+        return False
+    if not valid_id(cid):
+        LOG.warning("Result not written: invalid correlation_id %r", cid)
+        return False
+    body = response.get("body")
+    try:
+        body = json.loads(body) if isinstance(body, str) else body
+    except ValueError:
+        pass
+    record = {"correlationId": cid, "action": event.get("action"),
+              "requestId": (event.get("context") or {}).get("request_id"), "completed": time.time(),
+              "statusCode": response.get("statusCode"), "body": body}
+    if "_job_id" in event:
+        record["jobId"] = event["_job_id"]
+    try:
+        st.put(cid, record)
+        return True
+    except Exception as e:
+        LOG.warning("Result %s not written: %s", cid, s3io.describe_error(e))
+        return False
+
+def get(correlation_id: str):
+    """The delivered record for `correlation_id`, or None while it is pending (or was never written)."""
+    st = sink()
+    if st is None:
+        raise RuntimeError("RESULT_SINK is off: results are not collected")
+    if not valid_id(correlation_id):
+        raise ValueError(f"invalid correlation_id: {correlation_id!r}")
+    return st.get(correlation_id)
+
+def collect(correlation_ids, timeout: float = 0.0, poll: float = None) -> dict:
+    """
+    {id: record or None} for `correlation_ids`, polling the sink every `poll`
+    (RESULT_POLL_SECONDS) for up to `timeout` seconds until every id has a
+    record (0: look once).
+    """
+    poll = RESULT_POLL_SECONDS if poll is None else poll
+    found, pending = {}, list(dict.fromkeys(correlation_ids))
+    deadline = time.monotonic() + timeout
+    while True:
+        for cid in pending:
+            found[cid] = get(cid)
+        pending = [cid for cid in pending if found[cid] is None]
+        if not pending or time.monotonic() + poll > deadline:
+            return found
+        time.sleep(poll)
@@ -0,0 +1,284 @@
+"""
+S3 document access shared by the action Lambdas.
+
+Objects are read in fixed-size chunks and split into lines as they arrive, so
+a handler never holds a whole body in memory. `fetch_many` runs a function
+over many URIs on a bounded thread pool (boto3 clients are thread-safe).
+"""
+import codecs
+import json
+import os
+try:
+    from . import aws_clients
+except ImportError:  # loaded as a top-level module
+    from common import aws_clients
+
+# Override hook for tests and bench.py; otherwise the shared lazy client.
+S3 = None
+
+READ_CHUNK_BYTES = int(os.getenv("S3_READ_CHUNK_BYTES", str(64 * 1024)))
+MAX_LINE_CHARS = int(os.getenv("S3_MAX_LINE_CHARS", str(64 * 1024)))
+FETCH_WORKERS = int(os.getenv("S3_FETCH_WORKERS", "8"))
+MULTIPART_PART_BYTES = int(os.getenv("S3_MULTIPART_PART_BYTES", str(8 * 1024 * 1024)))
+MULTIPART_CONCURRENCY = int(os.getenv("S3_MULTIPART_CONCURRENCY", "4"))
+_MIN_PART_BYTES = 5 * 1024 * 1024  # S3 minimum for every part but the last
+
+def _s3():
+    return S3 or aws_clients.client("s3")
+
+def parse_uri(uri: str):
+    """Split s3://bucket/key into (bucket, key); raises ValueError otherwise."""
+    if not isinstance(uri, str) or not uri.startswith("s3://"):
+        raise ValueError(f"not an s3:// URI: {uri!r}")
+    bucket, _, key = uri[5:].partition("/")
+    if not bucket or not key:
+        raise ValueError(f"not an s3://bucket/key URI: {uri!r}")
+    return bucket, key
+
+def error_code(e: Exception):
+    return (getattr(e, "response", None) or {}).get("Error", {}).get("Code")
+
+def describe_error(e: Exception) -> str:
+    """Short reason for a failed S3 call (the botocore error code when there is one)."""
+    return error_code(e) or str(e) or type(e).__name__
+
+def _client():
+    client = _s3()
+    if client is None:
+        raise RuntimeError("S3 unavailable (boto3 not installed)")
+    return client
+
+def list_objects(uri: str, max_keys: int = 0):
+    """
+    Yield {"Key", "ETag", "Size"} for every object under the s3://bucket/prefix `uri`.
+
+    Follows list_objects_v2 continuation tokens page by page, so memory does
+    not grow with the prefix size; `max_keys` stops after that many objects.
+    """
+    client = _client()
+    bucket, _, prefix = uri[5:].partition("/") if uri.startswith("s3://") else ("", "", "")
+    if not bucket:
+        raise ValueError(f"not an s3:// URI: {uri!r}")
+    kwargs, seen = {"Bucket": bucket, "Prefix": prefix}, 0
+    while True:
+        page = client.list_objects_v2(**kwargs)
+        for obj in page.get("Contents", ()):
+            if obj["Key"].endswith("/"):
+                continue
+            yield {"Key": obj["Key"], "ETag": obj.get("ETag", "").strip('"'), "Size": obj.get("Size", 0)}
+            seen += 1
+            if max_keys and seen >= max_keys:
+                return
+        if not page.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+def get_json(uri: str, if_none_match: str = None):
+    """
+    Return (document, etag) for a JSON object, or (None, etag) when it still
+    matches `if_none_match` (HTTP 304). Missing objects raise as usual.
+    """
+    bucket, key = parse_uri(uri)
+    kwargs = {"Bucket": bucket, "Key": key}
+    if if_none_match:
+        kwargs["IfNoneMatch"] = f'"{if_none_match}"'
+    try:
+        resp = _client().get_object(**kwargs)
+    except Exception as e:
+        if if_none_match and error_code(e) in ("304", "NotModified"):
+            return None, if_none_match
+        raise
+    try:
+        return json.loads(resp["Body"].read()), resp.get("ETag", "").strip('"')
+    finally:
+        resp["Body"].close()
+
+def put_json(uri: str, doc) -> str:
+    """Write `doc` as compact JSON; returns the new ETag."""
+    bucket, key = parse_uri(uri)
+    body = json.dumps(doc, separators=(",", ":")).encode("utf-8")
+    resp = _client().put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/json")
+    return resp.get("ETag", "").strip('"')
+
+class MultipartWriter:
+    """
+    Write-only binary stream that lands in S3 as a multipart upload.
+
+    Data is cut into parts of MULTIPART_PART_BYTES as it is written and up to
+    MULTIPART_CONCURRENCY parts are uploaded in the background, so memory
+    stays at about (concurrency + 1) parts whatever the object size. The part
+    size doubles every 1000 parts to stay under the 10,000-part limit. An
+    object that never fills a part is sent with a single put_object. Use as
+    a context manager: an exception aborts the upload.
+    """
+
+    def __init__(self, uri: str, content_type: str = "application/octet-stream",
+                 part_bytes: int = 0, concurrency: int = 0):
+        self.bucket, self.key = parse_uri(uri)
+        self.content_type = content_type
+        self.part_bytes = max(_MIN_PART_BYTES, part_bytes or MULTIPART_PART_BYTES)
+        self.concurrency = max(1, concurrency or MULTIPART_CONCURRENCY)
+        self.etag, self.parts, self.size = None, [], 0
+        self._buf, self._upload_id, self._pool, self._pending = bytearray(), None, None, []
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.size
+
+    def write(self, data) -> int:
+        self._buf += data
+        self.size += len(data)
+        while len(self._buf) >= self.part_bytes:
+            part = bytes(self._buf[:self.part_bytes])
+            del self._buf[:self.part_bytes]
+            self._send(part)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _send(self, part: bytes):
+        client = _client()
+        if self._upload_id is None:
+            # Imported here, like fetch_many: single-part objects never need the pool.
+            from concurrent.futures import ThreadPoolExecutor
+            self._upload_id = client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type)["UploadId"]
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="s3io-part")
+        while len(self._pending) >= self.concurrency:
+            self._collect(self._pending.pop(0))
+        number = len(self.parts) + len(self._pending) + 1
+        self._pending.append((number, self._pool.submit(
+            client.upload_part, Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+            PartNumber=number, Body=part)))
+        if number % 1000 == 0:
+            self.part_bytes *= 2
+
+    def retarget(self, uri: str) -> bool:
+        """Point a not-yet-started upload at another key; False once a part has been sent."""
+        if self._upload_id is not None or self.etag is not None:
+            return False
+        self.bucket, self.key = parse_uri(uri)
+        return True
+
+    def _collect(self, pending):
+        number, future = pending
+        self.parts.append({"PartNumber": number, "ETag": future.result()["ETag"]})
+
+    def close(self) -> str:
+        """Upload what is left and complete the object; returns its ETag."""
+        if self.etag is not None:
+            return self.etag
+        client = _client()
+        if self._upload_id is None:
+            resp = client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buf),
+                                     ContentType=self.content_type)
+        else:
+            if self._buf:
+                self._send(bytes(self._buf))
+            while self._pending:
+                self._collect(self._pending.pop(0))
+            resp = client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                                    MultipartUpload={"Parts": self.parts})
+            self._pool.shutdown()
+        self._buf = bytearray()
+        self.etag = resp.get("ETag", "").strip('"')
+        return self.etag
+
+    def abort(self):
+        """Drop the upload; parts already sent are discarded by S3."""
+        self._buf, pending, self._pending = bytearray(), self._pending, []
+        if self._pool is not None:
+            for _, future in pending:
+                future.cancel()
+            self._pool.shutdown(wait=True)
+        if self._upload_id is not None:
+            try:
+                _client().abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception:
+                pass  # a bucket lifecycle rule cleans up incomplete uploads
+            self._upload_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+def open_object(uri: str):
+    """Return the streaming body of `uri` (caller closes it)."""
+    bucket, key = parse_uri(uri)
+    return _client().get_object(Bucket=bucket, Key=key)["Body"]
+
+def iter_text(body, max_bytes: int = 0, stats: dict = None, encoding: str = "utf-8"):
+    """
+    Yield decoded text chunks of a streaming body, READ_CHUNK_BYTES at a time.
+
+    With `max_bytes`, stops after that many bytes. `stats` (if given)
+    receives "bytes" and "truncated".
+    """
+    stats = {} if stats is None else stats
+    stats.update(bytes=0, truncated=False)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    while True:
+        chunk = body.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        stats["bytes"] += len(chunk)
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+        if max_bytes and stats["bytes"] >= max_bytes:
+            stats["truncated"] = True
+            return
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+def iter_lines(body, max_bytes: int = 0, stats: dict = None, encoding: str = "utf-8"):
+    """
+    Yield the decoded lines of a streaming body without their line endings.
+
+    Lines longer than MAX_LINE_CHARS are split. With `max_bytes`, stops after
+    that many bytes and drops the trailing partial line. `stats` (if given)
+    receives "bytes" and "truncated".
+    """
+    stats = {} if stats is None else stats
+    pending = ""
+    for text in iter_text(body, max_bytes, stats, encoding):
+        lines = (pending + text).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+        while len(pending) > MAX_LINE_CHARS:
+            yield pending[:MAX_LINE_CHARS]
+            pending = pending[MAX_LINE_CHARS:]
+    if pending and not stats["truncated"]:
+        yield pending.rstrip("\r")
+
+def fetch_many(uris, fn, max_workers: int = 0):
+    """
+    Run fn(uri) for every uri on a bounded thread pool.
+
+    Returns [(result, None) | (None, exception)] in the order of `uris`; one
+    failing object never fails the others.
+    """
+    def safe(uri):
+        try:
+            return fn(uri), None
+        except Exception as e:
+            return None, e
+
+    workers = max(1, min(max_workers or FETCH_WORKERS, len(uris)))
+    if workers == 1:
+        return [safe(u) for u in uris]
+    # Imported here: concurrent.futures costs ~15 ms of init that single-document calls skip.
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3io") as pool:
+        return list(pool.map(safe, uris))
@@ -0,0 +1,726 @@
+"""
+DTDL / NGSI-LD validation behind validate-schema.
+
+`schemaUri` holds a DTDL model: one Interface or an array of Interfaces
+(DTDL v2 or v3). The model is compiled once per (schemaUri, ETag, profile)
+into a Validator: metamodel issues are collected during compilation and every
+Interface becomes a flat table of content checkers (`extends` resolved,
+schemas turned into type-check closures). Validators are kept in an LRU; a
+warm container revalidates the object with If-None-Match and reuses the
+compiled validator while it is unchanged.
+
+Profiles:
+  dtdl     DTDL metamodel rules; instances are Azure Digital Twins style
+           twins ({"$dtId", "$metadata": {"$model"}}) and relationships.
+  ngsi-ld  rules for exporting the model as NGSI-LD entity types (attribute
+           names, reserved terms, relationship targets); instances are
+           normalized NGSI-LD entities ({"id", "type", attr: {"type": ...}}).
+  both     all of the above; the instance form is detected per record.
+
+An optional `instanceUri` (NDJSON or a JSON array) is decoded record by
+record from the stream and checked against the compiled tables, stopping
+after VALIDATE_MAX_ISSUES issues or VALIDATE_MAX_BYTES.
+"""
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+try:
+    from . import s3io
+except ImportError:  # loaded as a top-level module
+    from common import s3io
+
+VALIDATE_CACHE_ENTRIES = int(os.getenv("VALIDATE_CACHE_ENTRIES", "64"))
+VALIDATE_MAX_ISSUES = int(os.getenv("VALIDATE_MAX_ISSUES", "200"))
+VALIDATE_MAX_BYTES = int(os.getenv("VALIDATE_MAX_BYTES", str(64 * 1024 * 1024)))
+VALIDATE_MAX_RECORD_BYTES = int(os.getenv("VALIDATE_MAX_RECORD_BYTES", str(1024 * 1024)))
+VALIDATE_MAX_TWINS = int(os.getenv("VALIDATE_MAX_TWINS", "100000"))
+
+PROFILES = ("dtdl", "ngsi-ld", "both")
+
+_SEGMENT = r"(?:_+[A-Za-z0-9]|[A-Za-z])(?:[A-Za-z0-9_]*[A-Za-z0-9])?"
+_DTMI = re.compile(rf"^dtmi:{_SEGMENT}(?::{_SEGMENT})*(?:;([1-9][0-9]{{0,8}})(\.[1-9][0-9]{{0,5}})?)?$")
+_NAME = re.compile(r"^[A-Za-z](?:[A-Za-z0-9_]*[A-Za-z0-9])?$")
+_URI = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*:\S+$")
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_TIME = re.compile(r"^\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:\d{2})?$")
+_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:\d{2})$")
+_DURATION = re.compile(r"^P(?!$)(?:\d+Y)?(?:\d+M)?(?:\d+W)?(?:\d+D)?(?:T(?=\d)(?:\d+H)?(?:\d+M)?(?:\d+(?:\.\d+)?S)?)?$")
+_UUID = re.compile(r"^[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}$")
+
+_CONTEXTS = {"dtmi:dtdl:context;2": 2, "dtmi:dtdl:context;3": 3}
+_CONTENT_TYPES = ("Property", "Telemetry", "Command", "Relationship", "Component")
+_NAME_LIMIT = {2: 64, 3: 512}
+_CONTENTS_LIMIT = 300  # DTDL v2; v3 limits the whole model instead
+_EXTENDS_LIMIT = {2: 2, 3: 12}
+_EXTENDS_DEPTH = 10
+# Members of a normalized NGSI-LD entity/attribute that a model name must not shadow.
+_NGSI_RESERVED = frozenset(("id", "type", "value", "object", "observedAt", "datasetId", "createdAt",
+                            "modifiedAt", "deletedAt", "unitCode", "scope", "instanceId", "languageMap"))
+_NGSI_GEO = frozenset(("location", "observationSpace", "operationSpace"))
+_NGSI_ATTRIBUTE_TYPES = ("Property", "Relationship", "GeoProperty", "LanguageProperty")
+_GEOJSON_TYPES = frozenset(("Point", "MultiPoint", "LineString", "MultiLineString", "Polygon",
+                            "MultiPolygon", "GeometryCollection"))
+
+def _is_int(x):
+    return isinstance(x, int) and not isinstance(x, bool)
+
+def _int_range(lo, hi):
+    return lambda x: _is_int(x) and lo <= x <= hi
+
+def _matches(pattern):
+    return lambda x: isinstance(x, str) and pattern.match(x) is not None
+
+_PRIMITIVES = {
+    "boolean": lambda x: isinstance(x, bool),
+    "date": _matches(_DATE),
+    "dateTime": _matches(_DATETIME),
+    "double": lambda x: isinstance(x, (int, float)) and not isinstance(x, bool),
+    "duration": _matches(_DURATION),
+    "float": lambda x: isinstance(x, (int, float)) and not isinstance(x, bool),
+    "integer": _int_range(-2 ** 31, 2 ** 31 - 1),
+    "long": _int_range(-2 ** 63, 2 ** 63 - 1),
+    "string": lambda x: isinstance(x, str),
+    "time": _matches(_TIME),
+}
+_PRIMITIVES_V3 = dict(_PRIMITIVES, **{
+    "byte": _int_range(-2 ** 7, 2 ** 7 - 1),
+    "bytes": lambda x: isinstance(x, str),  # base64 text in JSON
+    "decimal": lambda x: isinstance(x, str) or (isinstance(x, (int, float)) and not isinstance(x, bool)),
+    "short": _int_range(-2 ** 15, 2 ** 15 - 1),
+    "unsignedByte": _int_range(0, 2 ** 8 - 1),
+    "unsignedShort": _int_range(0, 2 ** 16 - 1),
+    "unsignedInteger": _int_range(0, 2 ** 32 - 1),
+    "unsignedLong": _int_range(0, 2 ** 64 - 1),
+    "uuid": _matches(_UUID),
+})
+
+def _types(node) -> list:
+    t = node.get("@type") if isinstance(node, dict) else None
+    return [t] if isinstance(t, str) else [x for x in t if isinstance(x, str)] if isinstance(t, list) else []
+
+def _short_name(dtmi: str) -> str:
+    """Interface DTMI -> NGSI-LD entity type: dtmi:com:example:Thermostat;1 -> Thermostat."""
+    return dtmi.split(";", 1)[0].rsplit(":", 1)[-1]
+
+def _term(name: str) -> str:
+    """Compact term of an expanded NGSI-LD attribute name (https://.../temperature -> temperature)."""
+    return re.split(r"[/#]", name)[-1] if "/" in name or "#" in name else name
+
+class Issues:
+    """Issue list capped at `limit`; further issues are only counted."""
+
+    __slots__ = ("items", "limit", "errors", "warnings")
+
+    def __init__(self, limit: int = VALIDATE_MAX_ISSUES):
+        self.items, self.limit, self.errors, self.warnings = [], limit, 0, 0
+
+    def add(self, severity: str, rule: str, path: str, message: str):
+        if severity == "error":
+            self.errors += 1
+        else:
+            self.warnings += 1
+        if len(self.items) < self.limit:
+            self.items.append({"severity": severity, "rule": rule, "path": path, "message": message})
+
+    @property
+    def full(self) -> bool:
+        return self.errors + self.warnings >= self.limit
+
+class _Content:
+    __slots__ = ("kind", "check", "writable", "target", "interface")
+
+    def __init__(self, kind, check=None, writable=False, target=None, interface=None):
+        self.kind, self.check, self.writable, self.target, self.interface = kind, check, writable, target, interface
+
+class Validator:
+    """A compiled model: schema issues plus per-Interface content tables."""
+
+    def __init__(self, profile: str, version: int):
+        self.profile, self.version = profile, version
+        self.issues = Issues()
+        self.contents = {}  # interface DTMI -> {name: _Content}
+        self.by_type = {}   # NGSI-LD entity type (short name or DTMI) -> interface DTMI
+
+    @property
+    def dtdl(self) -> bool:
+        return self.profile in ("dtdl", "both")
+
+    @property
+    def ngsi(self) -> bool:
+        return self.profile in ("ngsi-ld", "both")
+
+    # -- instances ---------------------------------------------------------
+
+    def check_record(self, record, where: str, out: Issues, twins: dict):
+        """Check one instance record; `twins` maps twin ids to models across records."""
+        if not isinstance(record, dict):
+            out.add("error", "instance.shape", where, "record is not a JSON object")
+        elif any(k in record for k in ("$dtId", "$metadata", "$sourceId", "$relationshipName")):
+            if not self.dtdl:
+                out.add("error", "instance.form", where, "digital twin record under the ngsi-ld profile")
+            elif "$relationshipName" in record or "$sourceId" in record:
+                self._check_relationship(record, where, out, twins)
+            else:
+                self._check_twin(record, where, out, twins)
+        elif "id" in record and "type" in record:
+            if not self.ngsi:
+                out.add("error", "instance.form", where, "NGSI-LD entity under the dtdl profile")
+            else:
+                self._check_entity(record, where, out)
+        else:
+            out.add("error", "instance.form", where,
+                    "neither a digital twin ($dtId, $metadata) nor an NGSI-LD entity (id, type)")
+
+    def _check_twin(self, twin, where, out, twins):
+        dt_id = twin.get("$dtId")
+        if not isinstance(dt_id, str) or not dt_id:
+            out.add("error", "twin.id", where, "$dtId must be a non-empty string")
+        model = (twin.get("$metadata") or {}).get("$model") if isinstance(twin.get("$metadata"), dict) else None
+        if not isinstance(model, str):
+            out.add("error", "twin.model", where, "$metadata.$model is missing")
+            return
+        if model not in self.contents:
+            out.add("error", "twin.model", where, f"model {model} is not defined in the schema")
+            return
+        if isinstance(dt_id, str) and len(twins) < VALIDATE_MAX_TWINS:
+            twins[dt_id] = model
+        self._check_twin_body(twin, model, f"{where}/{dt_id}" if isinstance(dt_id, str) else where, out)
+
+    def _check_twin_body(self, body, model, where, out):
+        table = self.contents[model]
+        for name, value in body.items():
+            if name.startswith("$"):
+                continue
+            content = table.get(name)
+            if content is None:
+                out.add("error", "twin.unknown", f"{where}.{name}", f"{name} is not a property or component of {model}")
+            elif content.kind == "Property":
+                problem = content.check(value) if content.check else None
+                if problem:
+                    out.add("error", "twin.type", f"{where}.{name}", problem)
+            elif content.kind == "Component":
+                if not isinstance(value, dict):
+                    out.add("error", "twin.type", f"{where}.{name}", "component value must be an object")
+                elif content.interface in self.contents:
+                    self._check_twin_body(value, content.interface, f"{where}.{name}", out)
+            else:
+                out.add("error", "twin.kind", f"{where}.{name}", f"{content.kind} {name} is not stored on a twin")
+
+    def _check_relationship(self, rel, where, out, twins):
+        source, name, target = rel.get("$sourceId"), rel.get("$relationshipName"), rel.get("$targetId")
+        for key, value in (("$sourceId", source), ("$relationshipName", name), ("$targetId", target)):
+            if not isinstance(value, str) or not value:
+                out.add("error", "relationship.shape", where, f"{key} must be a non-empty string")
+                return
+        model = twins.get(source)
+        if model is None:
+            return  # source twin not seen (yet): nothing to check against
+        content = self.contents[model].get(name)
+        if content is None or content.kind != "Relationship":
+            out.add("error", "relationship.unknown", where, f"{name} is not a relationship of {model}")
+        elif content.target and twins.get(target) not in (None, content.target):
+            out.add("error", "relationship.target", where,
+                    f"target {target} is a {twins[target]}, expected {content.target}")
+
+    def _check_entity(self, entity, where, out):
+        eid, etype = entity.get("id"), entity.get("type")
+        if not isinstance(eid, str) or not _URI.match(eid):
+            out.add("error", "entity.id", where, "id must be an absolute URI (e.g. urn:ngsi-ld:Type:1)")
+        else:
+            where = f"{where}/{eid}"
+        if not isinstance(etype, str):
+            out.add("error", "entity.type", where, "type must be a string")
+            return
+        model = self.by_type.get(etype) or self.by_type.get(_term(etype))
+        if model is None:
+            out.add("error", "entity.type", where, f"type {etype} does not match an Interface in the schema")
+            return
+        table = self.contents[model]
+        for name, attr in entity.items():
+            if name in ("id", "type", "@context", "scope", "createdAt", "modifiedAt"):
+                continue
+            path = f"{where}.{name}"
+            for instance in attr if isinstance(attr, list) else [attr]:  # multi-attribute (datasetId)
+                self._check_attribute(_term(name), instance, table.get(_term(name)), path, out)
+
+    def _check_attribute(self, name, attr, content, path, out):
+        if not isinstance(attr, dict):
+            out.add("error", "attribute.shape", path, "attribute must be an object with a type (normalized form)")
+            return
+        kind = attr.get("type")
+        if kind not in _NGSI_ATTRIBUTE_TYPES:
+            out.add("error", "attribute.type", path, f"type must be one of {', '.join(_NGSI_ATTRIBUTE_TYPES)}")
+            return
+        if "observedAt" in attr and not _PRIMITIVES["dateTime"](attr["observedAt"]):
+            out.add("error", "attribute.observedAt", path, "observedAt must be an ISO 8601 dateTime with zone")
+        if kind == "Relationship":
+            if not isinstance(attr.get("object"), str) or not _URI.match(attr["object"]):
+                out.add("error", "attribute.object", path, "Relationship object must be a URI")
+        elif "value" not in attr and not (kind == "LanguageProperty" and "languageMap" in attr):
+            out.add("error", "attribute.value", path, f"{kind} has no value")
+        elif kind == "GeoProperty":
+            value = attr.get("value")
+            if not isinstance(value, dict) or value.get("type") not in _GEOJSON_TYPES:
+                out.add("error", "attribute.geojson", path, "GeoProperty value must be a GeoJSON geometry")
+        if content is None:
+            if name not in _NGSI_GEO:
+                out.add("error", "attribute.unknown", path, f"{name} is not part of the entity type")
+            return
+        expected = "Relationship" if content.kind == "Relationship" else "Property"
+        if kind == "GeoProperty" or kind == "LanguageProperty":
+            kind = "Property"
+        if kind != expected:
+            out.add("error", "attribute.kind", path, f"{name} is a {content.kind}, expected a {expected}")
+        elif content.kind == "Component" and not isinstance(attr.get("value"), dict):
+            out.add("error", "attribute.value", path, f"component {name} must hold an object value")
+        elif content.check and "value" in attr:
+            problem = content.check(attr["value"])
+            if problem:
+                out.add("error", "attribute.value", path, problem)
+
+class _Compiler:
+    """Turns a parsed DTDL document into a Validator."""
+
+    def __init__(self, doc, profile: str):
+        self.doc = doc
+        items = doc if isinstance(doc, list) else [doc]
+        self.version = next((v for item in items for v in [self._context(item)] if v), 2)
+        self.v = Validator(profile, self.version)
+        self.issue = self.v.issues.add
+        self.primitives = _PRIMITIVES_V3 if self.version >= 3 else _PRIMITIVES
+        self.interfaces = {}  # DTMI -> Interface node
+        self.schemas = {}     # DTMI -> complex schema node
+        self.checkers = {}    # schema DTMI -> compiled checker
+        self.items = items
+
+    @staticmethod
+    def _context(node):
+        ctx = node.get("@context") if isinstance(node, dict) else None
+        ctx = ctx[0] if isinstance(ctx, list) and ctx else ctx
+        return _CONTEXTS.get(ctx) if isinstance(ctx, str) else None
+
+    def compile(self) -> Validator:
+        if not self.items:
+            self.issue("error", "dtdl.document", "$", "the schema document contains no Interface")
+        for n, item in enumerate(self.items):
+            where = f"$[{n}]" if isinstance(self.doc, list) else "$"
+            if "Interface" not in _types(item):
+                self.issue("error", "dtdl.type", where, "top-level element must be an Interface")
+                continue
+            if self._context(item) is None:
+                self.issue("error", "dtdl.context", where, "@context must be dtmi:dtdl:context;2 or ;3")
+            dtmi = self._dtmi(item, where, required=True, top=True)
+            if dtmi:
+                if dtmi in self.interfaces:
+                    self.issue("error", "dtdl.duplicate", where, f"{dtmi} is defined twice")
+                self.interfaces[dtmi] = item
+                for s in item.get("schemas") or ():
+                    sid = self._dtmi(s, f"{dtmi}/schemas", required=True)
+                    if sid:
+                        self.schemas[sid] = s
+        for dtmi in list(self.interfaces):
+            self._flatten(dtmi, [])
+        self._index_types()
+        return self.v
+
+    def _dtmi(self, node, where, required=False, top=False):
+        dtmi = node.get("@id") if isinstance(node, dict) else None
+        if dtmi is None:
+            if required:
+                self.issue("error", "dtdl.id", where, "@id is required")
+            return None
+        match = _DTMI.match(dtmi) if isinstance(dtmi, str) and len(dtmi) <= 2048 else None
+        if not match:
+            self.issue("error", "dtdl.id", where, f"{dtmi!r} is not a valid DTMI")
+            return None
+        if top and not match.group(1):
+            self.issue("error", "dtdl.version", where, f"{dtmi} has no version (;1)")
+        if match.group(2) and self.version < 3:
+            self.issue("error", "dtdl.version", where, f"{dtmi}: minor versions need DTDL v3")
+        return dtmi
+
+    def _flatten(self, dtmi, chain) -> dict:
+        """Content table of `dtmi` including everything it extends."""
+        if dtmi in self.v.contents:
+            return self.v.contents[dtmi]
+        node, where, table = self.interfaces[dtmi], dtmi, {}
+        parents = node.get("extends") or []
+        parents = [parents] if isinstance(parents, (str, dict)) else parents
+        if len(parents) > _EXTENDS_LIMIT[self.version]:
+            self.issue("error", "dtdl.extends", where, f"extends lists more than {_EXTENDS_LIMIT[self.version]} Interfaces")
+        for parent in parents:
+            pid = parent.get("@id") if isinstance(parent, dict) else parent
+            if isinstance(parent, dict) and pid and pid not in self.interfaces:
+                self.interfaces[pid] = parent  # inline Interface
+            if pid in chain or pid == dtmi:
+                self.issue("error", "dtdl.extends", where, f"extends cycle through {pid}")
+            elif len(chain) >= _EXTENDS_DEPTH:
+                self.issue("error", "dtdl.extends", where, f"extends deeper than {_EXTENDS_DEPTH} levels")
+            elif pid not in self.interfaces:
+                self.issue("warning", "dtdl.extends", where, f"{pid} is not defined in this document; "
+                                                              "its contents are not checked")
+            else:
+                table.update(self._flatten(pid, chain + [dtmi]))
+        contents = node.get("contents") or []
+        if not isinstance(contents, list):
+            self.issue("error", "dtdl.contents", where, "contents must be an array")
+            contents = []
+        if self.version < 3 and len(contents) > _CONTENTS_LIMIT:
+            self.issue("error", "dtdl.contents", where, f"more than {_CONTENTS_LIMIT} contents")
+        own = set()
+        for content in contents:
+            compiled = self._content(content, where)
+            if compiled is None:
+                continue
+            name, entry = compiled
+            if name in own or name in table:
+                self.issue("error", "dtdl.name", f"{where}/{name}", f"{name} is defined more than once"
+                           + ("" if name in own else " (also inherited)"))
+            own.add(name)
+            table[name] = entry
+        self.v.contents[dtmi] = table
+        return table
+
+    def _content(self, node, iface):
+        kinds = [t for t in _types(node) if t in _CONTENT_TYPES]
+        name = node.get("name") if isinstance(node, dict) else None
+        where = f"{iface}/{name if isinstance(name, str) else '?'}"
+        if len(kinds) != 1:
+            self.issue("error", "dtdl.content", where, f"@type must include exactly one of {', '.join(_CONTENT_TYPES)}")
+            return None
+        kind = kinds[0]
+        if len(_types(node)) > 1 and kind not in ("Property", "Telemetry"):
+            self.issue("error", "dtdl.semantic", where, "semantic types only apply to Property and Telemetry")
+        if not self._name(name, where):
+            return None
+        if self.v.ngsi:
+            self._ngsi_rules(kind, name, node, where)
+        if kind in ("Property", "Telemetry"):
+            if "writable" in node and not isinstance(node["writable"], bool):
+                self.issue("error", "dtdl.writable", where, "writable must be a boolean")
+            if kind == "Telemetry" and "writable" in node:
+                self.issue("error", "dtdl.writable", where, "Telemetry cannot be writable")
+            return name, _Content(kind, self._schema(node.get("schema"), where), node.get("writable") is True)
+        if kind == "Relationship":
+            target = node.get("target")
+            if target is not None and not (isinstance(target, str) and _DTMI.match(target)):
+                self.issue("error", "dtdl.target", where, f"target {target!r} is not a DTMI")
+                target = None
+            max_m, min_m = node.get("maxMultiplicity"), node.get("minMultiplicity")
+            if max_m is not None and not (_is_int(max_m) and max_m >= 1):
+                self.issue("error", "dtdl.multiplicity", where, "maxMultiplicity must be an integer >= 1")
+            if min_m is not None and min_m != 0 and self.version < 3:
+                self.issue("error", "dtdl.multiplicity", where, "minMultiplicity must be 0 in DTDL v2")
+            for prop in node.get("properties") or ():
+                if "Property" not in _types(prop):
+                    self.issue("error", "dtdl.content", where, "relationship properties must be Properties")
+                elif self._name(prop.get("name"), f"{where}/{prop.get('name')}"):
+                    self._schema(prop.get("schema"), f"{where}/{prop['name']}")
+            return name, _Content(kind, target=target)
+        if kind == "Component":
+            schema = node.get("schema")
+            if isinstance(schema, dict) and "Interface" in _types(schema):
+                sid = schema.get("@id")
+                if sid and sid not in self.interfaces:
+                    self.interfaces[sid] = schema
+                    self._flatten(sid, [])
+                schema = sid
+            if not (isinstance(schema, str) and _DTMI.match(schema)):
+                self.issue("error", "dtdl.component", where, "Component schema must be an Interface DTMI")
+                return None
+            if schema not in self.interfaces:
+                self.issue("warning", "dtdl.component", where, f"{schema} is not defined in this document")
+            return name, _Content(kind, interface=schema)
+        for part in ("request", "response"):  # Command
+            payload = node.get(part)
+            if payload is not None:
+                if self._name(payload.get("name") if isinstance(payload, dict) else None, f"{where}/{part}"):
+                    self._schema(payload.get("schema"), f"{where}/{part}")
+        return name, _Content(kind)
+
+    def _name(self, name, where) -> bool:
+        if not isinstance(name, str) or not _NAME.match(name):
+            self.issue("error", "dtdl.name", where, f"name {name!r} must start with a letter and contain "
+                                                    "only letters, digits and underscores")
+            return False
+        if len(name) > _NAME_LIMIT[self.version]:
+            self.issue("error", "dtdl.name", where, f"name longer than {_NAME_LIMIT[self.version]} characters")
+            return False
+        return True
+
+    def _ngsi_rules(self, kind, name, node, where):
+        if name in _NGSI_RESERVED:
+            self.issue("error", "ngsi-ld.reserved", where, f"{name} clashes with an NGSI-LD core member")
+        elif name in _NGSI_GEO:
+            self.issue("warning", "ngsi-ld.geo", where, f"{name} is exported as a GeoProperty and must hold GeoJSON")
+        if kind == "Command":
+            self.issue("warning", "ngsi-ld.command", where, "Commands have no NGSI-LD equivalent and are not exported")
+        elif kind == "Relationship" and not node.get("target"):
+            self.issue("warning", "ngsi-ld.target", where, "Relationship without target: the object entity type "
+                                                           "cannot be checked")
+
+    def _schema(self, schema, where):
+        """Compile a DTDL schema into checker(value) -> problem or None."""
+        if isinstance(schema, str):
+            if schema in self.primitives:
+                test = self.primitives[schema]
+                return lambda x: None if test(x) else f"expected {schema}, got {type(x).__name__}"
+            if _DTMI.match(schema):
+                return self._reference(schema, where)
+            self.issue("error", "dtdl.schema", where, f"unknown schema {schema!r}")
+            return None
+        if not isinstance(schema, dict):
+            self.issue("error", "dtdl.schema", where, "schema is missing")
+            return None
+        kinds = [t for t in _types(schema) if t in ("Object", "Array", "Enum", "Map")]
+        if len(kinds) != 1:
+            self.issue("error", "dtdl.schema", where, "complex schema @type must be Object, Array, Enum or Map")
+            return None
+        kind = kinds[0]
+        if kind == "Array":
+            element = self._schema(schema.get("elementSchema"), f"{where}[]")
+            return lambda x: ("expected array" if not isinstance(x, list) else
+                              next((f"[{i}]: {p}" for i, p in ((i, element(e)) for i, e in enumerate(x)) if p), None)
+                              if element else None)
+        if kind == "Map":
+            key, value = schema.get("mapKey") or {}, schema.get("mapValue") or {}
+            if key.get("schema") != "string":
+                self.issue("error", "dtdl.schema", where, "mapKey schema must be string")
+            self._name(key.get("name"), f"{where}/mapKey")
+            self._name(value.get("name"), f"{where}/mapValue")
+            element = self._schema(value.get("schema"), f"{where}/mapValue")
+            return lambda x: ("expected map object" if not isinstance(x, dict) else
+                              next((f"{k}: {p}" for k, p in ((k, element(v)) for k, v in x.items()) if p), None)
+                              if element else None)
+        if kind == "Enum":
+            value_schema = schema.get("valueSchema")
+            if value_schema not in ("integer", "string"):
+                self.issue("error", "dtdl.schema", where, "Enum valueSchema must be integer or string")
+            values = set()
+            for ev in schema.get("enumValues") or ():
+                if self._name(ev.get("name") if isinstance(ev, dict) else None, f"{where}/enumValues"):
+                    raw = ev.get("enumValue")
+                    if (value_schema == "integer" and not _is_int(raw)) or \
+                            (value_schema == "string" and not isinstance(raw, str)):
+                        self.issue("error", "dtdl.schema", f"{where}/{ev['name']}", f"enumValue must be {value_schema}")
+                    if not isinstance(raw, (str, int, float)):
+                        continue  # lists and objects cannot be compared against (or hashed)
+                    if raw in values:
+                        self.issue("error", "dtdl.schema", f"{where}/{ev['name']}", f"duplicate enumValue {raw!r}")
+                    values.add(raw)
+            if not values:
+                self.issue("error", "dtdl.schema", where, "Enum has no enumValues")
+            shown = ", ".join(map(repr, sorted(values, key=str)[:5]))
+            return lambda x: None if isinstance(x, (str, int, float)) and not isinstance(x, bool) and x in values \
+                else f"{x!r} is not one of {shown}"
+        fields, seen = {}, set()
+        for field in schema.get("fields") or ():
+            name = field.get("name") if isinstance(field, dict) else None
+            if self._name(name, f"{where}/fields"):
+                if name in seen:
+                    self.issue("error", "dtdl.name", f"{where}.{name}", f"field {name} is defined twice")
+                seen.add(name)
+                fields[name] = self._schema(field.get("schema"), f"{where}.{name}")
+
+        def check_object(x):
+            if not isinstance(x, dict):
+                return "expected object"
+            for k, v in x.items():
+                if k not in fields:
+                    return f"{k}: not a field of this object"
+                problem = fields[k] and fields[k](v)
+                if problem:
+                    return f"{k}: {problem}"
+            return None
+        return check_object
+
+    def _reference(self, dtmi, where):
+        if dtmi in self.checkers:
+            return self.checkers[dtmi]
+        node = self.schemas.get(dtmi)
+        if node is None:
+            self.issue("error", "dtdl.schema", where, f"schema {dtmi} is not defined in this document")
+            return None
+        box = []  # recursive schemas resolve through the box once compiled
+        self.checkers[dtmi] = lambda x: box[0](x) if box and box[0] else None
+        box.append(self._schema(node, dtmi))
+        return self.checkers[dtmi]
+
+    def _index_types(self):
+        for dtmi in self.interfaces:
+            short = _short_name(dtmi)
+            if short in self.v.by_type and self.v.by_type[short] != dtmi and self.v.ngsi:
+                self.issue("warning", "ngsi-ld.type", dtmi, f"entity type {short} is shared with "
+                                                            f"{self.v.by_type[short]}; use the full DTMI as type")
+            self.v.by_type.setdefault(short, dtmi)
+            self.v.by_type[dtmi] = dtmi
+
+def compile_model(doc, profile: str) -> Validator:
+    """Compile a parsed DTDL document for `profile`."""
+    return _Compiler(doc, profile).compile()
+
+class _ValidatorCache:
+    """Bounded LRU of compiled validators keyed by (schemaUri, ETag, profile)."""
+
+    def __init__(self, size=VALIDATE_CACHE_ENTRIES):
+        self.size = size
+        self._entries = OrderedDict()
+        self._etags = OrderedDict()  # schemaUri -> last seen ETag, sent as If-None-Match (same LRU bound)
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+            return hit
+
+    def etag(self, uri):
+        with self._lock:
+            etag = self._etags.get(uri)
+            if etag is not None:
+                self._etags.move_to_end(uri)
+            return etag
+
+    def count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key, validator):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._etags[key[0]] = key[1]
+            self._etags.move_to_end(key[0])
+            while len(self._etags) > self.size:
+                self._etags.popitem(last=False)
+            self._entries[key] = validator
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._etags.clear()
+
+_CACHE = _ValidatorCache()
+
+def load_validator(schema_uri: str, profile: str):
+    """
+    Return (validator, cache state) where state is "hit" (304 on the last
+    ETag) or "miss" (fetched and compiled). Read errors propagate; a body
+    that is not JSON yields a validator holding just that issue.
+    """
+    etag = _CACHE.etag(schema_uri)
+    cached = _CACHE.get((schema_uri, etag, profile)) if etag else None
+    try:
+        doc, etag = s3io.get_json(schema_uri, if_none_match=etag if cached else None)
+    except ValueError as e:
+        validator = Validator(profile, 2)
+        validator.issues.add("error", "schema.json", "$", f"schema is not valid JSON: {e}")
+        return validator, "miss"
+    if doc is None:
+        _CACHE.count(hit=True)
+        return cached, "hit"
+    _CACHE.count(hit=False)
+    validator = compile_model(doc, profile)
+    _CACHE.put((schema_uri, etag, profile), validator)
+    return validator, "miss"
+
+def iter_records(chunks, max_record_chars: int = VALIDATE_MAX_RECORD_BYTES):
+    """
+    Yield records from text chunks holding NDJSON or a JSON array, one at a
+    time: a record is decoded as soon as it is complete. A record that
+    cannot be decoded is yielded as its JSONDecodeError and the stream
+    resumes at the next line.
+    """
+    decoder, chunks = json.JSONDecoder(), iter(chunks)
+    buf, pos, eof = "", 0, False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,[]":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                return
+            more = next(chunks, None)
+            if more is None:
+                eof = True
+            else:
+                buf, pos = buf[pos:] + more, 0
+            continue
+        try:
+            record, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if not eof and len(buf) - pos < max_record_chars:
+                more = next(chunks, None)  # most likely an incomplete record
+                if more is None:
+                    eof = True
+                else:
+                    buf, pos = buf[pos:] + more, 0
+                continue
+            yield e
+            end = buf.find("\n", e.pos + 1)
+            if end < 0:
+                buf, pos = "", 0
+                continue
+        else:
+            yield record
+        pos = end
+        if pos > 65536:
+            buf, pos = buf[pos:], 0
+
+def validate(schema_uri: str, profile: str = "both", instance_uri: str = None) -> dict:
+    """
+    Validate the model at `schema_uri` (and the records at `instance_uri`).
+
+    Returns {"profileEvaluated", "issues", "summary", "stats"}; raises
+    LookupError when either object cannot be read.
+    """
+    try:
+        validator, cache = load_validator(schema_uri, profile)
+    except Exception as e:
+        raise LookupError(f"{schema_uri}: {s3io.describe_error(e)}") from e
+    out = Issues()  # starts from the cached schema issues
+    out.items = list(validator.issues.items)
+    out.errors, out.warnings = validator.issues.errors, validator.issues.warnings
+    stats = {"interfaces": len(validator.contents), "cache": cache, "records": 0, "bytes": 0, "truncated": False}
+    if instance_uri and not out.full:
+        try:
+            body = s3io.open_object(instance_uri)
+        except Exception as e:
+            raise LookupError(f"{instance_uri}: {s3io.describe_error(e)}") from e
+        read, twins = {}, {}
+        try:
+            for record in iter_records(s3io.iter_text(body, max_bytes=VALIDATE_MAX_BYTES, stats=read)):
+                where = f"record {stats['records']}"
+                stats["records"] += 1
+                if isinstance(record, json.JSONDecodeError):
+                    out.add("error", "instance.json", where, f"invalid JSON: {record.msg}")
+                else:
+                    validator.check_record(record, where, out, twins)
+                if out.full:
+                    stats["truncated"] = True
+                    break
+        finally:
+            body.close()
+        stats["bytes"] = read.get("bytes", 0)
+        stats["truncated"] = stats["truncated"] or read.get("truncated", False)
+    stats.update(errors=out.errors, warnings=out.warnings)
+    if out.full:
+        stats["truncated"] = True
+    checked = f" in {stats['records']:,} record(s)" if instance_uri else ""
+    if out.errors or out.warnings:
+        summary = f"{out.errors} error(s), {out.warnings} warning(s){checked}"
+        if stats["truncated"]:
+            summary += f"; stopped after {out.limit} issues" if out.full else "; instance document truncated"
+        summary += "."
+    else:
+        summary = f"No issues found{checked} ({len(validator.contents)} Interface(s), DTDL v{validator.version})."
+    return {"profileEvaluated": profile, "issues": out.items, "summary": summary, "stats": stats}
@@ -0,0 +1,238 @@
+"""
+Streaming extractive summarizer behind summarize-docs.
+
+Each document is streamed line by line (common.s3io) and cut into sentences
+on the fly. Per document only SUMMARY_MAX_SENTENCES candidate sentences and
+SUMMARY_MAX_TERMS distinct terms are kept and at most SUMMARY_MAX_BYTES are
+read, so memory stays bounded whatever the object sizes. Sentences are ranked
+by TF-IDF (sentences are the IDF corpus) with a small lead-position bonus;
+the section a sentence sits under, or failing that an imperative opening or
+its cue words, routes it to Highlights, Risks or Next Steps.
+"""
+import math
+import os
+import re
+from collections import Counter
+try:
+    from . import s3io
+except ImportError:  # loaded as a top-level module
+    from common import s3io
+
+SUMMARY_MAX_BYTES = int(os.getenv("SUMMARY_MAX_BYTES", str(8 * 1024 * 1024)))
+SUMMARY_MAX_SENTENCES = int(os.getenv("SUMMARY_MAX_SENTENCES", "500"))
+SUMMARY_MAX_TERMS = int(os.getenv("SUMMARY_MAX_TERMS", "20000"))
+SUMMARY_BULLETS = int(os.getenv("SUMMARY_BULLETS", "5"))
+SUMMARY_MAX_DOCUMENTS = int(os.getenv("SUMMARY_MAX_DOCUMENTS", "50"))
+
+_SENTENCE_CHARS = 300     # candidate text kept per sentence
+_PARAGRAPH_CHARS = 4000   # a paragraph buffer is flushed at this size
+_LEAD_SENTENCES = 3       # opening sentences of a document get a bonus
+_LEAD_BONUS = 0.25
+_DUPLICATE_JACCARD = 0.6
+
+_STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its itself just me more most my no nor not now of off on once only or other our
+ours out over own same she should so some such than that the their theirs them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with would you
+your yours via per etc e.g i.e within across using use used new one two three may might
+""".split())
+
+_WORD = re.compile(r"[a-z][a-z0-9_'-]{2,}")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(?:\[[ xX]\]\s+)?(.*)$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_INLINE = re.compile(r"[*_`>]+|<[^>]+>")
+
+_RISK_CUES = re.compile(
+    r"\b(risks?|issues?|concerns?|vulnerab\w*|fail\w*|outages?|delay\w*|block\w*|breach\w*|threats?|gaps?"
+    r"|deprecat\w*|incidents?|exposure|non-?complian\w*|regress\w*|bottlenecks?|limitations?|unresolved)\b", re.I)
+_ACTION_CUES = re.compile(
+    r"\b(next steps?|todo|to-do|recommend\w*|action items?|follow[- ]up|schedul\w*|should|must|need to|will"
+    r"|plan(?:ned|s)? to|implement|migrate|roll ?out|adopt|investigate|upgrade|deadline|by (?:q[1-4]|end of))\b", re.I)
+_IMPERATIVE = re.compile(
+    r"^(add|adopt|automate|build|configure|create|define|deploy|document|enable|enforce|ensure|introduce|move"
+    r"|publish|remove|replace|require|restrict|review|rotate|run|schedule|scope|set|store|tag|track|update|use)\b", re.I)
+_RISK_SECTION = re.compile(r"\b(risks?|issues?|concerns?|threats?|limitations?|known problems?)\b", re.I)
+_ACTION_SECTION = re.compile(r"\b(next steps?|actions?|roadmap|recommendations?|todo|plan|follow[- ]ups?)\b", re.I)
+_LEAD_SECTION = re.compile(r"\b(summary|overview|highlights?|abstract|introduction|tl;?dr)\b", re.I)
+
+SECTIONS = (("highlight", "Highlights"), ("risk", "Risks"), ("next", "Next Steps"))
+
+def tokenize(text: str) -> list:
+    """Lower-cased content words of `text` (stopwords and words under three letters dropped)."""
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+def strip_markup(text: str) -> str:
+    """Plain text of one line or paragraph of Markdown (links keep their text)."""
+    text = _LINK.sub(r"\1", _IMAGE.sub("", text))
+    return " ".join(_INLINE.sub("", text).split())
+
+class DocDigest:
+    """Bounded statistics for one streamed document."""
+
+    __slots__ = ("uri", "title", "sentences", "tf", "df", "n_sentences", "bytes", "truncated")
+
+    def __init__(self, uri: str):
+        self.uri, self.title = uri, None
+        self.sentences = []  # (position, text, terms, section hint)
+        self.tf, self.df = Counter(), Counter()
+        self.n_sentences, self.bytes, self.truncated = 0, 0, False
+
+    def _count(self, terms, distinct):
+        if len(self.tf) < SUMMARY_MAX_TERMS:
+            self.tf.update(terms)
+            self.df.update(distinct)
+            return
+        # Vocabulary full: known terms keep counting, new ones are ignored.
+        tf, df = self.tf, self.df
+        for t in terms:
+            if t in tf:
+                tf[t] += 1
+        for t in distinct:
+            if t in df:
+                df[t] += 1
+
+    def add_paragraph(self, text: str, hint):
+        for sentence in _SENTENCE_END.split(text):
+            terms = tokenize(sentence)
+            if len(terms) < 3:
+                continue
+            distinct = frozenset(terms)
+            self._count(terms, distinct)
+            if len(self.sentences) < SUMMARY_MAX_SENTENCES:
+                if len(sentence) > _SENTENCE_CHARS:
+                    sentence = sentence[:_SENTENCE_CHARS].rsplit(" ", 1)[0] + "…"
+                self.sentences.append((self.n_sentences, sentence, distinct, hint))
+            self.n_sentences += 1
+
+def digest(uri: str) -> DocDigest:
+    """Stream `uri` from S3 into a DocDigest."""
+    doc, stats = DocDigest(uri), {}
+    body = s3io.open_object(uri)
+    try:
+        digest_lines(doc, s3io.iter_lines(body, max_bytes=SUMMARY_MAX_BYTES, stats=stats))
+    finally:
+        body.close()
+    doc.bytes, doc.truncated = stats["bytes"], stats["truncated"]
+    return doc
+
+def digest_lines(doc: DocDigest, lines) -> DocDigest:
+    """Feed Markdown/plain-text lines into `doc`, skipping code blocks, tables and markup."""
+    paragraph, size, hint, in_fence = [], 0, None, False
+
+    def flush():
+        nonlocal paragraph, size
+        if paragraph:
+            doc.add_paragraph(strip_markup(" ".join(paragraph)), hint)
+        paragraph, size = [], 0
+
+    for line in lines:
+        if _FENCE.match(line):
+            flush()
+            in_fence = not in_fence
+            continue
+        if in_fence or line.lstrip().startswith(("|", "<!--")) or line.strip() in ("---", "***", "___"):
+            continue
+        heading = _HEADING.match(line)
+        if heading:
+            flush()
+            title = strip_markup(heading.group(2))
+            doc.title = doc.title or title
+            hint = ("risk" if _RISK_SECTION.search(title) else
+                    "next" if _ACTION_SECTION.search(title) else
+                    "lead" if _LEAD_SECTION.search(title) else None)
+            continue
+        if not line.strip():
+            flush()
+            continue
+        item = _LIST_ITEM.match(line)
+        if item:
+            flush()  # every list item is its own unit
+            line = item.group(1)
+        text = line.strip()
+        if text:
+            paragraph.append(text)
+            size += len(text)
+            if size >= _PARAGRAPH_CHARS:
+                flush()
+    flush()
+    return doc
+
+def _similar(a: frozenset, b: frozenset) -> bool:
+    return len(a & b) >= _DUPLICATE_JACCARD * len(a | b)
+
+def rank(docs: list, bullets: int = SUMMARY_BULLETS) -> dict:
+    """Pick up to `bullets` sentences per section: {"highlight"|"risk"|"next": [(doc index, text)]}."""
+    n = sum(d.n_sentences for d in docs) or 1
+    tf, df = Counter(), Counter()
+    for d in docs:
+        tf.update(d.tf)
+        df.update(d.df)
+    weight = {t: math.log1p(c) * (math.log((1 + n) / (1 + df[t])) + 1) for t, c in tf.items()}
+
+    scored = []
+    for i, d in enumerate(docs):
+        for pos, text, terms, hint in d.sentences:
+            score = sum(weight.get(t, 0.0) for t in terms) / math.sqrt(len(terms))
+            if pos < _LEAD_SENTENCES or hint == "lead":
+                score *= 1 + _LEAD_BONUS
+            if hint in ("risk", "next"):
+                section = hint
+            elif _IMPERATIVE.match(text):
+                section = "next"
+            elif _RISK_CUES.search(text):
+                section = "risk"
+            elif _ACTION_CUES.search(text):
+                section = "next"
+            else:
+                section = "highlight"
+            scored.append((score, i, pos, text, terms, section))
+    scored.sort(key=lambda s: (-s[0], s[1], s[2]))
+
+    picked = {key: [] for key, _ in SECTIONS}
+    seen = []
+    for _, i, _, text, terms, section in scored:
+        if len(picked[section]) >= bullets or any(_similar(terms, t) for t in seen):
+            continue
+        picked[section].append((i, text))
+        seen.append(terms)
+        if all(len(v) >= bullets for v in picked.values()):
+            break
+    return picked
+
+def summarize(uris: list, audience: str = "general", bullets: int = SUMMARY_BULLETS,
+              max_workers: int = 0) -> dict:
+    """
+    Fetch `uris` concurrently, rank their sentences and render the Markdown summary.
+
+    Returns {"summaryMarkdown", "sources": [{uri, title?, bytes, sentences, truncated} | {uri, error}]}.
+    """
+    results = s3io.fetch_many(uris, digest, max_workers)
+    docs, sources, ref = [], [], {}
+    for uri, (doc, error) in zip(uris, results):
+        if error is not None:
+            sources.append({"uri": uri, "error": s3io.describe_error(error)})
+            continue
+        ref[len(docs)] = len(sources) + 1
+        docs.append(doc)
+        sources.append({"uri": uri, "title": doc.title, "bytes": doc.bytes,
+                        "sentences": doc.n_sentences, "truncated": doc.truncated})
+
+    picked = rank(docs, bullets)
+    md = ["# Executive Summary", f"**Audience:** {audience}"]
+    for key, heading in SECTIONS:
+        md.append(f"## {heading}")
+        md += [f"- {text} [{ref[i]}]" for i, text in picked[key]] or ["- None identified in the source documents."]
+    md += ["", "### Sources"]
+    for n, src in enumerate(sources, 1):
+        if "error" in src:
+            md.append(f"{n}. {src['uri']} (unavailable: {src['error']})")
+        else:
+            note = " (truncated)" if src["truncated"] else ""
+            md.append(f"{n}. {src['uri']}" + (f" — {src['title']}" if src["title"] else "") + note)
+    return {"summaryMarkdown": "\n".join(md), "sources": sources}
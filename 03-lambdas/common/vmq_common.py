@@ -1,59 +1,498 @@
-import json, os, time, logging, urllib.request
+import json, os, sys, time, atexit, signal, logging, socket, threading, contextlib, functools, http.client, urllib.parse
+from collections import OrderedDict, deque
 try:
-    import boto3
-    CW = boto3.client("cloudwatch")
-except Exception:
-    CW = None
+    from . import aws_clients, idempotency, results as result_sink
+except ImportError:
+    import aws_clients, idempotency, results as result_sink
+
+# Override hook for tests/benchmarks; otherwise the CloudWatch client is built on first flush.
+CW = None
+
+def _cw():
+    return CW or aws_clients.client("cloudwatch")
 
 LOG = logging.getLogger()
 if not LOG.handlers:
     logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 LOG.setLevel(os.getenv("LOG_LEVEL", "INFO"))
 
+METRICS_NAMESPACE = "VaultMesh/QBusinessActions"
+# emf = Embedded Metric Format log lines (no API call); api = synchronous put_metric_data.
+METRICS_MODE = os.getenv("METRICS_MODE", "emf").lower()
+# api mode aggregates into statistic sets and flushes when either threshold is crossed.
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "60"))
+METRICS_FLUSH_KEYS = int(os.getenv("METRICS_FLUSH_KEYS", "200"))
+METRICS_MAX_KEYS = int(os.getenv("METRICS_MAX_KEYS", "1000"))
+METRICS_BATCH_SIZE = int(os.getenv("METRICS_BATCH_SIZE", "1000"))  # PutMetricData per-request limit
+METRICS_FLUSH_THREAD = os.getenv("METRICS_FLUSH_THREAD", "0") == "1"
+# Statistics are only held across invocations where shutdown runs a flush: atexit outside Lambda, or
+# SIGTERM, which Lambda sends only to functions with a registered extension (then set this to 1).
+# Otherwise a frozen sandbox is reaped with no hook, so each invocation flushes before it returns.
+METRICS_SHUTDOWN_SIGNAL = os.getenv("METRICS_SHUTDOWN_SIGNAL", "0") == "1"
+_HOLD_METRICS = METRICS_SHUTDOWN_SIGNAL or not os.getenv("AWS_LAMBDA_RUNTIME_API")
+
+# Per-phase timings (authz/validate/work/emit) on action_ok/action_err; PHASE_METRICS also publishes them.
+PHASE_TIMING = os.getenv("PHASE_TIMING", "1") == "1"
+PHASE_METRICS = os.getenv("PHASE_METRICS", "0") == "1"
+# Clock behind the phase timers; an override hook so bench.py can check the sums exactly.
+PHASE_CLOCK = time.perf_counter
+
+# Largest events: [...] envelope accepted (EMF allows 100 values per metric array).
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
 OPA_URL = os.getenv("OPA_URL")
+OPA_TIMEOUT = float(os.getenv("OPA_TIMEOUT", "2.5"))
+OPA_POOL_SIZE = int(os.getenv("OPA_POOL_SIZE", "4"))
+# Time kept back from the Lambda deadline for the action itself once authz is done.
+AUTHZ_RESERVE_MS = float(os.getenv("AUTHZ_RESERVE_MS", "1000"))
+
+OPA_BREAKER_WINDOW = int(os.getenv("OPA_BREAKER_WINDOW", "10"))
+OPA_BREAKER_MIN_CALLS = int(os.getenv("OPA_BREAKER_MIN_CALLS", "5"))
+OPA_BREAKER_FAILURE_RATE = float(os.getenv("OPA_BREAKER_FAILURE_RATE", "0.5"))
+OPA_BREAKER_COOLDOWN = float(os.getenv("OPA_BREAKER_COOLDOWN", "30"))
 ALLOW_QUERY = "allow"
 DENY_QUERY  = "deny_reason"
 APPROVAL_QUERY = "approval_required"
+DECISION_QUERY = "decision"
+
+# None = not probed yet; False = bundle predates the combined decision rule. A False is probed
+# again when the policy revision changes, or DECISION_REPROBE_SECONDS after it was found.
+_DECISION_DOC = None
+_DECISION_DOC_AT = 0.0
+DECISION_REPROBE_SECONDS = float(os.getenv("DECISION_REPROBE_SECONDS", "300"))
+
+AUTHZ_CACHE_SIZE = int(os.getenv("AUTHZ_CACHE_SIZE", "512"))
+# Also the bound on staleness: a bundle change is only seen on the next OPA call (a miss).
+AUTHZ_CACHE_TTL = float(os.getenv("AUTHZ_CACHE_TTL", "60"))
+AUTHZ_CACHE_NEG_TTL = float(os.getenv("AUTHZ_CACHE_NEG_TTL", "10"))
+
+# Last policy revision reported by OPA provenance; "" until the first response.
+_POLICY_REVISION = ""
+
+AUTHZ_MODE = os.getenv("AUTHZ_MODE", "opa").lower()
+POLICY_TABLES_PATH = os.getenv("POLICY_TABLES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "policy_tables.json"))
+
+def _load_policy_tables(path=POLICY_TABLES_PATH):
+    """Load the tables compiled from actions.rego by compile_policy.py (empty = deny all)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            t = json.load(f)
+    except Exception as e:
+        LOG.error("Policy tables unavailable at %s, denying all actions: %s", path, e)
+        return {"revision": "", "groups": [], "green": {}, "yellow": [], "red": []}
+    t["group_bits"] = {g: 1 << i for i, g in enumerate(t["groups"])}
+    t["yellow"], t["red"] = frozenset(t["yellow"]), frozenset(t["red"])
+    return t
+
+_POLICY = _load_policy_tables()
 
+# Static green map used when OPA is unset or unreachable, derived from the compiled tables.
 _GREEN = {
-    "summarize-docs":    {"groups": {"VaultMesh-Engineering","VaultMesh-Delivery","VaultMesh-Compliance"}},
-    "generate-faq":      {"groups": {"VaultMesh-Engineering","VaultMesh-Delivery"}},
-    "draft-change-note": {"groups": {"VaultMesh-Engineering","VaultMesh-Delivery","VaultMesh-Management"}},
-    "validate-schema":   {"groups": {"VaultMesh-Engineering"}},
-    "create-jira-draft": {"groups": {"VaultMesh-Delivery","VaultMesh-Engineering"}},
-    "compliance-pack":   {"groups": {"VaultMesh-Compliance","VaultMesh-Management"}},
+    action: {"groups": {g for g, b in _POLICY["group_bits"].items() if mask & b}}
+    for action, mask in _POLICY["green"].items()
 }
 
 def _json(o): return json.dumps(o, separators=(",", ":"), ensure_ascii=False)
 
-def _call_opa(path_suffix, payload):
+def _emf_documents(metrics, timestamp_ms=None):
+    """Group put_metric_data-style entries by dimension set into EMF documents."""
+    ts = int(timestamp_ms if timestamp_ms is not None else time.time() * 1000)
+    docs = {}
+    for m in metrics:
+        dims = tuple((d["Name"], d["Value"]) for d in m.get("Dimensions", ()))
+        doc = docs.get(dims)
+        if doc is None:
+            doc = docs[dims] = dict(dims)
+            doc["_aws"] = {"Timestamp": ts, "CloudWatchMetrics": [
+                {"Namespace": METRICS_NAMESPACE, "Dimensions": [[n for n, _ in dims]], "Metrics": []}]}
+        doc["_aws"]["CloudWatchMetrics"][0]["Metrics"].append({"Name": m["MetricName"], "Unit": m.get("Unit", "None")})
+        doc[m["MetricName"]] = m["Value"]
+    return list(docs.values())
+
+class _MetricsBuffer:
+    """Aggregates datapoints into CloudWatch statistic sets inside a warm container."""
+
+    def __init__(self, flush_seconds=METRICS_FLUSH_SECONDS, flush_keys=METRICS_FLUSH_KEYS,
+                 max_keys=METRICS_MAX_KEYS, batch_size=METRICS_BATCH_SIZE):
+        self.flush_seconds, self.flush_keys = flush_seconds, flush_keys
+        self.max_keys, self.batch_size = max_keys, batch_size
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._since = time.monotonic()
+        self.dropped = self.flushes = self.api_calls = 0
+        self._thread = None
+
+    def add(self, metrics):
+        with self._lock:
+            for m in metrics:
+                key = (m["MetricName"], m.get("Unit", "None"),
+                       tuple((d["Name"], d["Value"]) for d in m.get("Dimensions", ())))
+                values = m["Value"] if isinstance(m["Value"], list) else [m["Value"]]
+                for v in map(float, values):
+                    st = self._stats.get(key)
+                    if st is None:
+                        if len(self._stats) >= self.max_keys:
+                            self.dropped += 1
+                            continue
+                        self._stats[key] = [1, v, v, v, time.time()]
+                    else:
+                        st[0] += 1
+                        st[1] += v
+                        st[2] = min(st[2], v)
+                        st[3] = max(st[3], v)
+
+    def due(self):
+        with self._lock:
+            return bool(self._stats) and (len(self._stats) >= self.flush_keys
+                                          or time.monotonic() - self._since >= self.flush_seconds)
+
+    def flush(self):
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            dropped, self.dropped = self.dropped, 0
+            self._since = time.monotonic()
+        data = [{
+            "MetricName": name, "Unit": unit, "Timestamp": first_ts,
+            "Dimensions": [{"Name": n, "Value": val} for n, val in dims],
+            "StatisticValues": {"SampleCount": c, "Sum": total, "Minimum": lo, "Maximum": hi},
+        } for (name, unit, dims), (c, total, lo, hi, first_ts) in stats.items()]
+        if dropped:
+            data.append({"MetricName": "MetricsDropped", "Unit": "Count", "Value": float(dropped)})
+        cw = _cw() if data else None
+        if not cw:
+            return
+        self.flushes += 1
+        for i in range(0, len(data), self.batch_size):
+            try:
+                cw.put_metric_data(Namespace=METRICS_NAMESPACE, MetricData=data[i:i + self.batch_size])
+                self.api_calls += 1
+            except Exception as e:
+                LOG.warning(f"Failed to publish metric: {e}")
+
+    def start_thread(self):
+        """Flush from a daemon thread; only useful where the process is not frozen between requests."""
+        if self._thread:
+            return
+        def loop():
+            while True:
+                time.sleep(max(self.flush_seconds, 1.0))
+                self.flush()
+        self._thread = threading.Thread(target=loop, name="vmq-metrics-flush", daemon=True)
+        self._thread.start()
+
+_METRICS = _MetricsBuffer()
+
+_PREV_SIGTERM = None
+
+def _flush_on_sigterm(signum, frame):
+    _METRICS.flush()
+    if callable(_PREV_SIGTERM):
+        _PREV_SIGTERM(signum, frame)
+    else:
+        sys.exit(0)
+
+# Lambda delivers SIGTERM before shutdown only when an extension is registered (see
+# METRICS_SHUTDOWN_SIGNAL); atexit covers local runs.
+atexit.register(_METRICS.flush)
+if METRICS_MODE == "api":
+    try:
+        _PREV_SIGTERM = signal.signal(signal.SIGTERM, _flush_on_sigterm)
+    except ValueError:
+        pass  # not the main thread (e.g. imported from a worker); atexit still applies
+    if METRICS_FLUSH_THREAD:
+        _METRICS.start_thread()
+
+def _put_metrics(metrics):
+    if METRICS_MODE == "emf":
+        # CloudWatch extracts metrics from these lines asynchronously. They go to
+        # stdout directly: the Lambda log formatter's prefix would break the JSON.
+        for doc in _emf_documents(metrics):
+            sys.stdout.write(_json(doc) + "\n")
+        sys.stdout.flush()
+        return
+    _METRICS.add(metrics)
+    _flush_metrics_if_due()
+
+def _flush_metrics_if_due():
+    """Called as an invocation ends: flush what no shutdown hook would, or what crossed a threshold."""
+    if METRICS_MODE == "api" and (not _HOLD_METRICS or _METRICS.due()):
+        _METRICS.flush()
+
+class _HttpPool:
+    """Keep-alive HTTP/1.1 connections to a single origin, reused across warm invocations."""
+
+    def __init__(self, url, size=OPA_POOL_SIZE, timeout=OPA_TIMEOUT):
+        u = urllib.parse.urlsplit(url)
+        self.url = url
+        self._host, self._port = u.hostname, u.port
+        self._path = u.path.rstrip("/")
+        self._cls = http.client.HTTPSConnection if u.scheme == "https" else http.client.HTTPConnection
+        self._size, self._timeout = size, timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self.requests = self.reused = self.connects = self.reconnects = 0
+        self.connect_ms = 0.0
+
+    def _acquire(self, timeout):
+        with self._lock:
+            if self._idle:
+                conn = self._idle.pop()
+                conn.sock.settimeout(timeout)
+                return conn, True
+        conn = self._cls(self._host, self._port, timeout=timeout)
+        t0 = time.perf_counter()
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self.connects += 1
+            self.connect_ms += (time.perf_counter() - t0) * 1000
+        return conn, False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self._size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def post_json(self, path_suffix, payload, deadline=None):
+        """POST JSON; socket operations are bounded by the pool timeout or the monotonic deadline."""
+        body = _json(payload).encode("utf-8")
+        while True:
+            timeout = self._timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    raise TimeoutError(f"authz deadline exceeded before {path_suffix}")
+            conn, reused = self._acquire(timeout)
+            try:
+                conn.request("POST", f"{self._path}/{path_suffix}", body=body,
+                             headers={"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                if not reused:
+                    raise
+                # The server closed an idle socket between invocations; retry on a fresh one.
+                with self._lock:
+                    self.reconnects += 1
+                continue
+            except Exception:
+                conn.close()
+                raise
+            with self._lock:
+                self.requests += 1
+                self.reused += reused
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            if resp.status >= 400:
+                raise RuntimeError(f"HTTP {resp.status} from {path_suffix}")
+            return json.loads(data.decode("utf-8"))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "reuse_ratio": round(self.reused / self.requests, 3) if self.requests else 0.0,
+                "connects": self.connects,
+                "reconnects": self.reconnects,
+                "connect_ms": round(self.connect_ms, 3),
+            }
+
+_OPA_POOL = None
+
+def _opa_pool():
+    global _OPA_POOL
+    if _OPA_POOL is None or _OPA_POOL.url != OPA_URL:
+        _OPA_POOL = _HttpPool(OPA_URL)
+    return _OPA_POOL
+
+class _DecisionCache:
+    """Bounded LRU of OPA decisions with separate TTLs for allow and deny results."""
+
+    def __init__(self, size=AUTHZ_CACHE_SIZE, ttl=AUTHZ_CACHE_TTL, neg_ttl=AUTHZ_CACHE_NEG_TTL):
+        self.size, self.ttl, self.neg_ttl = size, ttl, neg_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit and hit[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit[0]
+            if hit:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, decision):
+        if self.size <= 0:
+            return
+        allowed, approval, _ = decision
+        ttl = self.ttl if allowed or approval else self.neg_ttl
+        with self._lock:
+            self._entries[key] = (decision, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+_AUTHZ_CACHE = _DecisionCache()
+
+class _CircuitBreaker:
+    """Closed/open/half-open breaker over a sliding window of recent OPA call outcomes."""
+
+    def __init__(self, window=OPA_BREAKER_WINDOW, min_calls=OPA_BREAKER_MIN_CALLS,
+                 failure_rate=OPA_BREAKER_FAILURE_RATE, cooldown=OPA_BREAKER_COOLDOWN):
+        self.min_calls, self.failure_rate, self.cooldown = min_calls, failure_rate, cooldown
+        self.state = "closed"
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go to OPA; in half-open state only one probe is let through."""
+        changed = None
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                changed = self._transition("half_open")
+            permitted = True
+            if self.state == "half_open":
+                permitted = not self._probing
+                self._probing = True
+        self._emit(changed)
+        return permitted
+
+    def record(self, success):
+        changed = None
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+                self._outcomes.clear()
+                changed = self._transition("closed" if success else "open")
+            else:
+                self._outcomes.append(success)
+                failures = self._outcomes.count(False)
+                if (self.state == "closed" and len(self._outcomes) >= self.min_calls
+                        and failures / len(self._outcomes) >= self.failure_rate):
+                    self._outcomes.clear()
+                    changed = self._transition("open")
+        self._emit(changed)
+
+    def _transition(self, to):
+        frm, self.state = self.state, to
+        if to == "open":
+            self._opened_at = time.monotonic()
+        return frm, to
+
+    def _emit(self, changed):
+        # Logged and published outside the lock so a slow metrics call never blocks authz.
+        if not changed:
+            return
+        frm, to = changed
+        LOG.warning(_json({"event": "opa_breaker", "from": frm, "to": to}))
+        _put_metrics([{"MetricName": "OpaBreakerTransition", "Value": 1.0, "Unit": "Count",
+                       "Dimensions": [{"Name": "State", "Value": to}]}])
+
+_OPA_BREAKER = _CircuitBreaker()
+
+def _policy_group(evt):
+    """The one user field actions.rego decides on (input.user.group); a `groups` array is not policy input."""
+    return (evt.get("user") or {}).get("group")
+
+def _decision_key(evt):
+    """Everything the policy reads: identical keys always get identical decisions."""
+    return evt.get("action"), _policy_group(evt)
+
+def _note_revision(provenance):
+    """Track the OPA bundle revision; a change drops cached decisions and the decision-rule probe."""
+    global _POLICY_REVISION, _DECISION_DOC
+    bundles = provenance.get("bundles") or {}
+    rev = ",".join(f"{n}@{b.get('revision', '')}" for n, b in sorted(bundles.items())) or provenance.get("revision", "")
+    if rev != _POLICY_REVISION:
+        if _POLICY_REVISION:
+            LOG.info("OPA policy revision changed %s -> %s, clearing decision cache", _POLICY_REVISION, rev)
+        _POLICY_REVISION = rev
+        _AUTHZ_CACHE.clear()
+        if _DECISION_DOC is False:
+            _DECISION_DOC = None  # the new bundle may define the decision rule
+
+def _call_opa(path_suffix, payload, deadline=None):
     if not OPA_URL:
         raise RuntimeError("OPA_URL not set")
-    req = urllib.request.Request(
-        f"{OPA_URL}/{path_suffix}",
-        data=_json({"input": payload}).encode("utf-8"),
-        headers={"Content-Type":"application/json"},
-        method="POST",
-    )
-    with urllib.request.urlopen(req, timeout=2.5) as r:
-        return json.loads(r.read().decode("utf-8")).get("result")
-
-def authorize_action(evt):
-    if OPA_URL:
-        try:
-            allowed = bool(_call_opa(ALLOW_QUERY, evt))
-            approval = bool(_call_opa(APPROVAL_QUERY, evt))
-            deny = "" if allowed or approval else (_call_opa(DENY_QUERY, evt) or "denied by policy")
+    # Underscore keys are per-invocation bookkeeping (timers, batch state), not policy input.
+    inp = {k: v for k, v in payload.items() if not k.startswith("_")}
+    resp = _opa_pool().post_json(f"{path_suffix}?provenance=true", {"input": inp}, deadline)
+    _note_revision(resp.get("provenance") or {})
+    return resp.get("result")
+
+def _opa_decision(evt, deadline=None):
+    """Fetch allow/approval/deny in one round trip, falling back to three queries on older bundles."""
+    global _DECISION_DOC, _DECISION_DOC_AT
+    if _DECISION_DOC is False and time.monotonic() - _DECISION_DOC_AT >= DECISION_REPROBE_SECONDS:
+        _DECISION_DOC = None
+    if _DECISION_DOC is not False:
+        d = _call_opa(DECISION_QUERY, evt, deadline)
+        if isinstance(d, dict):
+            _DECISION_DOC = True
+            allowed = bool(d.get("allow"))
+            approval = bool(d.get("approval_required"))
+            deny = "" if allowed or approval else (d.get("deny_reason") or "denied by policy")
             return allowed, approval, deny
-        except Exception as e:
-            LOG.warning("OPA unreachable, falling back to static green map: %s", e)
+        LOG.info("OPA bundle has no %s rule, using per-rule queries", DECISION_QUERY)
+        _DECISION_DOC, _DECISION_DOC_AT = False, time.monotonic()
 
-    action = evt.get("action")
+    allowed = bool(_call_opa(ALLOW_QUERY, evt, deadline))
+    approval = bool(_call_opa(APPROVAL_QUERY, evt, deadline))
+    deny = "" if allowed or approval else (_call_opa(DENY_QUERY, evt, deadline) or "denied by policy")
+    return allowed, approval, deny
+
+def _embedded_decision(evt):
+    """Evaluate the compiled green/yellow tables in-process (mirrors actions.rego)."""
+    action, group = evt.get("action"), _policy_group(evt)
+    allowed = bool(_POLICY["green"].get(action, 0) & _POLICY["group_bits"].get(group, 0))
+    approval = action in _POLICY["yellow"]
+    if allowed or approval:
+        return allowed, approval, ""
+    if not group:
+        return False, False, "denied by policy"  # OPA's deny_reason is undefined without input.user.group
+    return False, False, f"action {action} is not enabled for group {group}"
+
+def _authz_deadline(ctx):
+    """Monotonic deadline for all OPA calls of one invocation, derived from the Lambda context."""
+    budget = OPA_TIMEOUT
+    if ctx is not None and hasattr(ctx, "get_remaining_time_in_millis"):
+        budget = min(budget, (ctx.get_remaining_time_in_millis() - AUTHZ_RESERVE_MS) / 1000)
+    return time.monotonic() + budget
+
+def _user_groups(evt):
     user = evt.get("user") or {}
     # Support both single group and groups array
-    user_groups = user.get("groups", [])
-    if not user_groups and user.get("group"):
-        user_groups = [user.get("group")]
+    groups = user.get("groups") or []
+    if not groups and user.get("group"):
+        groups = [user.get("group")]
+    return groups
+
+def _green_fallback(evt):
+    action = evt.get("action")
+    user_groups = _user_groups(evt)
 
     g = _GREEN.get(action)
     if g:
@@ -63,33 +502,295 @@ def authorize_action(evt):
 
     return False, False, f"action {action} is not enabled for groups {user_groups}"
 
-def ok(body: dict, evt: dict) -> dict:
+class _Phase:
+    """Adds the wall time of a `with` block to evt["_phases"]["<name>_ms"] (monotonic clock)."""
+    __slots__ = ("evt", "key", "t0")
+
+    def __init__(self, evt, name):
+        self.evt, self.key = evt, f"{name}_ms"
+
+    def __enter__(self):
+        self.t0 = PHASE_CLOCK()
+        self.evt.setdefault("_phase_t0", self.t0)
+        return self
+
+    def __exit__(self, *_):
+        phases = self.evt.setdefault("_phases", {})
+        phases[self.key] = phases.get(self.key, 0.0) + (PHASE_CLOCK() - self.t0) * 1000
+        return False
+
+_NO_PHASE = contextlib.nullcontext()
+
+def phase(evt: dict, name: str):
+    """Time one handler phase: `with phase(event, "work"): ...`. A shared no-op when PHASE_TIMING=0."""
+    return _Phase(evt, name) if PHASE_TIMING else _NO_PHASE
+
+def metric(evt: dict, name: str, value: float, unit: str = "Count"):
+    """Queue an action-specific metric; ok() publishes it with the ActionId dimension."""
+    evt.setdefault("_metrics", []).append((name, float(value), unit))
+
+def _phase_summary(evt):
+    total = (PHASE_CLOCK() - evt["_phase_t0"]) * 1000
+    out = {k: round(v, 3) for k, v in evt["_phases"].items()}
+    # Time between and after the timed blocks, so the parts add up to total_ms by construction.
+    out["other_ms"] = round(total - sum(evt["_phases"].values()), 3)
+    out["total_ms"] = round(total, 3)
+    return out
+
+def _authorize(evt, ctx):
+    if AUTHZ_MODE == "embedded":
+        evt["_authz"] = {"source": "embedded"}
+        return _embedded_decision(evt)
+
+    if OPA_URL:
+        # actions.rego only reads input.action and input.user.group, so those (plus
+        # the bundle revision) fully determine the decision. The revision is only
+        # refreshed by OPA calls, so the TTL bounds how stale a hit can be.
+        key = _decision_key(evt) + (_POLICY_REVISION,)
+        decision = _AUTHZ_CACHE.get(key) if _AUTHZ_CACHE.size > 0 else None
+        if decision:
+            evt["_authz_cache"] = "hit"
+            evt["_authz"] = {"source": "cache"}
+            return decision
+        # Deadline first: allow() hands out the half-open probe, which only record() gives back.
+        deadline = _authz_deadline(ctx)
+        if deadline <= time.monotonic():
+            LOG.warning("No time left for OPA before the Lambda deadline, using static green map")
+            evt["_authz"] = {"source": "fallback", "deadline": "exceeded"}
+            return _green_fallback(evt)
+        if not _OPA_BREAKER.allow():
+            LOG.debug("OPA circuit open, using static green map")
+            evt["_authz"] = {"source": "fallback", "breaker": "open"}
+            return _green_fallback(evt)
+        pool = _opa_pool()
+        requests, reconnects = pool.requests, pool.reconnects
+        try:
+            decision = _opa_decision(evt, deadline)
+        except Exception as e:
+            _OPA_BREAKER.record(False)
+            LOG.warning("OPA unreachable, falling back to static green map: %s", e)
+            evt["_authz"] = {"source": "fallback", "opa_reconnects": pool.reconnects - reconnects}
+            return _green_fallback(evt)
+        _OPA_BREAKER.record(True)
+        evt["_authz_cache"] = "miss"
+        evt["_authz"] = {"source": "opa", "opa_requests": pool.requests - requests,
+                         "opa_reconnects": pool.reconnects - reconnects}
+        # Store under the revision OPA just reported, not the one we looked up with.
+        _AUTHZ_CACHE.put(key[:2] + (_POLICY_REVISION,), decision)
+        return decision
+
+    evt["_authz"] = {"source": "fallback"}
+    return _green_fallback(evt)
+
+def authorize_action(evt, ctx=None):
+    with phase(evt, "authz"):
+        memo = evt.get("_batch_authz")
+        if memo is None:
+            return _authorize(evt, ctx)
+        # Inside a batch, identical requests are decided once. The static fallback
+        # also reads user.groups, so items differing only there are kept apart.
+        key = _decision_key(evt) + (tuple(_user_groups(evt)),)
+        if key in memo:
+            evt["_authz"] = {"source": "batch"}
+            return memo[key]
+        memo[key] = _authorize(evt, ctx)
+        return memo[key]
+
+def ok(body: dict, evt: dict, invoked: bool = True) -> dict:
+    """
+    The 200 response for `body`, logged and counted. Pass invoked=False for a
+    response that does not run the action (a job submit: the job's run counts it).
+    """
     rid = ((evt.get("context") or {}).get("request_id")) or str(int(time.time()*1000))
     action = evt.get("action", "unknown")
     start = evt.get("_start_time", time.time())
     latency_ms = (time.time() - start) * 1000
-    LOG.info(_json({"event":"action_ok","action":action,"request_id":rid,"user":evt.get("user"),"latency_ms":latency_ms}))
 
     # Publish CloudWatch metrics
-    if CW:
-        try:
-            CW.put_metric_data(
-                Namespace="VaultMesh/QBusinessActions",
-                MetricData=[
-                    {"MetricName": "ActionsInvoked", "Value": 1.0, "Unit": "Count", "Dimensions": [{"Name": "ActionId", "Value": action}]},
-                    {"MetricName": "ActionLatency", "Value": latency_ms, "Unit": "Milliseconds", "Dimensions": [{"Name": "ActionId", "Value": action}]},
-                ]
-            )
-        except Exception as e:
-            LOG.warning(f"Failed to publish metric: {e}")
+    with phase(evt, "emit"):
+        dims = [{"Name": "ActionId", "Value": action}]
+        metrics = [
+            {"MetricName": "ActionsInvoked", "Value": 1.0, "Unit": "Count", "Dimensions": dims},
+            {"MetricName": "ActionLatency", "Value": latency_ms, "Unit": "Milliseconds", "Dimensions": dims},
+        ] if invoked else []
+        if "_authz_cache" in evt:
+            hit = evt["_authz_cache"] == "hit"
+            metrics += [
+                {"MetricName": "AuthzCacheHits", "Value": float(hit), "Unit": "Count", "Dimensions": dims},
+                {"MetricName": "AuthzCacheMisses", "Value": float(not hit), "Unit": "Count", "Dimensions": dims},
+            ]
+        if PHASE_METRICS and "_phases" in evt:
+            metrics += [
+                {"MetricName": "ActionPhaseLatency", "Value": ms, "Unit": "Milliseconds",
+                 "Dimensions": dims + [{"Name": "Phase", "Value": k[:-3]}]}
+                for k, ms in evt["_phases"].items()
+            ]
+        metrics += [{"MetricName": name, "Value": value, "Unit": unit, "Dimensions": dims}
+                    for name, value, unit in evt.get("_metrics", ())]
+        if "_batch_metrics" in evt:
+            evt["_batch_metrics"].extend(metrics)
+        else:
+            _put_metrics(metrics)
+
+    line = {"event":"action_ok","action":action,"request_id":rid,"user":evt.get("user"),"latency_ms":latency_ms}
+    if "_phases" in evt:
+        line["phases"] = _phase_summary(evt)
+    if "_authz" in evt:
+        line["authz"] = evt["_authz"]
+    if _OPA_POOL:
+        line["opa_pool"] = _OPA_POOL.stats()
+    if "_authz_cache" in evt:
+        line["authz_cache"] = dict(_AUTHZ_CACHE.stats(), result=evt["_authz_cache"])
+    LOG.info(_json(line))
 
-    return {"statusCode": 200, "headers":{"Content-Type":"application/json"}, "body": json.dumps(body)}
+    resp = {"statusCode": 200, "headers":{"Content-Type":"application/json"}, "body": json.dumps(body)}
+    result_sink.deliver(evt, resp)
+    return resp
 
 def err(status: int, msg: str, evt: dict) -> dict:
-    LOG.warning(_json({"event":"action_err","status":status,"reason":msg,"action":evt.get("action"),"user":evt.get("user")}))
-    return {"statusCode": status, "headers":{"Content-Type":"application/json"}, "body": json.dumps({"error": msg})}
+    line = {"event":"action_err","status":status,"reason":msg,"action":evt.get("action"),"user":evt.get("user")}
+    if "_phases" in evt:
+        line["phases"] = _phase_summary(evt)
+    if "_authz" in evt:
+        line["authz"] = evt["_authz"]
+    LOG.warning(_json(line))
+    if "_batch_metrics" not in evt:
+        _flush_metrics_if_due()  # an invocation ending in an error publishes nothing, but may find the buffer due
+    resp = {"statusCode": status, "headers":{"Content-Type":"application/json"}, "body": json.dumps({"error": msg})}
+    result_sink.deliver(evt, resp)
+    return resp
 
 def require(evt: dict, *keys):
-    params = evt.get("params") or {}
-    missing = [k for k in keys if k not in params or params[k] in (None, "")]
+    with phase(evt, "validate"):
+        params = evt.get("params") or {}
+        missing = [k for k in keys if k not in params or params[k] in (None, "")]
     return params, missing
+
+def _aggregate_metrics(metrics):
+    """Merge entries with the same name/unit/dimensions into one entry with a value array."""
+    merged = {}
+    for m in metrics:
+        key = (m["MetricName"], m.get("Unit", "None"), tuple((d["Name"], d["Value"]) for d in m.get("Dimensions", ())))
+        if key not in merged:
+            merged[key] = dict(m, Value=[])
+        merged[key]["Value"].append(m["Value"])
+    return list(merged.values())
+
+def run_batch(envelope: dict, ctx, dispatch) -> dict:
+    """
+    Execute an {"events": [...]} envelope item by item through dispatch(action) -> handler.
+
+    Items inherit action/user/context from the envelope, get per-item status codes,
+    share one authz decision per distinct action and user groups and publish one metric set.
+    """
+    items = envelope.get("events")
+    if not isinstance(items, list) or not items:
+        return err(400, "events must be a non-empty list", envelope)
+    if len(items) > BATCH_MAX_ITEMS:
+        return err(400, f"batch of {len(items)} exceeds BATCH_MAX_ITEMS={BATCH_MAX_ITEMS}", envelope)
+
+    base_ctx = envelope.get("context") or {}
+    memo, collected, results = {}, [], []
+    for i, raw in enumerate(items):
+        item = {k: v for k, v in (raw if isinstance(raw, dict) else {}).items() if k != "events"}
+        item.setdefault("action", envelope.get("action"))
+        item.setdefault("user", envelope.get("user"))
+        item_ctx = dict(base_ctx, **(item.get("context") or {}))
+        if base_ctx.get("request_id") and not (item.get("context") or {}).get("request_id"):
+            item_ctx["request_id"] = f"{base_ctx['request_id']}#{i}"
+        item["context"] = item_ctx
+        item["_batch_authz"], item["_batch_metrics"] = memo, collected
+
+        fn = dispatch(item["action"])
+        if fn is None:
+            resp = err(400, f"action {item['action']} is not served here", item)
+        else:
+            try:
+                resp = fn(item, ctx)
+            except Exception as e:
+                LOG.exception("batch item %d failed", i)
+                resp = err(500, f"internal error: {e}", item)
+        results.append({"index": i, "action": item["action"], "statusCode": resp["statusCode"],
+                        "body": json.loads(resp["body"])})
+
+    _put_metrics(_aggregate_metrics(collected))
+    failed = sum(1 for r in results if r["statusCode"] >= 400)
+    summary = {"items": len(results), "succeeded": len(results) - failed, "failed": failed,
+               "authz_lookups": len(memo)}
+    LOG.info(_json({"event": "batch_done", "action": envelope.get("action"),
+                    "request_id": base_ctx.get("request_id"), **summary}))
+    resp = {"statusCode": 207 if failed else 200, "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"results": results, "summary": summary})}
+    result_sink.deliver(envelope, resp)
+    return resp
+
+def _replayed(evt, ctx, resp, kind, age):
+    """Serve a saved response to an authorized caller, counted as a hit instead of an invocation."""
+    evt["_start_time"] = time.time()
+    allowed, approval, deny = authorize_action(evt, ctx)
+    if not allowed and not approval:
+        return err(403, deny, evt)
+    action = evt.get("action", "unknown")
+    metrics = [{"MetricName": "IdempotencyHits", "Value": 1.0, "Unit": "Count",
+                "Dimensions": [{"Name": "ActionId", "Value": action}]}]
+    if "_batch_metrics" in evt:
+        evt["_batch_metrics"].extend(metrics)
+    else:
+        _put_metrics(metrics)
+    LOG.info(_json({"event": "action_replay", "action": action, "request_id": (evt.get("context") or {}).get("request_id"),
+                    "user": evt.get("user"), "replay": kind, "age_s": round(age, 3)}))
+    resp = dict(resp, headers=dict(resp.get("headers") or {}, **{"Idempotent-Replayed": "true"}))
+    result_sink.deliver(evt, resp)
+    return resp
+
+def idempotent(handler):
+    """Replay saved responses for retried or repeated requests (see common/idempotency.py)."""
+    @functools.wraps(handler)
+    def run(event, ctx):
+        # A job run must do the work its submit response stands for.
+        if "_job_id" in event or idempotency.store() is None:
+            return handler(event, ctx)
+        rid = (event.get("context") or {}).get("request_id")
+        key = idempotency.request_key(event)
+        try:
+            hit = idempotency.replay(key, rid)
+        except Exception as e:
+            LOG.warning("Idempotency lookup failed, computing the response: %s", e)
+            hit = None
+        if hit:
+            return _replayed(event, ctx, *hit)
+        metric(event, "IdempotencyMisses", 1)
+        resp = handler(event, ctx)
+        try:
+            idempotency.save(key, rid, resp)
+        except Exception as e:
+            LOG.warning("Idempotency save failed: %s", e)
+        return resp
+    return run
+
+def warmup(event: dict):
+    """The response to a {"warmup": true} event (sent by session init to start a container), else None."""
+    if event.get("warmup") is not True:
+        return None
+    return {"statusCode": 200, "headers": {"Content-Type": "application/json"}, "body": json.dumps({"warm": True})}
+
+def batchable(action: str, replay: bool = True):
+    """
+    Let a per-action handler also accept an {"events": [...]} envelope of `action` items.
+
+    With `replay` (the default), single requests and batch items go through
+    `idempotent`; pass False for actions whose answer changes between calls.
+    Warm-up events are answered at once, without authz, metrics or logs.
+    """
+    def wrap(handler):
+        inner = idempotent(handler) if replay else handler
+        @functools.wraps(handler)
+        def entry(event, ctx):
+            warm = warmup(event)
+            if warm:
+                return warm
+            if "events" not in event:
+                return inner(event, ctx)
+            return run_batch(event, ctx, lambda a: inner if a == action else None)
+        return entry
+    return wrap
@@ -0,0 +1,128 @@
+"""
+Write-only streaming ZIP for non-seekable outputs (an S3 multipart upload).
+
+Entries of unknown size use data descriptors; ZIP64 fields are written for
+entries, offsets and directories that need them. Besides entries compressed
+on the fly, `add_raw` copies an already-deflated stream (a cached blob) into
+the archive without recompressing it, which zipfile cannot do.
+"""
+import struct
+import time
+import zlib
+
+STORED, DEFLATED = 0, 8
+
+_FLAG_DESCRIPTOR, _FLAG_UTF8 = 0x08, 0x800
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP64_FROM = 1 << 31  # an entry whose size is unknown or above this gets ZIP64 fields up front
+_UNIX_FILE = (0o100644 << 16)
+
+def _dos_time(ts: float):
+    t = time.gmtime(ts)
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+class _Entry:
+    """File-like writer for one entry; see ZipStream.open."""
+
+    def __init__(self, zs, name: str, method: int, level: int, size_hint, tee):
+        self.zs, self.name, self.method, self.tee = zs, name, method, tee
+        self.crc = self.size = self.csize = 0
+        self.zip64 = size_hint is None or size_hint >= _ZIP64_FROM
+        self._deflate = zlib.compressobj(level, zlib.DEFLATED, -15) if method == DEFLATED else None
+        self.record = zs._local_header(name, method, _FLAG_DESCRIPTOR, 0, 0, 0, self.zip64)
+
+    def _emit(self, data: bytes):
+        if data:
+            self.zs._write(data)
+            self.csize += len(data)
+            if self.tee is not None:
+                self.tee.write(data)
+
+    def write(self, data: bytes) -> int:
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self._emit(self._deflate.compress(data) if self._deflate else data)
+        return len(data)
+
+    def close(self):
+        if self._deflate is not None:
+            self._emit(self._deflate.flush())
+            self._deflate = None
+        zip64 = self.zip64 or self.size >= _ZIP64_LIMIT or self.csize >= _ZIP64_LIMIT
+        fmt = "<LLQQ" if zip64 else "<LLLL"
+        self.zs._write(struct.pack(fmt, 0x08074B50, self.crc, self.csize, self.size))
+        self.record.update(crc=self.crc, size=self.size, csize=self.csize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.close()
+        return False
+
+class ZipStream:
+    """Sequential ZIP writer over any object with write(bytes)."""
+
+    def __init__(self, out, level: int = 6):
+        self.out, self.level = out, level
+        self.offset, self.records, self.when = 0, [], time.time()
+
+    def _write(self, data: bytes):
+        self.out.write(data)
+        self.offset += len(data)
+
+    def _local_header(self, name, method, flags, crc, csize, size, zip64) -> dict:
+        raw = name.encode("utf-8")
+        record = {"name": raw, "method": method, "flags": flags | _FLAG_UTF8, "crc": crc, "csize": csize,
+                  "size": size, "offset": self.offset}
+        extra = struct.pack("<HHQQ", 1, 16, size, csize) if zip64 else b""
+        hdr_sizes = (_ZIP64_LIMIT, _ZIP64_LIMIT) if zip64 else (csize, size)
+        dos_time, dos_date = _dos_time(self.when)
+        self._write(struct.pack("<LHHHHHLLLHH", 0x04034B50, 45 if zip64 else 20, record["flags"], method,
+                                dos_time, dos_date, crc, *hdr_sizes, len(raw), len(extra)) + raw + extra)
+        self.records.append(record)
+        return record
+
+    def open(self, name: str, compress: bool = True, size_hint: int = None, tee=None) -> _Entry:
+        """
+        Entry writer: write() raw bytes, close() when done. `tee` (optional)
+        receives the entry data exactly as stored (deflated or not).
+        """
+        return _Entry(self, name, DEFLATED if compress else STORED, self.level, size_hint, tee)
+
+    def add_raw(self, name: str, chunks, method: int, crc: int, size: int, csize: int):
+        """Copy already-compressed entry data (sizes and CRC known up front)."""
+        zip64 = size >= _ZIP64_LIMIT or csize >= _ZIP64_LIMIT
+        self._local_header(name, method, 0, crc, csize, size, zip64)
+        written = 0
+        for chunk in chunks:
+            self._write(chunk)
+            written += len(chunk)
+        if written != csize:
+            raise ValueError(f"{name}: expected {csize} compressed bytes, got {written}")
+
+    def writestr(self, name: str, data: bytes, compress: bool = True):
+        with self.open(name, compress, size_hint=len(data)) as entry:
+            entry.write(data)
+
+    def close(self):
+        """Write the central directory (ZIP64 end records when needed)."""
+        start = self.offset
+        dos_time, dos_date = _dos_time(self.when)
+        for r in self.records:
+            big = (r["size"], r["csize"], r["offset"])
+            extra_vals = [v for v in big if v >= _ZIP64_LIMIT]
+            extra = struct.pack(f"<HH{len(extra_vals)}Q", 1, 8 * len(extra_vals), *extra_vals) if extra_vals else b""
+            size, csize, offset = (min(v, _ZIP64_LIMIT) for v in big)
+            self._write(struct.pack("<LHHHHHHLLLHHHHHLL", 0x02014B50, (3 << 8) | 45, 45 if extra_vals else 20,
+                                    r["flags"], r["method"], dos_time, dos_date, r["crc"], csize, size,
+                                    len(r["name"]), len(extra), 0, 0, 0, _UNIX_FILE, offset) + r["name"] + extra)
+        count, cd_size = len(self.records), self.offset - start
+        if count >= 0xFFFF or start >= _ZIP64_LIMIT or cd_size >= _ZIP64_LIMIT:
+            eocd64 = self.offset
+            self._write(struct.pack("<LQHHLLQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, start))
+            self._write(struct.pack("<LLQL", 0x07064B50, 0, eocd64, 1))
+        self._write(struct.pack("<LHHHHLLH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                                min(cd_size, _ZIP64_LIMIT), min(start, _ZIP64_LIMIT), 0))
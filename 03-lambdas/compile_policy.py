@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+VaultMesh Q Business - Policy Table Compiler
+Compiles the green/yellow/red action tables from actions.rego into
+common/policy_tables.json, which vmq_common evaluates in-process.
+
+Group names are interned to bit positions and each green action stores its
+allowed groups as an integer bitmask, so a decision is one dict lookup and
+one AND.
+
+Usage:
+  python compile_policy.py            - (re)write common/policy_tables.json
+  python compile_policy.py --check    - exit 1 if the artifact is out of date
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REGO_PATH = os.path.normpath(os.path.join(HERE, "..", "02-qbusiness", "guardrails", "opa", "actions.rego"))
+ARTIFACT_PATH = os.path.join(HERE, "common", "policy_tables.json")
+TABLES = ("green_actions", "yellow_actions", "red_actions")
+
+_TOKEN = re.compile(r'\s*(?:(#[^\n]*)|("(?:[^"\\]|\\.)*")|(-?\d+(?:\.\d+)?)|(true|false|null)|([{}\[\]:,]))')
+
+class _Literal:
+    """Recursive-descent parser for the Rego object/set/array literals used in the tables."""
+
+    def __init__(self, text: str, pos: int):
+        self.text, self.pos = text, pos
+
+    def _next(self):
+        while True:
+            m = _TOKEN.match(self.text, self.pos)
+            if not m:
+                raise ValueError(f"unexpected input at offset {self.pos}: {self.text[self.pos:self.pos + 20]!r}")
+            self.pos = m.end()
+            if not m.group(1):
+                return m
+
+    def _peek(self):
+        saved = self.pos
+        tok = self._next()
+        self.pos = saved
+        return tok.group(0).strip()
+
+    def value(self):
+        tok = self._next()
+        if tok.group(2):
+            return json.loads(tok.group(2))
+        if tok.group(3):
+            return json.loads(tok.group(3))
+        if tok.group(4):
+            return json.loads(tok.group(4))
+        punct = tok.group(5)
+        if punct == "[":
+            return self._items("]")
+        if punct == "{":
+            return self._braced()
+        raise ValueError(f"unexpected {punct!r} at offset {self.pos}")
+
+    def _items(self, close):
+        items = []
+        while self._peek() != close:
+            items.append(self.value())
+            if self._peek() == ",":
+                self._next()
+        self._next()
+        return items
+
+    def _braced(self):
+        # `{}` is an empty object; otherwise the first separator tells object from set.
+        if self._peek() == "}":
+            self._next()
+            return {}
+        first = self.value()
+        if self._peek() == ":":
+            self._next()
+            obj = {first: self.value()}
+            while self._peek() == ",":
+                self._next()
+                if self._peek() == "}":
+                    break
+                key = self.value()
+                if self._next().group(0).strip() != ":":
+                    raise ValueError(f"expected ':' at offset {self.pos}")
+                obj[key] = self.value()
+            self._next()
+            return obj
+        items = {first}
+        if self._peek() == ",":
+            self._next()
+        items.update(self._items("}"))
+        return items
+
+def parse_tables(rego: str) -> dict:
+    tables = {}
+    for name in TABLES:
+        m = re.search(rf"^{name}\s*:=\s*", rego, re.MULTILINE)
+        if not m:
+            raise ValueError(f"{name} not found in policy")
+        tables[name] = _Literal(rego, m.end()).value()
+    return tables
+
+def compile_tables(rego: str) -> dict:
+    tables = parse_tables(rego)
+    green, yellow, red = (tables[n] for n in TABLES)
+
+    overlap = (set(green) & set(red)) | (set(yellow) & set(red))
+    if overlap:
+        raise ValueError(f"actions listed as red and green/yellow: {sorted(overlap)}")
+
+    groups = sorted({g for policy in green.values() for g in policy.get("groups", ())})
+    bit = {g: i for i, g in enumerate(groups)}
+    return {
+        "revision": "sha256:" + hashlib.sha256(rego.encode("utf-8")).hexdigest()[:16],
+        "groups": groups,
+        "green": {a: sum(1 << bit[g] for g in p.get("groups", ())) for a, p in sorted(green.items())},
+        "yellow": sorted(a for a, v in yellow.items() if v),
+        "red": sorted(red),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile actions.rego tables for in-process evaluation")
+    parser.add_argument("--rego", default=REGO_PATH)
+    parser.add_argument("--out", default=ARTIFACT_PATH)
+    parser.add_argument("--check", action="store_true", help="Fail if the artifact does not match the policy")
+    args = parser.parse_args()
+
+    with open(args.rego, encoding="utf-8") as f:
+        artifact = json.dumps(compile_tables(f.read()), indent=2) + "\n"
+
+    if args.check:
+        current = open(args.out, encoding="utf-8").read() if os.path.exists(args.out) else ""
+        if current != artifact:
+            print(f"✗ {args.out} is stale; run compile_policy.py", file=sys.stderr)
+            sys.exit(1)
+        print(f"✓ {args.out} matches {args.rego}")
+        return
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        f.write(artifact)
+    print(f"✓ Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
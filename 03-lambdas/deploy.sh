@@ -7,6 +7,9 @@ BUCKET=${EXPORT_BUCKET:-vaultmesh-knowledge-base}
 STACK_NAME=vmq-actions-rubedo
 ACCOUNT_ID=$(aws sts get-caller-identity --query Account --output text --region "$REGION")
 
+echo "→ Compiling policy tables from actions.rego..."
+python3 compile_policy.py
+
 echo "→ Packaging Lambda functions for deployment..."
 
 # Create build artifacts directory
@@ -15,7 +18,7 @@ rm -rf .build/*
 
 # Package each function with common layer
 for fn in vmq-summarize-docs vmq-generate-faq vmq-draft-change-note \
-          vmq-validate-schema vmq-create-jira-draft vmq-generate-compliance-pack; do
+          vmq-validate-schema vmq-create-jira-draft vmq-generate-compliance-pack vmq-get-job-status; do
   echo "  → Packaging $fn"
   mkdir -p ".build/$fn"
   cp -r "$fn/"* ".build/$fn/"
@@ -27,6 +30,13 @@ for fn in vmq-summarize-docs vmq-generate-faq vmq-draft-change-note \
     --region "$REGION" --no-progress
 done
 
+# Router (optional) and job worker: one package with every action handler plus the shared common/
+echo "  → Packaging vmq-router"
+make -s build-FnRouter ARTIFACTS_DIR="$PWD/.build/vmq-router"
+(cd .build/vmq-router && zip -q -r ../vmq-router.zip .)
+aws s3 cp .build/vmq-router.zip "s3://${BUCKET}/lambda-deploy/vmq-router.zip" \
+  --region "$REGION" --no-progress
+
 echo "→ Creating/updating CloudFormation stack..."
 
 # Convert SAM template to pure CloudFormation by replacing CodeUri with S3 references
@@ -42,6 +52,19 @@ Parameters:
     Type: String
     Default: ""
     Description: Optional OPA endpoint URL
+  AuthzMode:
+    Type: String
+    Default: opa
+    AllowedValues: [opa, embedded]
+    Description: opa = query OPA_URL; embedded = evaluate compiled policy tables in-process
+  EnableRouter:
+    Type: String
+    Default: "false"
+    AllowedValues: ["true", "false"]
+    Description: Also deploy vmq-router, one function that serves all six actions
+
+Conditions:
+  RouterEnabled: !Equals [!Ref EnableRouter, "true"]
 
 Resources:
   # Execution role for all functions
@@ -71,6 +94,76 @@ Resources:
                 Resource:
                   - !Sub 'arn:aws:s3:::\${ExportBucket}/personas/*'
                   - !Sub 'arn:aws:s3:::\${ExportBucket}/actions/*'
+              - Sid: ReadSourceDocuments
+                Effect: Allow
+                Action:
+                  - s3:GetObject
+                Resource:
+                  - !Sub 'arn:aws:s3:::\${ExportBucket}/*'
+              - Sid: ListSourcePrefixes
+                Effect: Allow
+                Action:
+                  - s3:ListBucket
+                Resource:
+                  - !Sub 'arn:aws:s3:::\${ExportBucket}'
+              - Sid: WriteDerivedCaches
+                Effect: Allow
+                Action:
+                  - s3:PutObject
+                Resource:
+                  - !Sub 'arn:aws:s3:::\${ExportBucket}/cache/*'
+              - Sid: WritePackages
+                Effect: Allow
+                Action:
+                  - s3:PutObject
+                  - s3:AbortMultipartUpload
+                Resource:
+                  - !Sub 'arn:aws:s3:::\${ExportBucket}/packages/*'
+              - Sid: WriteContentStore
+                Effect: Allow
+                Action:
+                  - s3:PutObject
+                  - s3:DeleteObject
+                  - s3:AbortMultipartUpload
+                Resource:
+                  - !Sub 'arn:aws:s3:::\${ExportBucket}/cas/*'
+              - Sid: ReplaySavedResponses
+                Effect: Allow
+                Action:
+                  - dynamodb:GetItem
+                  - dynamodb:PutItem
+                Resource:
+                  - !GetAtt IdempotencyTable.Arn
+              - Sid: RunBackgroundJobs
+                Effect: Allow
+                Action:
+                  - dynamodb:PutItem
+                  - dynamodb:GetItem
+                  - dynamodb:UpdateItem
+                  - sqs:SendMessage
+                Resource:
+                  - !GetAtt JobsTable.Arn
+                  - !GetAtt JobsQueue.Arn
+              - Sid: WriteJobResults
+                Effect: Allow
+                Action:
+                  - s3:PutObject
+                Resource:
+                  - !Sub 'arn:aws:s3:::\${ExportBucket}/jobs/*'
+              - Sid: WriteActionResults
+                Effect: Allow
+                Action:
+                  - s3:PutObject
+                Resource:
+                  - !Sub 'arn:aws:s3:::\${ExportBucket}/results/*'
+              - Sid: ConsumeJobs
+                Effect: Allow
+                Action:
+                  - sqs:ReceiveMessage
+                  - sqs:DeleteMessage
+                  - sqs:GetQueueAttributes
+                Resource:
+                  - !GetAtt JobsQueue.Arn
               - Sid: PublishActionMetrics
                 Effect: Allow
                 Action:
@@ -127,8 +220,12 @@ Resources:
       Environment:
         Variables:
           LOG_LEVEL: INFO
+          METRICS_MODE: emf
           EXPORT_BUCKET: !Ref ExportBucket
           OPA_URL: !Ref OpaUrl
+          AUTHZ_MODE: !Ref AuthzMode
+          IDEMPOTENCY_STORE: !Sub 'dynamodb:\${IdempotencyTable}'
+          RESULT_SINK: !Sub 's3://\${ExportBucket}/results/'
       Code:
         S3Bucket: !Ref ExportBucket
         S3Key: lambda-deploy/vmq-summarize-docs.zip
@@ -147,8 +244,16 @@ Resources:
       Environment:
         Variables:
           LOG_LEVEL: INFO
+          METRICS_MODE: emf
           EXPORT_BUCKET: !Ref ExportBucket
           OPA_URL: !Ref OpaUrl
+          AUTHZ_MODE: !Ref AuthzMode
+          IDEMPOTENCY_STORE: !Sub 'dynamodb:\${IdempotencyTable}'
+          RESULT_SINK: !Sub 's3://\${ExportBucket}/results/'
+          FAQ_CACHE_URI: !Sub 's3://\${ExportBucket}/cache/faq/'
+          JOB_STORE: !Sub 'dynamodb:\${JobsTable}'
+          JOB_QUEUE_URL: !Ref JobsQueue
+          JOB_RESULT_URI: !Sub 's3://\${ExportBucket}/jobs/'
       Code:
         S3Bucket: !Ref ExportBucket
         S3Key: lambda-deploy/vmq-generate-faq.zip
@@ -167,8 +272,12 @@ Resources:
       Environment:
         Variables:
           LOG_LEVEL: INFO
+          METRICS_MODE: emf
           EXPORT_BUCKET: !Ref ExportBucket
           OPA_URL: !Ref OpaUrl
+          AUTHZ_MODE: !Ref AuthzMode
+          IDEMPOTENCY_STORE: !Sub 'dynamodb:\${IdempotencyTable}'
+          RESULT_SINK: !Sub 's3://\${ExportBucket}/results/'
       Code:
         S3Bucket: !Ref ExportBucket
         S3Key: lambda-deploy/vmq-draft-change-note.zip
@@ -187,8 +296,12 @@ Resources:
       Environment:
         Variables:
           LOG_LEVEL: INFO
+          METRICS_MODE: emf
           EXPORT_BUCKET: !Ref ExportBucket
           OPA_URL: !Ref OpaUrl
+          AUTHZ_MODE: !Ref AuthzMode
+          IDEMPOTENCY_STORE: !Sub 'dynamodb:\${IdempotencyTable}'
+          RESULT_SINK: !Sub 's3://\${ExportBucket}/results/'
       Code:
         S3Bucket: !Ref ExportBucket
         S3Key: lambda-deploy/vmq-validate-schema.zip
@@ -207,8 +320,12 @@ Resources:
       Environment:
         Variables:
           LOG_LEVEL: INFO
+          METRICS_MODE: emf
           EXPORT_BUCKET: !Ref ExportBucket
           OPA_URL: !Ref OpaUrl
+          AUTHZ_MODE: !Ref AuthzMode
+          IDEMPOTENCY_STORE: !Sub 'dynamodb:\${IdempotencyTable}'
+          RESULT_SINK: !Sub 's3://\${ExportBucket}/results/'
       Code:
         S3Bucket: !Ref ExportBucket
         S3Key: lambda-deploy/vmq-create-jira-draft.zip
@@ -220,19 +337,174 @@ Resources:
       Runtime: python3.12
       Handler: handler.handler
       Role: !GetAtt LambdaExecutionRole.Arn
-      Timeout: 10
+      Timeout: 300
       MemorySize: 256
       TracingConfig:
         Mode: Active
       Environment:
         Variables:
           LOG_LEVEL: INFO
+          METRICS_MODE: emf
           EXPORT_BUCKET: !Ref ExportBucket
           OPA_URL: !Ref OpaUrl
+          AUTHZ_MODE: !Ref AuthzMode
+          IDEMPOTENCY_STORE: !Sub 'dynamodb:\${IdempotencyTable}'
+          RESULT_SINK: !Sub 's3://\${ExportBucket}/results/'
+          JOB_STORE: !Sub 'dynamodb:\${JobsTable}'
+          JOB_QUEUE_URL: !Ref JobsQueue
+          JOB_RESULT_URI: !Sub 's3://\${ExportBucket}/jobs/'
       Code:
         S3Bucket: !Ref ExportBucket
         S3Key: lambda-deploy/vmq-generate-compliance-pack.zip
 
+  # Background jobs: records in DynamoDB, work queued on SQS for vmq-job-worker
+  JobsTable:
+    Type: AWS::DynamoDB::Table
+    Properties:
+      TableName: vmq-jobs
+      BillingMode: PAY_PER_REQUEST
+      AttributeDefinitions:
+        - { AttributeName: jobId, AttributeType: S }
+      KeySchema:
+        - { AttributeName: jobId, KeyType: HASH }
+      TimeToLiveSpecification: { AttributeName: expiresAt, Enabled: true }
+
+  # Saved responses replayed for retried or repeated requests (common/idempotency.py)
+  IdempotencyTable:
+    Type: AWS::DynamoDB::Table
+    Properties:
+      TableName: vmq-idempotency
+      BillingMode: PAY_PER_REQUEST
+      AttributeDefinitions:
+        - { AttributeName: key, AttributeType: S }
+      KeySchema:
+        - { AttributeName: key, KeyType: HASH }
+      TimeToLiveSpecification: { AttributeName: expiresAt, Enabled: true }
+
+  JobsDeadLetterQueue:
+    Type: AWS::SQS::Queue
+    Properties:
+      QueueName: vmq-jobs-dlq
+      MessageRetentionPeriod: 1209600
+
+  JobsQueue:
+    Type: AWS::SQS::Queue
+    Properties:
+      QueueName: vmq-jobs
+      VisibilityTimeout: 960
+      RedrivePolicy:
+        deadLetterTargetArn: !GetAtt JobsDeadLetterQueue.Arn
+        maxReceiveCount: 3
+
+  LogGroupJobStatus:
+    Type: AWS::Logs::LogGroup
+    Properties:
+      LogGroupName: /aws/lambda/vmq-get-job-status
+      RetentionInDays: 14
+
+  FnJobStatus:
+    Type: AWS::Lambda::Function
+    Properties:
+      FunctionName: vmq-get-job-status
+      Runtime: python3.12
+      Handler: handler.handler
+      Role: !GetAtt LambdaExecutionRole.Arn
+      Timeout: 10
+      MemorySize: 256
+      TracingConfig:
+        Mode: Active
+      Environment:
+        Variables:
+          LOG_LEVEL: INFO
+          METRICS_MODE: emf
+          EXPORT_BUCKET: !Ref ExportBucket
+          OPA_URL: !Ref OpaUrl
+          AUTHZ_MODE: !Ref AuthzMode
+          IDEMPOTENCY_STORE: !Sub 'dynamodb:\${IdempotencyTable}'
+          RESULT_SINK: !Sub 's3://\${ExportBucket}/results/'
+          JOB_STORE: !Sub 'dynamodb:\${JobsTable}'
+      Code:
+        S3Bucket: !Ref ExportBucket
+        S3Key: lambda-deploy/vmq-get-job-status.zip
+
+  LogGroupJobWorker:
+    Type: AWS::Logs::LogGroup
+    Properties:
+      LogGroupName: /aws/lambda/vmq-job-worker
+      RetentionInDays: 14
+
+  FnJobWorker:
+    Type: AWS::Lambda::Function
+    Properties:
+      FunctionName: vmq-job-worker
+      Runtime: python3.12
+      Handler: job_worker.handler
+      Role: !GetAtt LambdaExecutionRole.Arn
+      Timeout: 900
+      MemorySize: 256
+      TracingConfig:
+        Mode: Active
+      Environment:
+        Variables:
+          LOG_LEVEL: INFO
+          METRICS_MODE: emf
+          EXPORT_BUCKET: !Ref ExportBucket
+          OPA_URL: !Ref OpaUrl
+          AUTHZ_MODE: !Ref AuthzMode
+          IDEMPOTENCY_STORE: !Sub 'dynamodb:\${IdempotencyTable}'
+          RESULT_SINK: !Sub 's3://\${ExportBucket}/results/'
+          FAQ_CACHE_URI: !Sub 's3://\${ExportBucket}/cache/faq/'
+          JOB_STORE: !Sub 'dynamodb:\${JobsTable}'
+          JOB_QUEUE_URL: !Ref JobsQueue
+          JOB_RESULT_URI: !Sub 's3://\${ExportBucket}/jobs/'
+      Code:
+        S3Bucket: !Ref ExportBucket
+        S3Key: lambda-deploy/vmq-router.zip
+
+  JobWorkerEvents:
+    Type: AWS::Lambda::EventSourceMapping
+    Properties:
+      FunctionName: !Ref FnJobWorker
+      EventSourceArn: !GetAtt JobsQueue.Arn
+      BatchSize: 1
+      FunctionResponseTypes: [ReportBatchItemFailures]
+
+  LogGroupRouter:
+    Type: AWS::Logs::LogGroup
+    Condition: RouterEnabled
+    Properties:
+      LogGroupName: /aws/lambda/vmq-router
+      RetentionInDays: 14
+
+  FnRouter:
+    Type: AWS::Lambda::Function
+    Condition: RouterEnabled
+    Properties:
+      FunctionName: vmq-router
+      Runtime: python3.12
+      Handler: router.handler
+      Role: !GetAtt LambdaExecutionRole.Arn
+      Timeout: 300
+      MemorySize: 256
+      TracingConfig:
+        Mode: Active
+      Environment:
+        Variables:
+          LOG_LEVEL: INFO
+          METRICS_MODE: emf
+          EXPORT_BUCKET: !Ref ExportBucket
+          OPA_URL: !Ref OpaUrl
+          AUTHZ_MODE: !Ref AuthzMode
+          IDEMPOTENCY_STORE: !Sub 'dynamodb:\${IdempotencyTable}'
+          RESULT_SINK: !Sub 's3://\${ExportBucket}/results/'
+          FAQ_CACHE_URI: !Sub 's3://\${ExportBucket}/cache/faq/'
+          JOB_STORE: !Sub 'dynamodb:\${JobsTable}'
+          JOB_QUEUE_URL: !Ref JobsQueue
+          JOB_RESULT_URI: !Sub 's3://\${ExportBucket}/jobs/'
+      Code:
+        S3Bucket: !Ref ExportBucket
+        S3Key: lambda-deploy/vmq-router.zip
+
 Outputs:
   SummarizeFnArn:
     Value: !GetAtt FnSummarize.Arn
@@ -246,6 +518,15 @@ Outputs:
     Value: !GetAtt FnJiraDraft.Arn
   CompliancePackFnArn:
     Value: !GetAtt FnCompliancePack.Arn
+  JobStatusFnArn:
+    Value: !GetAtt FnJobStatus.Arn
+  JobWorkerFnArn:
+    Value: !GetAtt FnJobWorker.Arn
+  JobsQueueUrl:
+    Value: !Ref JobsQueue
+  RouterFnArn:
+    Condition: RouterEnabled
+    Value: !GetAtt FnRouter.Arn
 EOF
 
 # Deploy stack
@@ -256,6 +537,8 @@ aws cloudformation deploy \
   --parameter-overrides \
     ExportBucket="$BUCKET" \
     OpaUrl="" \
+    AuthzMode="${AUTHZ_MODE:-opa}" \
+    EnableRouter="${ENABLE_ROUTER:-false}" \
   --region "$REGION" \
   --no-fail-on-empty-changeset
 
@@ -0,0 +1,30 @@
+"""
+VMQ job worker: runs the action jobs queued by common.jobs.
+
+Triggered by the jobs SQS queue. Each message names a job; the job's saved
+event goes through the unchanged per-action handler (see common.registry),
+and the outcome is written back to the job record. A failed action is a
+finished job, not a failed message: only infrastructure errors (job store
+unreachable) are reported back to SQS for redelivery.
+"""
+import json
+import logging
+import os
+from common import jobs
+from common.registry import preload
+
+LOG = logging.getLogger()
+
+if os.getenv("ROUTER_PRELOAD", "1") == "1":
+    preload()
+
+def handler(event, ctx):
+    failures = []
+    for record in event.get("Records") or []:
+        try:
+            job_id = json.loads(record["body"])["jobId"]
+            LOG.info(json.dumps({"event": "job_done", "jobId": job_id, "status": jobs.run(job_id, ctx)}))
+        except Exception:
+            LOG.exception("job message %s not processed", record.get("messageId"))
+            failures.append({"itemIdentifier": record.get("messageId")})
+    return {"batchItemFailures": failures}
@@ -3,65 +3,72 @@
 VaultMesh Q Business - Persona & Action Helper
 Minimal helper to:
 1. Resolve persona from user groups
-2. Load persona JSON from S3 (with 5-min cache)
+2. Load persona JSON from S3 (cached, revalidated by ETag after 5 min)
 3. Load actions catalog
-4. Present handoff choices and invoke Lambda actions
+4. Present handoff choices and invoke Lambda actions (waiting, or dispatched
+   and collected later from the result sink)
 """
 import json
-import time
 import os
+import threading
+import time
 from typing import Dict, Optional, List
-try:
-    import boto3
-    S3 = boto3.client('s3')
-    LAMBDA = boto3.client('lambda')
-except ImportError:
-    print("Warning: boto3 not available, running in mock mode")
-    S3 = None
-    LAMBDA = None
+from common import aws_clients, catalog as catalog_index, objcache, results as result_sink
+
+# Override hooks for tests; otherwise clients are built on first use (mock mode without boto3).
+S3 = None
+LAMBDA = None
+
+# Concurrent fan-out (invoke_actions_concurrent / invoke_actions_async).
+INVOKE_CONCURRENCY = int(os.getenv("INVOKE_CONCURRENCY", "8"))
+INVOKE_TIMEOUT_SECONDS = float(os.getenv("INVOKE_TIMEOUT_SECONDS", "60"))
+
+# Session init: optionally send warm-up events to the functions behind a user's handoffs.
+SESSION_WARM_ACTIONS = os.getenv("SESSION_WARM_ACTIONS", "0") == "1"
+WARM_INTERVAL_SECONDS = float(os.getenv("WARM_INTERVAL_SECONDS", "300"))
+
+def _s3():
+    return S3 or aws_clients.client('s3')
+
+def _lambda():
+    if LAMBDA:
+        return LAMBDA
+    # One client for every caller and fan-out thread; its HTTP pool is sized for the fan-out.
+    config = None
+    try:
+        from botocore.config import Config
+        config = Config(max_pool_connections=max(10, INVOKE_CONCURRENCY))
+    except ImportError:
+        pass
+    return aws_clients.client('lambda', config=config)
 
 BUCKET = os.getenv("EXPORT_BUCKET", "vaultmesh-knowledge-base")
 PERSONA_PREFIX = "personas"
 CATALOG_KEY = "actions/catalog.json"
-CACHE_TTL = 300  # 5 minutes
+CACHE_TTL = objcache.OBJECT_CACHE_TTL  # 5 minutes, then revalidated with a conditional GET
 
-_cache = {}
+# Personas and the catalog; stale copies are served while one refresh runs, and kept on S3 errors.
+_cache = objcache.ObjectCache(_s3)
 
 def resolve_persona(user_groups: List[str]) -> str:
     """
     Map Identity Center group to persona ID.
     Default to 'engineer' for Anonymous or unmapped groups.
     """
-    group_mapping = {
-        "VaultMesh-Engineering": "engineer",
-        "VaultMesh-Delivery": "delivery-manager",
-        "VaultMesh-Compliance": "compliance",
-        "VaultMesh-Management": "delivery-manager",  # fallback for management
-    }
-
     for group in user_groups:
-        if group in group_mapping:
-            return group_mapping[group]
+        if group in catalog_index.GROUP_PERSONAS:
+            return catalog_index.GROUP_PERSONAS[group]
 
     # Default to engineer for Anonymous or unknown groups
-    return "engineer"
+    return catalog_index.DEFAULT_PERSONA
 
 def load_persona_s3(persona_id: str) -> Optional[Dict]:
     """
-    Load persona JSON from S3 with 5-minute caching.
-    Returns None if not found or on error.
+    Load persona JSON from S3 through the shared object cache.
+    Returns None if not found, or on error with no earlier copy cached.
     """
-    cache_key = f"persona:{persona_id}"
-    now = time.time()
-
-    # Check cache
-    if cache_key in _cache:
-        data, ts = _cache[cache_key]
-        if now - ts < CACHE_TTL:
-            return data
-
-    # Fetch from S3
-    if not S3:
+    s3 = _s3()
+    if not s3:
         print(f"Mock mode: would load s3://{BUCKET}/{PERSONA_PREFIX}/{persona_id}.json")
         return {
             "id": persona_id,
@@ -72,64 +79,72 @@ def load_persona_s3(persona_id: str) -> Optional[Dict]:
         }
 
     try:
-        key = f"{PERSONA_PREFIX}/{persona_id}.json"
-        response = S3.get_object(Bucket=BUCKET, Key=key)
-        data = json.loads(response['Body'].read().decode('utf-8'))
-        _cache[cache_key] = (data, now)
-        return data
+        return _cache.get(BUCKET, f"{PERSONA_PREFIX}/{persona_id}.json")
     except Exception as e:
         print(f"Error loading persona {persona_id}: {e}")
         return None
 
 def load_catalog() -> Optional[Dict]:
     """
-    Load actions catalog from S3 with 5-minute caching.
+    Load actions catalog from S3 through the shared object cache.
     """
-    cache_key = "catalog"
-    now = time.time()
-
-    # Check cache
-    if cache_key in _cache:
-        data, ts = _cache[cache_key]
-        if now - ts < CACHE_TTL:
-            return data
-
-    # Fetch from S3
-    if not S3:
+    s3 = _s3()
+    if not s3:
         print(f"Mock mode: would load s3://{BUCKET}/{CATALOG_KEY}")
         return {"version": "1.0.0-rubedo", "catalog": []}
 
     try:
-        response = S3.get_object(Bucket=BUCKET, Key=CATALOG_KEY)
-        data = json.loads(response['Body'].read().decode('utf-8'))
-        _cache[cache_key] = (data, now)
-        return data
+        return _cache.get(BUCKET, CATALOG_KEY)
     except Exception as e:
         print(f"Error loading catalog: {e}")
         return None
 
-def get_handoff_choices(persona_id: str) -> List[Dict]:
+def get_handoff_choices(persona_id: str, user: Optional[Dict] = None) -> List[Dict]:
     """
-    Return list of available actions as handoff choices.
-    Each choice includes: id, handoffText, description, lambda ARN
+    Return the actions a persona (or, with `user`, exactly that user) may
+    run, as handoff choices from the compiled catalog index. `user` is the
+    action events' user dict; only its `group` counts, as in authz.
+    Each choice includes: id, handoffText, description, lambda ARN, approvalRequired
     """
-    catalog = load_catalog()
+    return _handoffs(load_catalog(), persona_id, user)
+
+def _handoffs(catalog: Optional[Dict], persona_id: str, user: Optional[Dict]) -> List[Dict]:
     if not catalog:
         return []
+    index = catalog_index.index_for(catalog)
+    if user is not None:
+        return list(index.handoffs_for_user(user))
+    return list(index.handoffs.get(persona_id, ()))
+
+def _invoke_lambda(function_name: str, event: Dict) -> Dict:
+    """Synchronously invoke `function_name` with `event` and decode the response."""
+    lambda_client = _lambda()
+    if not lambda_client:
+        print(f"Mock mode: would invoke {function_name} with {json.dumps(event, indent=2)}")
+        return {"mock": True, "action": event.get("action")}
 
-    choices = []
-    for action in catalog.get("catalog", []):
-        invocation = action.get("invocation", {})
-        choices.append({
-            "id": action["id"],
-            "name": action["name"],
-            "handoffText": invocation.get("handoffText", action["name"]),
-            "description": action["description"],
-            "lambda": action["lambda"],
-            "safetyTier": action.get("safetyTier", "UNKNOWN"),
-        })
+    try:
+        response = lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps(event).encode('utf-8')
+        )
+
+        result = json.loads(response['Payload'].read().decode('utf-8'))
+        if response.get('FunctionError'):
+            # Unhandled exception or timeout inside the function: the payload is its error report.
+            return {"error": result.get("errorMessage") or response['FunctionError'], "functionError": result}
+
+        # Parse Lambda response body if present
+        if 'body' in result:
+            try:
+                result['body'] = json.loads(result['body'])
+            except:
+                pass
 
-    return choices
+        return result
+    except Exception as e:
+        return {"error": str(e)}
 
 def invoke_action(action_id: str, user: Dict, params: Dict, context: Optional[Dict] = None) -> Dict:
     """
@@ -149,18 +164,10 @@ def invoke_action(action_id: str, user: Dict, params: Dict, context: Optional[Di
     if not catalog:
         return {"error": "catalog unavailable"}
 
-    # Find action in catalog
-    action_meta = None
-    for a in catalog.get("catalog", []):
-        if a["id"] == action_id:
-            action_meta = a
-            break
-
-    if not action_meta:
+    index = catalog_index.index_for(catalog)
+    if action_id not in index.actions:
         return {"error": f"action {action_id} not found in catalog"}
 
-    lambda_arn = action_meta["lambda"]
-
     # Build event payload
     event = {
         "action": action_id,
@@ -168,39 +175,269 @@ def invoke_action(action_id: str, user: Dict, params: Dict, context: Optional[Di
         "context": context or {},
         "params": params,
     }
+    return _invoke_lambda(index.targets[action_id], event)
+
+def invoke_actions_batch(items: List[Dict], user: Dict, context: Optional[Dict] = None) -> List[Dict]:
+    """
+    Invoke many actions with one Lambda call per function (batch envelope).
 
-    if not LAMBDA:
-        print(f"Mock mode: would invoke {lambda_arn} with {json.dumps(event, indent=2)}")
-        return {"mock": True, "action": action_id}
+    `items` are {"action": "...", "params": {...}} dicts. Items for the same
+    action are sent as one {"events": [...]} envelope; with VMQ_ROUTER_FUNCTION
+    set, every item goes to the router in a single call.
 
-    # Invoke Lambda
+    Returns one {"index", "action", "statusCode", "body"} result per item (or
+    an error dict), in the order of `items`.
+    """
+    catalog = load_catalog()
+    if not catalog:
+        return [{"index": i, "error": "catalog unavailable"} for i in range(len(items))]
+
+    index = catalog_index.index_for(catalog)
+    results: List[Optional[Dict]] = [None] * len(items)
+    router = os.getenv("VMQ_ROUTER_FUNCTION")
+    groups: Dict[str, List[int]] = {}
+    for i, item in enumerate(items):
+        target = index.targets.get(item.get("action"))
+        if not target:
+            results[i] = {"index": i, "action": item.get("action"),
+                          "error": f"action {item.get('action')} not found in catalog"}
+            continue
+        groups.setdefault(router or target, []).append(i)
+
+    for function_name, indexes in groups.items():
+        envelope = {
+            "action": items[indexes[0]]["action"],
+            "user": user,
+            "context": context or {},
+            "events": [{"action": items[i]["action"], "params": items[i].get("params", {})} for i in indexes],
+        }
+        response = _invoke_lambda(function_name, envelope)
+        body = response.get("body")
+        item_results = body.get("results") if isinstance(body, dict) else None
+        for n, i in enumerate(indexes):
+            if item_results is not None and n < len(item_results):
+                results[i] = dict(item_results[n], index=i)
+            else:
+                # Mock mode or a failed invoke: report the call-level outcome per item.
+                results[i] = dict(response, index=i, action=items[i]["action"])
+    return results
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _fanout_pool():
+    """Shared bounded pool for fan-out calls, built on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _pool = ThreadPoolExecutor(max_workers=INVOKE_CONCURRENCY, thread_name_prefix="invoke")
+    return _pool
+
+def _fanout_plan(items: List[Dict], user: Dict, context: Optional[Dict], timeout: float):
+    """(calls, results): calls are (index, function, event, timeout); unknown actions are already failed."""
+    catalog = load_catalog()
+    index = catalog_index.index_for(catalog) if catalog else None
+    calls, results = [], [None] * len(items)
+    for i, item in enumerate(items):
+        action = item.get("action")
+        target = index.targets.get(action) if index else None
+        if not target:
+            reason = "catalog unavailable" if index is None else f"action {action} not found in catalog"
+            results[i] = {"index": i, "action": action, "ok": False, "error": reason}
+            continue
+        event = {"action": action, "user": user, "context": item.get("context") or context or {},
+                 "params": item.get("params", {})}
+        calls.append((i, target, event, float(item.get("timeout") or timeout)))
+    return calls, results
+
+def _fanout_result(i: int, action: str, response: Dict) -> Dict:
+    failed = "error" in response or response.get("statusCode", 200) >= 400
+    return dict(response, index=i, action=action, ok=not failed)
+
+def _timed_out(i: int, action: str, timeout: float) -> Dict:
+    return {"index": i, "action": action, "ok": False, "timedOut": True, "error": f"no response within {timeout:g}s"}
+
+def invoke_actions_concurrent(items: List[Dict], user: Dict, context: Optional[Dict] = None,
+                              timeout: float = INVOKE_TIMEOUT_SECONDS) -> List[Dict]:
+    """
+    Invoke many actions at once, one synchronous Lambda call per item.
+
+    `items` are {"action", "params", "context"?, "timeout"?} dicts. Calls run on a
+    shared pool of INVOKE_CONCURRENCY threads over one Lambda client. Each
+    item must answer within its `timeout` (default `timeout`) seconds of the
+    fan-out start, time spent queued for a thread included.
+
+    Returns one result per item, in the order of `items`: the Lambda
+    response (statusCode, body) plus index, action and `ok`. A failed item
+    carries `error` (with `timedOut` when it ran out of time) and never fails
+    the others. A timed-out call still runs to completion in its thread; only
+    its result is dropped.
+    """
+    from concurrent.futures import TimeoutError as FutureTimeout
+    calls, results = _fanout_plan(items, user, context, timeout)
+    start, pool = time.monotonic(), _fanout_pool()
+    futures = [(i, event["action"], limit, pool.submit(_invoke_lambda, target, event))
+               for i, target, event, limit in calls]
+    for i, action, limit, future in futures:
+        try:
+            results[i] = _fanout_result(i, action, future.result(timeout=max(0.0, start + limit - time.monotonic())))
+        except FutureTimeout:
+            future.cancel()  # drops it if it never started
+            results[i] = _timed_out(i, action, limit)
+        except Exception as e:
+            results[i] = {"index": i, "action": action, "ok": False, "error": str(e)}
+    return results
+
+def _dispatch_lambda(function_name: str, event: Dict) -> Dict:
+    """Queue `event` for `function_name` (InvocationType=Event) without waiting for the action."""
+    cid = event["context"]["correlation_id"]
+    lambda_client = _lambda()
+    if not lambda_client:
+        print(f"Mock mode: would dispatch {function_name} with {json.dumps(event, indent=2)}")
+        return {"mock": True, "action": event.get("action"), "correlationId": cid}
     try:
-        response = LAMBDA.invoke(
-            FunctionName=lambda_arn,
-            InvocationType='RequestResponse',
+        response = lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
             Payload=json.dumps(event).encode('utf-8')
         )
+        return {"action": event.get("action"), "correlationId": cid, "statusCode": response.get("StatusCode")}
+    except Exception as e:
+        return {"action": event.get("action"), "correlationId": cid, "error": str(e)}
 
-        result = json.loads(response['Payload'].read().decode('utf-8'))
+def _dispatch_event(action: str, user: Dict, params: Dict, context: Optional[Dict]) -> Dict:
+    ctx = dict(context or {})
+    ctx.setdefault("correlation_id", result_sink.new_id())
+    # Lambda retries a failed Event with the same payload; a stable request_id lets it replay.
+    ctx.setdefault("request_id", ctx["correlation_id"])
+    return {"action": action, "user": user, "context": ctx, "params": params}
 
-        # Parse Lambda response body if present
-        if 'body' in result:
-            try:
-                result['body'] = json.loads(result['body'])
-            except:
-                pass
+def dispatch_action(action_id: str, user: Dict, params: Dict, context: Optional[Dict] = None) -> Dict:
+    """
+    Start an action without waiting for it (InvocationType=Event).
 
-        return result
-    except Exception as e:
-        return {"error": str(e)}
+    Returns {"action", "correlationId", "statusCode": 202} once Lambda has
+    queued the event, or a dict with `error`. The function writes its
+    response to RESULT_SINK under the correlation id (context.correlation_id
+    when given, otherwise a new one); fetch it with collect_results. The
+    function and the caller must be configured with the same sink.
+    """
+    catalog = load_catalog()
+    if not catalog:
+        return {"error": "catalog unavailable"}
+    index = catalog_index.index_for(catalog)
+    if action_id not in index.actions:
+        return {"error": f"action {action_id} not found in catalog"}
+    return _dispatch_lambda(index.targets[action_id], _dispatch_event(action_id, user, params, context))
+
+def dispatch_actions(items: List[Dict], user: Dict, context: Optional[Dict] = None) -> List[Dict]:
+    """
+    dispatch_action for many items at once over the fan-out pool.
+
+    `items` are {"action", "params", "context"?} dicts; returns one
+    dispatch_action result per item, with `index`, in the order of `items`.
+    """
+    calls, out = _fanout_plan(items, user, context, INVOKE_TIMEOUT_SECONDS)
+    pool = _fanout_pool()
+    futures = [(i, pool.submit(_dispatch_lambda, target,
+                               _dispatch_event(event["action"], user, event["params"], event["context"])))
+               for i, target, event, _ in calls]
+    for i, future in futures:
+        out[i] = dict(future.result(), index=i)
+    return out
+
+def collect_results(correlation_ids: List[str], timeout: float = 0.0) -> Dict[str, Optional[Dict]]:
+    """
+    {correlationId: record or None} from RESULT_SINK, polling for up to `timeout` seconds.
 
-def init_session_with_persona(user_groups: List[str]) -> Dict:
+    A record holds the action's statusCode and decoded body; None means the
+    action has not finished (or failed before it could respond).
+    """
+    return result_sink.collect(correlation_ids, timeout=timeout)
+
+async def invoke_actions_async(items: List[Dict], user: Dict, context: Optional[Dict] = None,
+                               timeout: float = INVOKE_TIMEOUT_SECONDS) -> List[Dict]:
+    """
+    asyncio front end of invoke_actions_concurrent: same items, results and pool.
+
+    The event loop is never blocked: catalog lookup and calls run on the
+    shared pool, and each call is awaited with its own timeout.
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    pool = _fanout_pool()
+    calls, results = await loop.run_in_executor(pool, _fanout_plan, items, user, context, timeout)
+
+    async def one(i, target, event, limit):
+        try:
+            response = await asyncio.wait_for(loop.run_in_executor(pool, _invoke_lambda, target, event), limit)
+            results[i] = _fanout_result(i, event["action"], response)
+        except asyncio.TimeoutError:
+            results[i] = _timed_out(i, event["action"], limit)
+        except Exception as e:
+            results[i] = {"index": i, "action": event["action"], "ok": False, "error": str(e)}
+
+    await asyncio.gather(*(one(*call) for call in calls))
+    return results
+
+_prefetch = None
+_warmed: Dict[str, float] = {}
+_warmed_lock = threading.Lock()
+
+def _prefetch_pool():
+    """Small pool for session-init prefetches and warm-ups, kept apart from the fan-out pool."""
+    global _prefetch
+    if _prefetch is None:
+        with _pool_lock:
+            if _prefetch is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _prefetch = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+    return _prefetch
+
+def _warm(functions: List[str]) -> List[str]:
+    """Send a warm-up Event to each function not warmed within WARM_INTERVAL_SECONDS; returns those sent."""
+    lambda_client = _lambda()
+    if not lambda_client:
+        return []
+    now, due = time.monotonic(), []
+    with _warmed_lock:
+        for fn in functions:
+            if now - _warmed.get(fn, float("-inf")) >= WARM_INTERVAL_SECONDS:
+                _warmed[fn] = now
+                due.append(fn)
+    for fn in due:
+        try:
+            lambda_client.invoke(FunctionName=fn, InvocationType='Event', Payload=b'{"warmup": true}')
+        except Exception as e:
+            print(f"Warm-up of {fn} failed: {e}")
+    return due
+
+def _persona_group(user_groups: List[str]) -> Optional[str]:
+    """The group resolve_persona picks the persona from, or None for Anonymous or unmapped groups."""
+    return next((g for g in user_groups if g in catalog_index.GROUP_PERSONAS), None)
+
+def init_session_with_persona(user_groups: List[str], warm: Optional[bool] = None,
+                              user_group: Optional[str] = None) -> Dict:
     """
     Initialize chat session with persona context.
-    Returns persona data and injected system prompt extras.
+    Returns persona data, injected system prompt extras and the handoff
+    choices for `user_group`, the user.group the session's action events
+    carry and authz decides on (default: the group the persona was resolved
+    from). The user's other groups add no choices.
+
+    The persona and the catalog are fetched concurrently. With `warm`
+    (default SESSION_WARM_ACTIONS), the functions behind the handoff
+    choices (or VMQ_ROUTER_FUNCTION) get a warm-up event in the background,
+    at most once per WARM_INTERVAL_SECONDS each; "warming" lists them.
     """
     persona_id = resolve_persona(user_groups)
+    catalog_future = _prefetch_pool().submit(load_catalog)
     persona = load_persona_s3(persona_id)
+    if user_group is None:
+        user_group = _persona_group(user_groups)
+    handoff_choices = _handoffs(catalog_future.result(), persona_id, {"group": user_group})
 
     if not persona:
         # Fallback to minimal default
@@ -220,11 +457,20 @@ def init_session_with_persona(user_groups: List[str]) -> Dict:
         "glossary_aliases": persona.get("glossary_aliases", {}),
     }
 
-    return {
+    session = {
         "persona_id": persona_id,
         "persona": persona,
         "system_prompt_extras": system_prompt_extras,
+        "handoff_choices": handoff_choices,
     }
+    if warm is None:
+        warm = SESSION_WARM_ACTIONS
+    if warm:
+        router = os.getenv("VMQ_ROUTER_FUNCTION")
+        functions = [router] if router else list(dict.fromkeys(c["lambda"] for c in handoff_choices))
+        session["warming"] = functions
+        _prefetch_pool().submit(_warm, functions)
+    return session
 
 # CLI usage example
 if __name__ == "__main__":
@@ -237,6 +483,10 @@ if __name__ == "__main__":
         print("  persona_helper.py catalog                        - Show action catalog")
         print("  persona_helper.py handoffs <persona_id>          - List handoff choices")
         print("  persona_helper.py invoke <action_id> <user_json> <params_json> - Invoke action")
+        print("  persona_helper.py batch <user_json> <items_json>  - Invoke [{action, params}, ...] in batches")
+        print("  persona_helper.py fanout <user_json> <items_json> - Invoke [{action, params}, ...] concurrently")
+        print("  persona_helper.py dispatch <user_json> <items_json> - Start [{action, params}, ...] without waiting")
+        print("  persona_helper.py collect <wait_s> <id> [id...]  - Collect dispatched results from RESULT_SINK")
         sys.exit(1)
 
     cmd = sys.argv[1]
@@ -267,6 +517,27 @@ if __name__ == "__main__":
         result = invoke_action(action_id, user, params)
         print(json.dumps(result, indent=2))
 
+    elif cmd == "batch":
+        user = json.loads(sys.argv[2])
+        items = json.loads(sys.argv[3])
+        results = invoke_actions_batch(items, user)
+        print(json.dumps(results, indent=2))
+
+    elif cmd == "fanout":
+        user = json.loads(sys.argv[2])
+        items = json.loads(sys.argv[3])
+        results = invoke_actions_concurrent(items, user)
+        print(json.dumps(results, indent=2))
+
+    elif cmd == "dispatch":
+        user = json.loads(sys.argv[2])
+        items = json.loads(sys.argv[3])
+        print(json.dumps(dispatch_actions(items, user), indent=2))
+
+    elif cmd == "collect":
+        found = collect_results(sys.argv[3:], timeout=float(sys.argv[2]))
+        print(json.dumps(found, indent=2))
+
     else:
         print(f"Unknown command: {cmd}")
         sys.exit(1)
@@ -0,0 +1,27 @@
+"""
+VMQ action router: one Lambda entry point for all six green-tier actions.
+
+Dispatches on event["action"] through common.registry to the unchanged
+per-action handlers, so a single warm container serves every action and they
+share one authz cache, OPA connection pool and metrics buffer. The per-action
+functions keep working on their own. An {"events": [...]} envelope may mix
+actions.
+"""
+import os
+from common.registry import handler_for, preload
+from common.vmq_common import err, run_batch, warmup
+
+if os.getenv("ROUTER_PRELOAD", "1") == "1":
+    preload()
+
+def handler(event, ctx):
+    warm = warmup(event)
+    if warm:
+        return warm
+    if "events" in event:
+        # Mixed-action batch: each item is dispatched on its own action.
+        return run_batch(event, ctx, handler_for)
+    fn = handler_for(event.get("action"))
+    if fn is None:
+        return err(400, f"unknown action: {event.get('action')}", event)
+    return fn(event, ctx)
@@ -1,22 +1,48 @@
 import time
-from common.vmq_common import authorize_action, ok, err, require
+from common import jirabulk
+from common.vmq_common import authorize_action, ok, err, require, phase, batchable, metric
 
-def handler(event, _ctx):
+@batchable("create-jira-draft")
+def handler(event, ctx):
     event["_start_time"] = time.time()
-    allowed, approval, deny = authorize_action(event)
+    allowed, approval, deny = authorize_action(event, ctx)
     if not allowed and not approval:
         return err(403, deny, event)
 
+    if "issues" in (event.get("params") or {}):
+        return _bulk(event)
+
     params, missing = require(event, "projectKey", "summary", "description")
     if missing:
         return err(400, f"missing required param(s): {', '.join(missing)}", event)
 
-    payload = {
-        "project": {"key": params["projectKey"]},
-        "summary": params["summary"],
-        "description": params["description"],
-        "labels": params.get("labels") or [],
-        "dryRun": True,
-        "approverRequired": True,
-    }
+    with phase(event, "work"):
+        payload = {
+            "project": {"key": params["projectKey"]},
+            "summary": params["summary"],
+            "description": params["description"],
+            "labels": params.get("labels") or [],
+            "dryRun": True,
+            "approverRequired": True,
+        }
     return ok({"jiraPayload": payload}, event)
+
+def _bulk(event):
+    params, missing = require(event, "issues")
+    if missing:
+        return err(400, f"missing required param(s): {', '.join(missing)}", event)
+
+    with phase(event, "work"):
+        try:
+            result = jirabulk.draft(params["issues"], {k: params.get(k) for k in ("projectKey", "labels", "issueType")},
+                                    params.get("cursor") or 0)
+        except ValueError as e:
+            return err(400, str(e), event)
+    if not result["summary"]["drafted"]:
+        invalid = [r for r in result["items"] if r["status"] == "invalid"][:5]
+        return err(400, "no valid issues: " + "; ".join(f"#{r['index']}: {', '.join(r['errors'])}" for r in invalid),
+                   event)
+
+    metric(event, "JiraDraftsBulk", sum(len(c["items"]) for c in result["chunks"]))
+    metric(event, "JiraDuplicatesCollapsed", result["summary"]["duplicates"])
+    return ok({"jiraBulk": result}, event)
@@ -1,9 +1,11 @@
 import time
-from common.vmq_common import authorize_action, ok, err, require
+from common import mddiff
+from common.vmq_common import authorize_action, ok, err, require, phase, batchable
 
-def handler(event, _ctx):
+@batchable("draft-change-note")
+def handler(event, ctx):
     event["_start_time"] = time.time()
-    allowed, approval, deny = authorize_action(event)
+    allowed, approval, deny = authorize_action(event, ctx)
     if not allowed and not approval:
         return err(403, deny, event)
 
@@ -14,23 +16,12 @@ def handler(event, _ctx):
     baseline = params["baselineUri"]
     updated  = params["updatedUri"]
     window   = params.get("changeWindow", "Unspecified")
-
-    md = f"""# Change Note (STUB)
-**Window:** {window}
-
-## Summary
-- Drafted change note between **{baseline}** and **{updated}**.
-
-## Deltas
-- (stub) Added section X
-- (stub) Updated requirement Y
-- (stub) Removed obsolete Z
-
-## Impact
-- (stub) Low / Medium / High
-
-## Reviewers
-- (stub) @owner1
-- (stub) @owner2
-"""
-    return ok({"changeMarkdown": md}, event)
+    if not all(isinstance(u, str) and u.startswith("s3://") for u in (baseline, updated)):
+        return err(400, "baselineUri and updatedUri must be s3:// URIs", event)
+
+    with phase(event, "work"):
+        try:
+            result = mddiff.change_note(baseline, updated, window)
+        except LookupError as e:
+            return err(502, f"cannot read {e}", event)
+    return ok(result, event)
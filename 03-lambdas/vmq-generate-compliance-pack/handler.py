@@ -1,12 +1,17 @@
-import time
 import os
-from common.vmq_common import authorize_action, ok, err, require
+import re
+import time
+from common import jobs, pack
+from common.vmq_common import authorize_action, ok, err, require, phase, batchable, metric
 
 EXPORT_BUCKET = os.getenv("EXPORT_BUCKET", "vaultmesh-knowledge-base")
+PACK_RESERVE_MS = float(os.getenv("PACK_RESERVE_MS", "5000"))
+CAS_PREFIX = os.getenv("CAS_PREFIX", "cas/")  # content-addressed source store in EXPORT_BUCKET; empty disables
 
-def handler(event, _ctx):
+@batchable("compliance-pack")
+def handler(event, ctx):
     event["_start_time"] = time.time()
-    allowed, approval, deny = authorize_action(event)
+    allowed, approval, deny = authorize_action(event, ctx)
     if not allowed and not approval:
         return err(403, deny, event)
 
@@ -14,21 +19,40 @@ def handler(event, _ctx):
     if missing:
         return err(400, f"missing required param(s): {', '.join(missing)}", event)
 
-    regime = params.get("regime", "ISO27k")
-    rid = (event.get("context") or {}).get("request_id") or "stub"
-    pkg_uri = f"s3://{EXPORT_BUCKET}/packages/{rid}.zip"
-
-    cover = f"""# Compliance Pack (STUB)
-**Regime:** {regime}
-
-## Contents
-- (stub) Collected {len(params['sourceUris'])} referenced documents
-- (stub) Included a README with provenance and guardrail notes
+    sources = params["sourceUris"]
+    if isinstance(sources, str):
+        sources = [sources]
+    if not isinstance(sources, list) or not all(isinstance(u, str) and u.startswith("s3://") for u in sources):
+        return err(400, "sourceUris must be a list of s3:// URIs", event)
+    if len(sources) > pack.PACK_MAX_SOURCES:
+        return err(400, f"at most {pack.PACK_MAX_SOURCES} sourceUris per request", event)
 
-## Provenance & Controls
-- Guardrails: credentials-and-secrets, confidential-business-info (active)
-- OPA Gate: vaultmesh.actions.* (green only)
+    if jobs.requested(event):
+        return jobs.submit(event)
 
-**Package URI:** {pkg_uri}
-"""
-    return ok({"packageUri": pkg_uri, "coverMarkdown": cover}, event)
+    regime = params.get("regime", "ISO27k")
+    rid = (event.get("context") or {}).get("request_id") or "stub"
+    pkg_uri = f"s3://{EXPORT_BUCKET}/packages/{re.sub(r'[^A-Za-z0-9._-]', '_', rid)}.zip"
+    deadline = None
+    if ctx is not None and hasattr(ctx, "get_remaining_time_in_millis"):
+        # Abort (and clean up the multipart upload) before Lambda kills the function.
+        deadline = time.monotonic() + (ctx.get_remaining_time_in_millis() - PACK_RESERVE_MS) / 1000
+
+    with phase(event, "work"):
+        try:
+            result = pack.build(list(dict.fromkeys(sources)), pkg_uri, {
+                "regime": regime, "request_id": rid,
+                "requested_by": (event.get("user") or {}).get("id", "unknown")}, deadline,
+                cas_root=f"s3://{EXPORT_BUCKET}/{CAS_PREFIX}" if CAS_PREFIX else None, progress=jobs.progress(event))
+        except LookupError as e:
+            return err(502, f"no source could be read ({e})", event)
+        except TimeoutError as e:
+            return err(504, str(e), event)
+
+    dedupe = result["dedupe"]
+    metric(event, "PackDedupeRatio", dedupe["ratio"], "Percent")
+    metric(event, "PackBytesSaved", dedupe["bytesSaved"], "Bytes")
+    metric(event, "PackBlobsReused", dedupe["reused"] + dedupe["duplicates"])
+    return ok({"packageUri": pkg_uri, "coverMarkdown": result["readme"], "files": len(result["files"]),
+               "bytes": result["bytes"], "sha256": result["sha256"], "missing": result["missing"],
+               "dedupe": dedupe}, event)
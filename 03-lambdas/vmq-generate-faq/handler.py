@@ -1,24 +1,33 @@
 import time
-from common.vmq_common import authorize_action, ok, err, require
+from common import faq, jobs, s3io
+from common.vmq_common import authorize_action, ok, err, require, phase, batchable
 
-def handler(event, _ctx):
+@batchable("generate-faq")
+def handler(event, ctx):
     event["_start_time"] = time.time()
-    allowed, approval, deny = authorize_action(event)
+    allowed, approval, deny = authorize_action(event, ctx)
     if not allowed and not approval:
         return err(403, deny, event)
 
-    params, _ = require(event, "folderPrefix")
-    maxq = int(params.get("maxQuestions", 12))
-    prefix = params.get("folderPrefix", "s3://vaultmesh-knowledge-base/docs/")
-    faq = [
-        "# FAQ (STUB)",
-        f"_Derived from folder: **{prefix}**_",
-        "",
-        "## Q: What does this folder contain?",
-        "- Draft answer: curated scrolls for the knowledge base.",
-        "## Q: Who owns this content?",
-        "- Draft answer: Knowledge Ops.",
-        "## Q: How often is it synced?",
-        "- Draft answer: On merge to main via CI.",
-    ]
-    return ok({"faqMarkdown": "\n".join(faq[: (2*maxq) ])}, event)
+    params, missing = require(event, "folderPrefix")
+    if missing:
+        return err(400, f"missing required param(s): {', '.join(missing)}", event)
+    prefix = params["folderPrefix"]
+    if not isinstance(prefix, str) or not prefix.startswith("s3://") or len(prefix.rstrip("/")) <= 5:
+        return err(400, "folderPrefix must be an s3://bucket/prefix URI", event)
+    try:
+        maxq = min(50, max(1, int(params.get("maxQuestions", 12))))
+    except (TypeError, ValueError):
+        return err(400, "maxQuestions must be an integer", event)
+    if jobs.requested(event):
+        return jobs.submit(event)
+
+    with phase(event, "work"):
+        try:
+            result = faq.generate(prefix, maxq, progress=jobs.progress(event))
+        except Exception as e:
+            return err(502, f"cannot list {prefix}: {s3io.describe_error(e)}", event)
+
+    if not result["documents"]["listed"]:
+        return err(404, f"no documents under {prefix}", event)
+    return ok(result, event)
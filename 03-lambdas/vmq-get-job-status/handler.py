@@ -0,0 +1,30 @@
+import re
+import time
+from common import jobs, s3io
+from common.vmq_common import authorize_action, ok, err, require, phase, batchable
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+@batchable("get-job-status", replay=False)
+def handler(event, ctx):
+    event["_start_time"] = time.time()
+    allowed, approval, deny = authorize_action(event, ctx)
+    if not allowed and not approval:
+        return err(403, deny, event)
+
+    params, missing = require(event, "jobId")
+    if missing:
+        return err(400, f"missing required param(s): {', '.join(missing)}", event)
+    job_id = params["jobId"]
+    if not isinstance(job_id, str) or not _JOB_ID.match(job_id):
+        return err(400, "jobId must be the id returned when the job was submitted", event)
+
+    with phase(event, "work"):
+        try:
+            job = jobs.status(job_id, (event.get("user") or {}).get("id"))
+        except Exception as e:
+            return err(502, f"job store unavailable: {s3io.describe_error(e)}", event)
+    if job is None:
+        # Jobs of other users are reported as unknown, not forbidden.
+        return err(404, f"no job {job_id}", event)
+    return ok({"job": job}, event)
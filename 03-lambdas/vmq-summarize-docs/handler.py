@@ -1,29 +1,36 @@
 import time
-from common.vmq_common import authorize_action, ok, err, require
+from common import summarize
+from common.vmq_common import authorize_action, ok, err, require, phase, batchable
 
-def handler(event, _ctx):
+@batchable("summarize-docs")
+def handler(event, ctx):
     event["_start_time"] = time.time()
-    allowed, approval, deny = authorize_action(event)
+    allowed, approval, deny = authorize_action(event, ctx)
     if not allowed and not approval:
-        return err(403, deny or "denied", event)
+        return err(403, deny, event)
 
     params, missing = require(event, "documentUris")
     if missing:
         return err(400, f"missing required param(s): {', '.join(missing)}", event)
 
-    audience = params.get("audience", "general")
     docs = params["documentUris"]
-    md = [
-        "# Executive Summary (STUB)",
-        f"**Audience:** {audience}",
-        "## Highlights",
-        "- (stub) Key findings from documents.",
-        "## Risks",
-        "- (stub) Identified risk 1",
-        "## Next Steps",
-        "- (stub) Proposed action 1",
-        "",
-        "### Sources",
-    ] + [f"- {u}" for u in docs]
+    if isinstance(docs, str):
+        docs = [docs]
+    if not isinstance(docs, list) or not all(isinstance(u, str) and u.startswith("s3://") for u in docs):
+        return err(400, "documentUris must be a list of s3:// URIs", event)
+    if not docs:
+        return err(400, "documentUris must name at least one s3:// URI", event)
+    if len(docs) > summarize.SUMMARY_MAX_DOCUMENTS:
+        return err(400, f"at most {summarize.SUMMARY_MAX_DOCUMENTS} documentUris per request", event)
+    try:
+        bullets = min(10, max(1, int(params.get("maxBullets", summarize.SUMMARY_BULLETS))))
+    except (TypeError, ValueError):
+        return err(400, "maxBullets must be an integer", event)
 
-    return ok({"summaryMarkdown": "\n".join(md)}, event)
+    with phase(event, "work"):
+        result = summarize.summarize(list(dict.fromkeys(docs)), params.get("audience", "general"), bullets)
+
+    if all("error" in s for s in result["sources"]):
+        reasons = "; ".join(f"{s['uri']}: {s['error']}" for s in result["sources"])
+        return err(502, f"no document could be read ({reasons})", event)
+    return ok(result, event)
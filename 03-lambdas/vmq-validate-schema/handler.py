@@ -1,9 +1,11 @@
 import time
-from common.vmq_common import authorize_action, ok, err, require
+from common import schemaval
+from common.vmq_common import authorize_action, ok, err, require, phase, batchable
 
-def handler(event, _ctx):
+@batchable("validate-schema")
+def handler(event, ctx):
     event["_start_time"] = time.time()
-    allowed, approval, deny = authorize_action(event)
+    allowed, approval, deny = authorize_action(event, ctx)
     if not allowed and not approval:
         return err(403, deny, event)
 
@@ -11,10 +13,17 @@ def handler(event, _ctx):
     if missing:
         return err(400, f"missing required param(s): {', '.join(missing)}", event)
 
-    profile = (params.get("profile") or "both").lower()
-    report = {
-        "profileEvaluated": profile,
-        "issues": [],
-        "summary": "No issues found in stub mode.",
-    }
+    schema_uri = params["schemaUri"]
+    instance_uri = params.get("instanceUri")
+    profile = str(params.get("profile") or "both").lower()
+    if profile not in schemaval.PROFILES:
+        return err(400, f"profile must be one of: {', '.join(schemaval.PROFILES)}", event)
+    if not all(isinstance(u, str) and u.startswith("s3://") for u in filter(None, (schema_uri, instance_uri))):
+        return err(400, "schemaUri and instanceUri must be s3:// URIs", event)
+
+    with phase(event, "work"):
+        try:
+            report = schemaval.validate(schema_uri, profile, instance_uri)
+        except LookupError as e:
+            return err(502, f"cannot read {e}", event)
     return ok({"validationReport": report}, event)
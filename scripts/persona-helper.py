@@ -14,43 +14,51 @@ Examples:
   python persona-helper.py invoke --action summarize-docs \\
     --user alice@vaultmesh.io --group VaultMesh-Engineering \\
     --params '{"documentUris":["s3://..."]}'
+
+  # Start an action without waiting, then collect its result (RESULT_SINK must
+  # match the function's, e.g. s3://vaultmesh-knowledge-base/results/)
+  python persona-helper.py invoke --async --action draft-change-note ...
+  python persona-helper.py collect --id <correlationId> --wait 30
 """
 import json
 import argparse
-import boto3
 import os
+import sys
 from typing import Dict, List, Optional
 
-S3 = boto3.client("s3")
-LAMBDA = boto3.client("lambda")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "03-lambdas"))
+from common import aws_clients, catalog as catalog_index, objcache, results  # noqa: E402
+
 REGION = os.getenv("AWS_REGION", "eu-west-1")
 BUCKET = os.getenv("EXPORT_BUCKET", "vaultmesh-knowledge-base")
 
-# Lightweight group → persona mapping (pre-SSO fallback)
-GROUP_TO_PERSONA = {
-    "VaultMesh-Engineering": "engineer",
-    "VaultMesh-Delivery": "delivery-manager",
-    "VaultMesh-Compliance": "compliance",
-    "VaultMesh-Management": "delivery-manager",  # Fallback
-}
+# Lightweight group → persona mapping (pre-SSO fallback), shared with persona_helper.py
+GROUP_TO_PERSONA = catalog_index.GROUP_PERSONAS
+
+def _client(service: str):
+    """Shared boto3 client, built on first use rather than at import."""
+    c = aws_clients.client(service, region=REGION)
+    if c is None:
+        sys.exit("boto3 is required: pip install boto3")
+    return c
+
+# Same revalidating cache as persona_helper.py, for callers that import this module.
+_cache = objcache.ObjectCache(lambda: _client("s3"))
 
 def resolve_persona(groups: List[str]) -> str:
     """Resolve first matching persona from user groups."""
     for g in groups:
         if g in GROUP_TO_PERSONA:
             return GROUP_TO_PERSONA[g]
-    return "engineer"  # Default persona for anonymous/unknown
+    return catalog_index.DEFAULT_PERSONA  # Default persona for anonymous/unknown
 
 def load_persona_s3(persona_id: str) -> Dict:
-    """Fetch persona definition from S3."""
-    key = f"personas/{persona_id}.json"
-    obj = S3.get_object(Bucket=BUCKET, Key=key)
-    return json.loads(obj["Body"].read().decode("utf-8"))
+    """Fetch persona definition from S3 (cached, revalidated by ETag)."""
+    return _cache.get(BUCKET, f"personas/{persona_id}.json")
 
 def load_catalog_s3() -> Dict:
-    """Fetch actions catalog from S3."""
-    obj = S3.get_object(Bucket=BUCKET, Key="actions/catalog.json")
-    return json.loads(obj["Body"].read().decode("utf-8"))
+    """Fetch actions catalog from S3 (cached, revalidated by ETag)."""
+    return _cache.get(BUCKET, "actions/catalog.json")
 
 def invoke_action(
     action_id: str,
@@ -58,36 +66,41 @@ def invoke_action(
     user_group: str,
     params: Dict,
     request_id: Optional[str] = None,
+    dispatch: bool = False,
 ) -> Dict:
     """
     Invoke a Lambda action with standard input contract.
-    Returns the Lambda response payload.
+    Returns the Lambda response payload, or with `dispatch` the correlation
+    id to collect the result with once the action has run.
     """
-    catalog = load_catalog_s3()
-    action_def = next((a for a in catalog["catalog"] if a["id"] == action_id), None)
-    if not action_def:
+    index = catalog_index.index_for(load_catalog_s3())
+    if action_id not in index.actions:
         raise ValueError(f"Action {action_id} not found in catalog")
 
-    lambda_arn = action_def["lambda"]
-    fn_name = lambda_arn.split(":")[-1]
-
     persona_id = resolve_persona([user_group])
+    # A dispatched request is known by the correlation id printed to the operator, so it is
+    # also the request_id (as in persona_helper.dispatch_actions) unless one was given.
+    correlation_id = results.new_id() if dispatch else None
 
     payload = {
         "action": action_id,
         "user": {"id": user_id, "group": user_group},
         "context": {
-            "request_id": request_id or f"cli-{int(__import__('time').time()*1000)}",
+            "request_id": request_id or correlation_id or f"cli-{int(__import__('time').time()*1000)}",
             "persona": persona_id,
         },
         "params": params,
     }
+    if dispatch:
+        payload["context"]["correlation_id"] = correlation_id
 
-    resp = LAMBDA.invoke(
-        FunctionName=fn_name,
-        InvocationType="RequestResponse",
+    resp = _client("lambda").invoke(
+        FunctionName=index.targets[action_id],
+        InvocationType="Event" if dispatch else "RequestResponse",
         Payload=json.dumps(payload).encode("utf-8"),
     )
+    if dispatch:
+        return {"correlationId": payload["context"]["correlation_id"], "statusCode": resp["StatusCode"]}
     return json.loads(resp["Payload"].read().decode("utf-8"))
 
 
@@ -109,6 +122,13 @@ def main():
     invoke_p.add_argument("--group", required=True, help="User group")
     invoke_p.add_argument("--params", required=True, help="JSON params dict")
     invoke_p.add_argument("--request-id", help="Optional request ID")
+    invoke_p.add_argument("--async", dest="dispatch", action="store_true",
+                          help="Return a correlation ID at once instead of waiting for the result")
+
+    # collect command
+    collect_p = subparsers.add_parser("collect", help="Collect results of --async invocations from RESULT_SINK")
+    collect_p.add_argument("--id", nargs="+", required=True, help="Correlation IDs printed by invoke --async")
+    collect_p.add_argument("--wait", type=float, default=0.0, help="Seconds to poll for pending results")
 
     args = parser.parse_args()
 
@@ -129,9 +149,13 @@ def main():
             user_group=args.group,
             params=params,
             request_id=args.request_id,
+            dispatch=args.dispatch,
         )
         print(json.dumps(result, indent=2))
 
+    elif args.command == "collect":
+        print(json.dumps(results.collect(args.id, timeout=args.wait), indent=2))
+
 
 if __name__ == "__main__":
     main()